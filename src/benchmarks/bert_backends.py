@@ -0,0 +1,67 @@
+import argparse
+import json
+import statistics
+import time
+
+import torch
+from loguru import logger
+
+from src.benchmarks.common import CAPTIONS
+from src.core.models import BertBackend
+from src.core.settings import CONFIGS_DIR, BertExtractorSettings
+from src.extractor.bert_extractor import BertExtractor
+
+
+def benchmark_backend(config: BertExtractorSettings, repeats: int, batch_size: int) -> dict[str, float]:
+    extractor = BertExtractor(config)
+    extractor.extract_batch(CAPTIONS)
+
+    latencies: list[float] = []
+    for _ in range(repeats):
+        for text in CAPTIONS:
+            start = time.perf_counter()
+            extractor.extract(text)
+            latencies.append(time.perf_counter() - start)
+
+    texts = (CAPTIONS * (batch_size // len(CAPTIONS) + 1))[:batch_size]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        extractor.extract_batch(texts)
+    throughput = repeats * batch_size / (time.perf_counter() - start)
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "latency_ms_p50": quantiles[49] * 1000,
+        "latency_ms_p95": quantiles[94] * 1000,
+        "throughput_texts_per_s": throughput,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare latency and throughput of BertExtractor backends")
+    parser.add_argument("--config", default=CONFIGS_DIR / "bert_extractor_settings.yaml")
+    parser.add_argument("--backends", nargs="+", type=BertBackend, default=list(BertBackend))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    config = BertExtractorSettings.from_yaml(args.config)
+    report: dict[str, dict[str, float]] = {}
+    for backend in args.backends:
+        try:
+            report[backend] = benchmark_backend(
+                config.model_copy(update={"backend": backend}), repeats=args.repeats, batch_size=args.batch_size
+            )
+        except (ImportError, FileNotFoundError) as e:
+            logger.warning(f"Skipping {backend}: {e}")
+
+    if BertBackend.torch_eager in report:
+        for result in report.values():
+            result["speedup_vs_eager"] = (
+                result["throughput_texts_per_s"] / report[BertBackend.torch_eager]["throughput_texts_per_s"]
+            )
+    logger.info(json.dumps({"torch_threads": torch.get_num_threads(), "backends": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
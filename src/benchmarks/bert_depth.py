@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+
+import torch
+from loguru import logger
+
+from src.benchmarks.common import CAPTIONS
+from src.core.memory import get_rss_bytes
+from src.core.settings import CONFIGS_DIR, BertExtractorSettings
+from src.extractor.bert_extractor import BertExtractor
+
+
+def benchmark(config: BertExtractorSettings, texts: list[str], repeats: int) -> tuple[dict[str, float], BertExtractor]:
+    rss_before = get_rss_bytes()
+    extractor = BertExtractor(config)
+    rss_delta = get_rss_bytes() - rss_before
+    n_parameters = sum(parameter.numel() for parameter in extractor.model.parameters())
+
+    for text in texts:
+        extractor.extract(text)
+
+    start = time.process_time()
+    for _ in range(repeats):
+        for text in texts:
+            extractor.extract(text)
+    cpu_time_s = (time.process_time() - start) / (repeats * len(texts))
+
+    return {
+        "n_layers": extractor.model.config.num_hidden_layers,
+        "n_parameters": n_parameters,
+        "rss_delta_mib": rss_delta / 2**20,
+        "cpu_ms_per_text": cpu_time_s * 1000,
+    }, extractor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare full and truncated BERT encoder")
+    parser.add_argument("--config", default=CONFIGS_DIR / "bert_extractor_settings.yaml")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    config = BertExtractorSettings.from_yaml(args.config)
+    full_result, full_extractor = benchmark(
+        config.model_copy(update={"truncate_encoder": False}), CAPTIONS, args.repeats
+    )
+    truncated_result, truncated_extractor = benchmark(
+        config.model_copy(update={"truncate_encoder": True}), CAPTIONS, args.repeats
+    )
+
+    max_abs_diff = max(
+        (full_extractor.get_attention_weights(text) - truncated_extractor.get_attention_weights(text))
+        .abs()
+        .max()
+        .item()
+        for text in CAPTIONS
+    )
+    identical = all(full_extractor.extract(text) == truncated_extractor.extract(text) for text in CAPTIONS)
+
+    report = {
+        "full": full_result,
+        "truncated": truncated_result,
+        "speedup": full_result["cpu_ms_per_text"] / truncated_result["cpu_ms_per_text"],
+        "max_abs_attention_diff": max_abs_diff,
+        "identical_extractions": identical,
+        "torch_threads": torch.get_num_threads(),
+    }
+    logger.info(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Sequence
+
+import torch
+from loguru import logger
+
+from src.core.settings import ROOT_DIR
+
+RESULTS_DIR = ROOT_DIR / "data" / "benchmarks"
+CAPTIONS = [
+    "beautiful furry rabbit in fresh snow",
+    "a man in blue jeans stands near a tall tree",
+    "a white car drives on a dirty road next to an old red bus",
+    "two young girls eat hot pizza at a small wooden table in a crowded italian restaurant",
+    "a large brown dog with a long fluffy tail runs across a green field under a cloudy grey sky "
+    "while a little boy in a yellow raincoat throws a bright orange ball towards the old stone fence",
+]
+CAPTION_LENGTHS = (32, 64, 128, 256, 512, 1024)
+
+
+def make_caption(length: int) -> str:
+    """
+    Joins captions until text reaches length characters, then cuts it at word boundary
+    """
+    text = CAPTIONS[0]
+    index = 1
+    while len(text) < length:
+        text = f"{text}, {CAPTIONS[index % len(CAPTIONS)]}"
+        index += 1
+    return text[:length].rsplit(" ", 1)[0] if len(text) > length else text
+
+
+def latency_summary(latencies_s: Sequence[float]) -> dict[str, float]:
+    if len(latencies_s) < 2:
+        latency_ms = latencies_s[0] * 1000 if latencies_s else 0.0
+        return {
+            "n": len(latencies_s),
+            "mean_ms": latency_ms,
+            "p50_ms": latency_ms,
+            "p95_ms": latency_ms,
+            "p99_ms": latency_ms,
+        }
+
+    quantiles = statistics.quantiles(latencies_s, n=100, method="inclusive")
+    return {
+        "n": len(latencies_s),
+        "mean_ms": statistics.fmean(latencies_s) * 1000,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+def git_revision() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=ROOT_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def run_metadata() -> dict[str, Any]:
+    return {
+        **git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def write_report(name: str, results: dict[str, Any], output: Path | None = None) -> Path:
+    """
+    Writes results with run metadata as JSON, by default to data/benchmarks/<name>_<short commit>.json,
+    so reports of different commits can be compared
+    """
+    report = {"benchmark": name, "metadata": run_metadata(), "results": results}
+    if output is None:
+        commit = report["metadata"]["commit"]
+        output = RESULTS_DIR / f"{name}_{commit[:12] if commit else 'unknown'}.json"
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Wrote {name} benchmark report to {output}")
+    return output
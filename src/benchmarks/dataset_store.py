@@ -0,0 +1,103 @@
+import argparse
+import json
+import multiprocessing
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from src.benchmarks.common import write_report
+from src.core.memory import get_rss_bytes
+from src.data.store import DatasetStore, convert_csv, import_tilde_labels
+from src.metrics.engine import DATA_DIR, EvaluationResult, evaluate_objects
+
+
+def evaluate_csv(val_path: Path, labels_path: Path | None, target_column: str, pred_column: str) -> EvaluationResult:
+    val = pd.read_csv(val_path)  # pyright: ignore
+    if labels_path is not None:
+        val = val.merge(pd.read_csv(labels_path, sep="~"), on="text", how="left")  # pyright: ignore
+    val = val.loc[val[target_column].notna() & val[pred_column].notna()]  # pyright: ignore
+    return evaluate_objects(
+        [json.loads(pred) for pred in val[pred_column]],  # pyright: ignore
+        [json.loads(target) for target in val[target_column]],  # pyright: ignore
+    )
+
+
+def evaluate_store(store_path: Path, target_column: str, pred_column: str) -> EvaluationResult:
+    store = DatasetStore(store_path)
+    rows = np.flatnonzero(store.labelled(target_column) & store.labelled(pred_column))
+    return store.evaluate(pred_column, target_column, rows)
+
+
+def measure(evaluate: Callable[..., EvaluationResult], *args: Any) -> dict[str, Any]:
+    """
+    Loads, joins and scores split, runs in fresh process, so memory growth isn't hidden by earlier runs
+    """
+    rss_before = get_rss_bytes()
+    started_at = time.perf_counter()
+    result = evaluate(*args)
+    return {
+        "elapsed_ms": (time.perf_counter() - started_at) * 1000,
+        "rss_delta_mib": (get_rss_bytes() - rss_before) / 2**20,
+        "report": result.report.model_dump(),
+    }
+
+
+def measure_runs(repeats: int, evaluate: Callable[..., EvaluationResult], *args: Any) -> dict[str, Any]:
+    runs: list[dict[str, Any]] = []
+    for _ in range(repeats):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            runs.append(executor.submit(measure, evaluate, *args).result())
+    return {
+        "elapsed_ms_p50": statistics.median(run["elapsed_ms"] for run in runs),
+        "rss_delta_mib_p50": statistics.median(run["rss_delta_mib"] for run in runs),
+        "report": runs[0]["report"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare loading and scoring split from CSV and dataset store")
+    parser.add_argument("--val", type=Path, default=DATA_DIR / "val.csv")
+    parser.add_argument("--labels", type=Path, default=None, help='"~" separated file with predictions column')
+    parser.add_argument("--target-column", default="target_spacy")
+    parser.add_argument("--pred-column", required=True)
+    parser.add_argument("--store", type=Path, default=None, help="store directory, temporary by default")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = args.store or Path(tmp_dir) / "store"
+        started_at = time.perf_counter()
+        store = convert_csv(args.val, store_path, overwrite=True)
+        if args.labels is not None:
+            import_tilde_labels(store, args.labels, column=args.pred_column)
+        convert_s = time.perf_counter() - started_at
+
+        csv = measure_runs(args.repeats, evaluate_csv, args.val, args.labels, args.target_column, args.pred_column)
+        arrow = measure_runs(args.repeats, evaluate_store, store_path, args.target_column, args.pred_column)
+        store_bytes = sum(path.stat().st_size for path in store_path.rglob("*.arrow"))
+
+    results = {
+        "n_captions": len(store),
+        "n_words": store.vocabulary.num_rows,
+        "convert_s": convert_s,
+        "store_mib": store_bytes / 2**20,
+        "csv_mib": (args.val.stat().st_size + (args.labels.stat().st_size if args.labels else 0)) / 2**20,
+        "csv": csv,
+        "store": arrow,
+        "speedup": csv["elapsed_ms_p50"] / arrow["elapsed_ms_p50"],
+        "identical_reports": csv["report"] == arrow["report"],
+    }
+    logger.info(json.dumps(results, indent=2))
+    write_report("dataset_store", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import time
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from src.benchmarks.common import (
+    CAPTION_LENGTHS,
+    latency_summary,
+    make_caption,
+    write_report,
+)
+from src.core.models import ProcessAttentions
+from src.core.settings import CONFIGS_DIR, AppSettings, BertExtractorSettings
+from src.extractor.bert_extractor import BertExtractor
+from src.extractor.pos_extractor import PosExtractor
+
+
+def time_calls(func: Callable[[str], Any], text: str, repeats: int, warmup: int = 2) -> list[float]:
+    for _ in range(warmup):
+        func(text)
+
+    latencies: list[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(text)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def benchmark_by_length(
+    func: Callable[[str], Any], lengths: Sequence[int], repeats: int
+) -> dict[int, dict[str, float]]:
+    return {length: latency_summary(time_calls(func, make_caption(length), repeats)) for length in lengths}
+
+
+def benchmark_extractors(
+    bert_config: BertExtractorSettings, lengths: Sequence[int], repeats: int, skip_bert: bool = False
+) -> dict[str, Any]:
+    """
+    Measures single text latency of PosExtractor.extract, BertExtractor.extract and
+    BertExtractor.get_adjectives_attentions for every caption length and process_attentions mode
+    """
+    pos_extractor = PosExtractor()
+    results: dict[str, Any] = {"pos_extractor.extract": benchmark_by_length(pos_extractor.extract, lengths, repeats)}
+    if skip_bert:
+        return results
+
+    for mode in ProcessAttentions:
+        extractor = BertExtractor(
+            bert_config.model_copy(update={"process_attentions": mode}), pos_extractor=pos_extractor
+        )
+        results[f"bert_extractor.extract[{mode}]"] = benchmark_by_length(extractor.extract, lengths, repeats)
+        results[f"bert_extractor.get_adjectives_attentions[{mode}]"] = benchmark_by_length(
+            extractor.get_adjectives_attentions, lengths, repeats
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of extractors across caption lengths")
+    parser.add_argument("--config", type=Path, default=CONFIGS_DIR / "bert_extractor_settings.yaml")
+    parser.add_argument("--app-config", type=Path, default=CONFIGS_DIR / "app_settings.yaml")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(CAPTION_LENGTHS), help="caption lengths")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--skip-bert", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    text_max_len = AppSettings.from_yaml(args.app_config).text_max_len
+    lengths = sorted({min(length, text_max_len) for length in args.lengths})
+    results = benchmark_extractors(
+        BertExtractorSettings.from_yaml(args.config), lengths=lengths, repeats=args.repeats, skip_bert=args.skip_bert
+    )
+    write_report("extractors", {"repeats": args.repeats, "text_max_len": text_max_len, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import threading
+import time
+from contextlib import aclosing, contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+import requests
+from aiohttp import web
+
+from src.benchmarks.common import (
+    CAPTION_LENGTHS,
+    latency_summary,
+    make_caption,
+    write_report,
+)
+from src.benchmarks.service import get_free_port
+from src.core.settings import CONFIGS_DIR, LLMExtractorSettings
+from src.extractor.llm_extractor import LLMExtractor
+from src.stubs.openai_stub import StubSettings, make_app
+
+CONCURRENCY_LEVELS = (1, 8, 32)
+N_STREAMED_TEXTS = 32
+
+
+@contextmanager
+def running_stub(settings: StubSettings, host: str = "127.0.0.1") -> Iterator[str]:
+    """
+    Serves OpenAI stub from background thread with its own event loop
+    :return: Iterator[str] - base url of stub
+    """
+    port = get_free_port(host)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(make_app(settings))
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, host, port).start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        loop.close()
+
+
+async def run_aextract_level(extractor: LLMExtractor, texts: Sequence[str], concurrency: int) -> dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def timed_extract(text: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await extractor.aextract(text)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(timed_extract(text) for text in texts))
+    finally:
+        await extractor.aclose()
+    wall_s = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "wall_s": wall_s,
+        "throughput_rps": len(texts) / wall_s,
+        **latency_summary(latencies),
+    }
+
+
+async def run_stream_comparison(extractor: LLMExtractor, texts: Sequence[str]) -> dict[str, Any]:
+    """
+    Compares latency of complete response with time to first object of streamed one, texts are run one by one
+    """
+    full_latencies: list[float] = []
+    first_object_latencies: list[float] = []
+    try:
+        for text in texts:
+            start = time.perf_counter()
+            await extractor.aextract(text)
+            full_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            async with aclosing(extractor.astream_objects(text)) as objects:
+                async for _ in objects:
+                    first_object_latencies.append(time.perf_counter() - start)
+                    break
+    finally:
+        await extractor.aclose()
+    return {"aextract": latency_summary(full_latencies), "first_object": latency_summary(first_object_latencies)}
+
+
+def benchmark_llm(
+    config: LLMExtractorSettings, stub_settings: StubSettings, texts: Sequence[str], concurrency_levels: Sequence[int]
+) -> dict[str, Any]:
+    """
+    Runs LLMExtractor single text and multi text paths against local OpenAI stub
+    """
+    with running_stub(stub_settings) as url:
+        # labels store would skip texts labelled by previous runs
+        extractor = LLMExtractor(config.model_copy(update={"openai_url": url, "labels_store_path": None}))
+
+        levels = [asyncio.run(run_aextract_level(extractor, texts, level)) for level in concurrency_levels]
+        stream = asyncio.run(run_stream_comparison(extractor, texts[:N_STREAMED_TEXTS]))
+
+        start = time.perf_counter()
+        extracted = extractor.extract_multiple(texts)
+        multi_wall_s = time.perf_counter() - start
+
+        stub_stats = requests.get(f"{url}/stats", timeout=10).json()
+        extractor.transport.close()
+
+    return {
+        "n_texts": len(texts),
+        "stub": vars(stub_settings),
+        "aextract": levels,
+        "stream": stream,
+        "extract_multiple": {
+            "batch_size": config.multi_request_batch_size,
+            "n_batches": extractor.successful_batches_count,
+            "n_retried_texts": extractor.retried_texts_count,
+            "n_extracted": sum(label is not None for label in extracted),
+            "wall_s": multi_wall_s,
+            "throughput_texts_per_s": len(texts) / multi_wall_s,
+        },
+        "stub_stats": stub_stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LLMExtractor against local OpenAI-compatible stub")
+    parser.add_argument("--config", type=Path, default=CONFIGS_DIR / "llm_extractor_settings.yaml")
+    parser.add_argument("--n-texts", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY_LEVELS))
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub response latency")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="stub generation time of each token")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="stub answers every N-th request with 429")
+    parser.add_argument(
+        "--malformed-rate", type=float, default=0.0, help="share of multi text stub responses with broken JSON"
+    )
+    parser.add_argument("--requests-per-minute", type=int, default=1_000_000, help="client side request limit")
+    parser.add_argument("--tokens-per-minute", type=int, default=1_000_000_000, help="client side token limit")
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    config = LLMExtractorSettings.from_yaml(args.config, openai_key="stub").model_copy(
+        update={
+            "max_concurrency": max(args.concurrency),
+            "requests_per_minute": args.requests_per_minute,
+            "tokens_per_minute": args.tokens_per_minute,
+        }
+    )
+    stub_settings = StubSettings(
+        latency_ms=args.latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        rate_limit_every=args.rate_limit_every,
+        retry_after_s=0.1,
+        malformed_rate=args.malformed_rate,
+    )
+    texts = [f"{make_caption(CAPTION_LENGTHS[i % 3])} {i}" for i in range(args.n_texts)]
+
+    results = benchmark_llm(config, stub_settings, texts, args.concurrency)
+    write_report("llm", {"requests_per_minute": args.requests_per_minute, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
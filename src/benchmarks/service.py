@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import itertools
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+import aiohttp
+import requests
+
+from src.benchmarks.common import (
+    CAPTION_LENGTHS,
+    latency_summary,
+    make_caption,
+    write_report,
+)
+from src.core.settings import ROOT_DIR
+
+CONCURRENCY_LEVELS = (1, 4, 16, 64)
+
+
+def get_free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen[bytes], timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server at {url} is not healthy after {timeout_s}s")
+
+
+@contextmanager
+def local_server(host: str = "127.0.0.1", startup_timeout_s: float = 300.0) -> Iterator[str]:
+    """
+    Starts uvicorn with src.fastapi_app:app on free port and stops it on exit
+    :return: Iterator[str] - base url of started server
+    """
+    port = get_free_port(host)
+    url = f"http://{host}:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.fastapi_app:app", "--host", host, "--port", str(port)],
+        cwd=ROOT_DIR,
+    )
+    try:
+        wait_until_healthy(url, process, startup_timeout_s)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run_level(
+    session: aiohttp.ClientSession, url: str, texts: Sequence[str], concurrency: int, n_requests: int, unique: bool
+) -> dict[str, Any]:
+    """
+    Sends n_requests to /extract from concurrency workers, each worker sends next request right after response
+    :param unique: append request number to text, so server side result cache never hits
+    """
+    request_ids = iter(range(n_requests))
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for request_id in request_ids:
+            text = texts[request_id % len(texts)]
+            payload = f"{text} {request_id}" if unique else text
+            start = time.perf_counter()
+            try:
+                async with session.post(f"{url}/extract", json=payload) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "wall_s": wall_s,
+        "throughput_rps": len(latencies) / wall_s,
+        **latency_summary(latencies),
+    }
+
+
+async def run_load(
+    url: str, texts: Sequence[str], concurrency_levels: Sequence[int], n_requests: int, unique: bool
+) -> list[dict[str, Any]]:
+    connector = aiohttp.TCPConnector(limit=max(concurrency_levels))
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        for text in itertools.islice(itertools.cycle(texts), 2 * len(texts)):
+            async with session.post(f"{url}/extract", json=text) as response:
+                response.raise_for_status()
+
+        return [
+            await run_level(session, url, texts, concurrency=level, n_requests=n_requests, unique=unique)
+            for level in concurrency_levels
+        ]
+
+
+def benchmark_service(
+    url: str, lengths: Sequence[int], concurrency_levels: Sequence[int], n_requests: int, unique: bool = True
+) -> dict[str, Any]:
+    texts = [make_caption(length) for length in lengths]
+    levels = asyncio.run(run_load(url, texts, concurrency_levels, n_requests=n_requests, unique=unique))
+    extractors = requests.get(f"{url}/extractors/stats", timeout=10).json()
+    return {"caption_lengths": list(lengths), "unique_texts": unique, "extractors": extractors, "levels": levels}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of /extract at several concurrency levels")
+    parser.add_argument("--url", default=None, help="benchmark running server instead of starting local uvicorn")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY_LEVELS))
+    parser.add_argument("--requests", type=int, default=256, help="requests per concurrency level")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(CAPTION_LENGTHS[:4]), help="caption lengths")
+    parser.add_argument(
+        "--unique-texts",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="make every request text unique to bypass result cache",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    def run(url: str) -> dict[str, Any]:
+        return benchmark_service(
+            url, args.lengths, args.concurrency, n_requests=args.requests, unique=args.unique_texts
+        )
+
+    if args.url is not None:
+        results = run(args.url)
+    else:
+        with local_server() as url:
+            results = run(url)
+    write_report("service", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
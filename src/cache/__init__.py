@@ -0,0 +1,3 @@
+from src.cache.result_cache import LRUCache, ResultCache, SQLiteResultStore
+
+__all__ = ["LRUCache", "ResultCache", "SQLiteResultStore"]
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Generic, Sequence, TypeVar
+
+from src.core.models import CacheStats, ExtractedObjectsDict
+from src.core.text import preprocess_text
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    def __init__(self, max_size: int, ttl_s: float | None = None):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._items: OrderedDict[str, tuple[V, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> V | None:
+        with self._lock:
+            if (item := self._items.get(key)) is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                self.expirations += 1
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: V) -> None:
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s is not None else float("inf")
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class SQLiteResultStore:
+    """
+    On-disk results storage, can be shared by several worker processes.
+    Expired results and the oldest ones above max_rows are deleted on start
+    """
+
+    def __init__(self, path: str | Path, ttl_s: float | None = None, max_rows: int | None = None):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_rows = max_rows
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, namespace TEXT NOT NULL, "
+                "value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+        self.purge_expired()
+
+    def get(self, key: str) -> ExtractedObjectsDict | None:
+        with self._lock:
+            row = self._connection.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self.ttl_s is not None and created_at + self.ttl_s < time.time():
+            return None
+        return json.loads(value)
+
+    def get_many(self, keys: Sequence[str]) -> list[ExtractedObjectsDict | None]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, scope: str, namespace: str, value: ExtractedObjectsDict) -> None:
+        self.set_many([key], scope=scope, namespace=namespace, values=[value])
+
+    def set_many(self, keys: Sequence[str], scope: str, namespace: str, values: Sequence[ExtractedObjectsDict]) -> None:
+        """
+        Writes all results in one transaction, so either all of them are stored or none
+        """
+        created_at = time.time()
+        rows = [(key, scope, namespace, json.dumps(value), created_at) for key, value in zip(keys, values)]
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO results (key, scope, namespace, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def purge_stale(self, scope: str, namespace: str) -> int:
+        """
+        Deletes results of scope computed with other namespace, i.e. by another model or settings
+        :return: int - number of deleted results
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM results WHERE scope = ? AND namespace != ?", (scope, namespace)
+            )
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """
+        Deletes results older than ttl_s, then the oldest results above max_rows
+        :return: int - number of deleted results
+        """
+        deleted = 0
+        with self._lock:
+            if self.ttl_s is not None:
+                cursor = self._connection.execute(
+                    "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_s,)
+                )
+                deleted += cursor.rowcount
+            if self.max_rows is not None:
+                cursor = self._connection.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+                deleted += cursor.rowcount
+        return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ResultCache:
+    """
+    Two-tier cache of extraction results: in-process LRU in front of optional on-disk store.
+    Keys are built from namespace (extractor type and hash of its fingerprint) and normalised text,
+    so any change of model or settings makes previous results unreachable. Async methods run on-disk
+    queries in a thread, so they don't block event loop
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        fingerprint: str,
+        max_size: int,
+        ttl_s: float | None = None,
+        db_path: str | Path | None = None,
+        purge_stale: bool = True,
+        max_disk_rows: int | None = None,
+    ):
+        self.scope = scope
+        self.namespace = f"{scope}:{hashlib.sha256(fingerprint.encode()).hexdigest()[:16]}"
+
+        self._memory: LRUCache[ExtractedObjectsDict] = LRUCache(max_size=max_size, ttl_s=ttl_s)
+        self._disk = SQLiteResultStore(db_path, ttl_s=ttl_s, max_rows=max_disk_rows) if db_path is not None else None
+        if self._disk is not None and purge_stale:
+            self._disk.purge_stale(scope=scope, namespace=self.namespace)
+
+        self._stats = CacheStats(namespace=self.namespace)
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{preprocess_text(text)}".encode()).hexdigest()
+
+    def get(self, text: str) -> ExtractedObjectsDict | None:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Sequence[str]) -> list[ExtractedObjectsDict | None]:
+        keys, values, missed = self._get_from_memory(texts)
+        if self._disk is not None and missed:
+            self._add_from_disk(keys, values, missed, self._disk.get_many([keys[i] for i in missed]))
+        self._stats.misses += sum(value is None for value in values)
+        return values
+
+    async def aget(self, text: str) -> ExtractedObjectsDict | None:
+        return (await self.aget_many([text]))[0]
+
+    async def aget_many(self, texts: Sequence[str]) -> list[ExtractedObjectsDict | None]:
+        keys, values, missed = self._get_from_memory(texts)
+        if self._disk is not None and missed:
+            disk_values = await asyncio.to_thread(self._disk.get_many, [keys[i] for i in missed])
+            self._add_from_disk(keys, values, missed, disk_values)
+        self._stats.misses += sum(value is None for value in values)
+        return values
+
+    def _get_from_memory(self, texts: Sequence[str]) -> tuple[list[str], list[ExtractedObjectsDict | None], list[int]]:
+        """
+        :return: tuple[list[str], list[ExtractedObjectsDict | None], list[int]] - keys, values found in memory
+            and positions of missed texts
+        """
+        keys = [self.make_key(text) for text in texts]
+        values = [self._memory.get(key) for key in keys]
+        missed = [i for i, value in enumerate(values) if value is None]
+        self._stats.memory_hits += len(values) - len(missed)
+        return keys, values, missed
+
+    def _add_from_disk(
+        self,
+        keys: Sequence[str],
+        values: list[ExtractedObjectsDict | None],
+        missed: Sequence[int],
+        disk_values: Sequence[ExtractedObjectsDict | None],
+    ) -> None:
+        for i, value in zip(missed, disk_values):
+            if value is not None:
+                self._stats.disk_hits += 1
+                self._memory.set(keys[i], value)
+                values[i] = value
+
+    def set(self, text: str, value: ExtractedObjectsDict) -> None:
+        self.set_many([text], [value])
+
+    def set_many(self, texts: Sequence[str], values: Sequence[ExtractedObjectsDict]) -> None:
+        keys = self._set_in_memory(texts, values)
+        if self._disk is not None:
+            self._disk.set_many(keys, scope=self.scope, namespace=self.namespace, values=values)
+
+    async def aset(self, text: str, value: ExtractedObjectsDict) -> None:
+        await self.aset_many([text], [value])
+
+    async def aset_many(self, texts: Sequence[str], values: Sequence[ExtractedObjectsDict]) -> None:
+        keys = self._set_in_memory(texts, values)
+        if self._disk is not None:
+            await asyncio.to_thread(
+                self._disk.set_many, keys, scope=self.scope, namespace=self.namespace, values=values
+            )
+
+    def _set_in_memory(self, texts: Sequence[str], values: Sequence[ExtractedObjectsDict]) -> list[str]:
+        keys = [self.make_key(text) for text in texts]
+        for key, value in zip(keys, values):
+            self._memory.set(key, value)
+        return keys
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats.model_copy(
+            update={
+                "size": len(self._memory),
+                "evictions": self._memory.evictions,
+                "expirations": self._memory.expirations,
+            }
+        )
@@ -0,0 +1,44 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+DEFAULT_MAX_WORKERS = 4
+
+_cpu_executor: ThreadPoolExecutor | None = None
+
+
+def configure_cpu_executor(max_workers: int | None = None) -> ThreadPoolExecutor:
+    """
+    (Re)creates executor for CPU-bound extraction work (spaCy, BERT), separate from AnyIO threadpool,
+    so blocking work of one kind doesn't starve the other
+    """
+    global _cpu_executor
+    shutdown_cpu_executor()
+    _cpu_executor = ThreadPoolExecutor(
+        max_workers=max_workers or min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1), thread_name_prefix="cpu-extract"
+    )
+    return _cpu_executor
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    return _cpu_executor if _cpu_executor is not None else configure_cpu_executor()
+
+
+def shutdown_cpu_executor() -> None:
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
+
+
+async def run_in_cpu_executor(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_cpu_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
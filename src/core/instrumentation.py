@@ -0,0 +1,258 @@
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Mapping, Sequence, TypeVar
+
+LabelValues = tuple[str, ...]
+Sample = tuple[Mapping[str, str], float]
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+DEFAULT_LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def format_sample(name: str, labels: Mapping[str, str], value: float) -> str:
+    if not labels:
+        return f"{name} {format_value(value)}"
+    rendered = ",".join(f'{key}="{escape_label_value(str(label))}"' for key, label in labels.items())
+    return f"{name}{{{rendered}}} {format_value(value)}"
+
+
+def format_family(name: str, kind: str, help_text: str, samples: Iterable[Sample]) -> list[str]:
+    """
+    Renders metric family in Prometheus text exposition format
+    """
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + [
+        format_sample(name, labels, value) for labels, value in samples
+    ]
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def label_values(self, labels: Mapping[str, str]) -> LabelValues:
+        if labels.keys() != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def render(self) -> list[str]: ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self.label_values(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return format_family(
+            self.name, self.kind, self.help_text, ((dict(zip(self.label_names, key)), value) for key, value in values)
+        )
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_in_progress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_S,
+    ):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: non-cumulative bucket counts (last one is +Inf), sum of observations
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if (counts := self._counts.get(key)) is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[bucket_index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels: str) -> int:
+        return sum(self._counts.get(self.label_values(labels), []))
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, counts, total in snapshot:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for upper_bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                lines.append(
+                    format_sample(f"{self.name}_bucket", labels | {"le": format_value(upper_bound)}, cumulative)
+                )
+            lines.append(format_sample(f"{self.name}_sum", labels, total))
+            lines.append(format_sample(f"{self.name}_count", labels, cumulative))
+        return lines
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_S,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> list[str]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [line for metric in metrics for line in metric.render()]
+
+
+metrics_registry = MetricsRegistry()
+
+EXTRACTOR_STAGE_SECONDS = metrics_registry.histogram(
+    "extractor_stage_duration_seconds",
+    "Duration of extractor pipeline stage, observed once per extract or extract_batch call",
+    label_names=("extractor", "stage"),
+)
+EXTRACT_REQUESTS = metrics_registry.counter(
+    "extract_requests_total", "Number of extraction requests", label_names=("extractor", "endpoint", "outcome")
+)
+EXTRACT_TEXTS = metrics_registry.counter(
+    "extract_texts_total", "Number of texts received for extraction", label_names=("extractor", "endpoint")
+)
+EXTRACT_TRUNCATED_TEXTS = metrics_registry.counter(
+    "extract_truncated_texts_total",
+    "Number of texts truncated to text length limit",
+    label_names=("extractor", "endpoint"),
+)
+EXTRACT_REQUEST_SECONDS = metrics_registry.histogram(
+    "extract_request_duration_seconds", "Duration of extraction request handling", label_names=("extractor", "endpoint")
+)
+EXTRACT_REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    "extract_requests_in_flight", "Number of extraction requests being handled", label_names=("extractor", "endpoint")
+)
+EXTRACT_FIRST_OBJECT_SECONDS = metrics_registry.histogram(
+    "extract_first_object_seconds",
+    "Time from start of incremental extraction to its first object",
+    label_names=("extractor", "endpoint"),
+)
+CASCADE_TIER_TEXTS = metrics_registry.counter(
+    "cascade_tier_texts_total", "Number of texts resolved by each tier of cascade extractor", label_names=("tier",)
+)
+BATCHER_BATCH_SIZE = metrics_registry.histogram(
+    "batcher_batch_size",
+    "Number of items in micro-batch",
+    label_names=("extractor_type",),
+    buckets=BATCH_SIZE_BUCKETS,
+)
+STARTUP_PHASE_SECONDS = metrics_registry.gauge(
+    "startup_phase_duration_seconds",
+    "Duration of startup phase: import, model_load, first_inference and total from process start to ready",
+    label_names=("phase",),
+)
+
+
+@contextmanager
+def track_request(extractor: str, endpoint: str) -> Iterator[None]:
+    """
+    Counts request by outcome, tracks it as in flight and times it
+    """
+    outcome = "error"
+    with EXTRACT_REQUESTS_IN_FLIGHT.track_in_progress(extractor=extractor, endpoint=endpoint):
+        start = time.perf_counter()
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            EXTRACT_REQUEST_SECONDS.observe(time.perf_counter() - start, extractor=extractor, endpoint=endpoint)
+            EXTRACT_REQUESTS.inc(extractor=extractor, endpoint=endpoint, outcome=outcome)
+
+
+def record_texts(extractor: str, endpoint: str, n_texts: int, n_truncated: int) -> None:
+    EXTRACT_TEXTS.inc(n_texts, extractor=extractor, endpoint=endpoint)
+    if n_truncated:
+        EXTRACT_TRUNCATED_TEXTS.inc(n_truncated, extractor=extractor, endpoint=endpoint)
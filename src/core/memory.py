@@ -0,0 +1,40 @@
+import os
+import resource
+import sys
+
+from src.core.models import MemoryUsage
+
+_STATM_PATH = "/proc/self/statm"
+_SMAPS_ROLLUP_PATH = "/proc/{pid}/smaps_rollup"
+_KIB = 1024
+
+
+def get_rss_bytes() -> int:
+    try:
+        with open(_STATM_PATH) as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def get_memory_usage(pid: int | str = "self") -> MemoryUsage | None:
+    """
+    Reads resident memory split into pages shared with other processes (e.g. model weights inherited
+    from parent or mapped from the same file) and private pages
+    :return: MemoryUsage | None - None where /proc/<pid>/smaps_rollup is unavailable (non-Linux, exited process)
+    """
+    try:
+        with open(_SMAPS_ROLLUP_PATH.format(pid=pid)) as file:
+            fields = {parts[0].rstrip(":"): int(parts[1]) * _KIB for line in file if len(parts := line.split()) == 3}
+    except (OSError, ValueError):
+        return None
+
+    return MemoryUsage(
+        rss_bytes=fields.get("Rss", 0),
+        pss_bytes=fields.get("Pss", 0),
+        shared_bytes=fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        private_bytes=fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    )
@@ -1,7 +1,7 @@
 from enum import StrEnum, auto
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 
 
 class ExtractedObjectsDict(TypedDict):
@@ -18,6 +18,34 @@ class ExtractObjectsResponseDict(TypedDict):
     input_text_truncated: bool
 
 
+class ExtractObjectsBatchResponse(BaseModel):
+    results: list[ExtractObjectsResponse]
+
+
+class ExtractObjectsBatchResponseDict(TypedDict):
+    results: list[ExtractObjectsResponseDict]
+
+
+class ExtractObjectsStreamLine(BaseModel):
+    line: int
+    result: ExtractedObjectsDict | None = None
+    input_text_truncated: bool = False
+    error: str | None = None
+
+
+class ExtractObjectsStreamLineDict(TypedDict):
+    line: int
+    result: ExtractedObjectsDict | None
+    input_text_truncated: bool
+    error: str | None
+
+
+class ExtractedObjectLine(BaseModel):
+    object: str | None = None
+    descriptions: list[str] = []
+    error: str | None = None
+
+
 class PartOfSpeech(StrEnum):
     noun = "NOUN"
     proper_noun = "PROPN"
@@ -38,10 +66,129 @@ class LLMResponseChoiceDict(TypedDict):
     message: LLMResponseMessageDict
 
 
+class LLMUsageDict(TypedDict):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+
 class LLMResponseJSON(TypedDict):
     choices: list[LLMResponseChoiceDict]
+    usage: NotRequired[LLMUsageDict]
+
+
+class LLMStreamDeltaDict(TypedDict):
+    role: NotRequired[str]
+    content: NotRequired[str | None]
+
+
+class LLMStreamChoiceDict(TypedDict):
+    delta: LLMStreamDeltaDict
+
+
+class LLMStreamChunkJSON(TypedDict):
+    choices: list[LLMStreamChoiceDict]
+    usage: NotRequired[LLMUsageDict | None]
 
 
 class ProcessAttentions(StrEnum):
     get_first = auto()
     get_all_mean = auto()
+
+
+class CascadeTier(StrEnum):
+    pos = auto()
+    bert = auto()
+    llm = auto()
+
+
+class BertBackend(StrEnum):
+    torch_eager = auto()
+    torch_int8 = auto()
+    onnx = auto()
+
+
+class ExtractorLoadStats(BaseModel):
+    extractor_type: str
+    load_time_s: float
+    rss_delta_bytes: int
+
+
+class StartupReport(BaseModel):
+    extractor_type: str
+    ready: bool = False
+    # process start to application startup: interpreter start and imports
+    import_s: float | None = None
+    model_load_s: float | None = None
+    first_inference_s: float | None = None
+    # process start to ready
+    total_s: float | None = None
+    error: str | None = None
+
+
+class MemoryUsage(BaseModel):
+    rss_bytes: int
+    pss_bytes: int
+    shared_bytes: int
+    private_bytes: int
+
+
+class BatchingStats(BaseModel):
+    batches_total: int = 0
+    items_total: int = 0
+    failed_batches_total: int = 0
+    batch_size_histogram: dict[int, int] = {}
+    queue_wait_s_sum: float = 0.0
+    queue_wait_s_max: float = 0.0
+    queue_wait_s_p50: float = 0.0
+    queue_wait_s_p99: float = 0.0
+    busy_s_sum: float = 0.0
+
+    @computed_field
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items_total / self.batches_total if self.batches_total else 0.0
+
+    @computed_field
+    @property
+    def items_per_busy_second(self) -> float:
+        return self.items_total / self.busy_s_sum if self.busy_s_sum else 0.0
+
+
+class CacheStats(BaseModel):
+    namespace: str
+    size: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @computed_field
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class EvaluationReport(BaseModel):
+    n_examples: int
+    n_scored_examples: int
+    precision: float
+    recall: float
+    f1: float
+    recall_with_penalty: float
+    micro_precision: float
+    micro_recall: float
+    micro_f1: float
+
+
+class TraceInfo(BaseModel):
+    trace_id: str
+    created_at: float
+    host: str
+    extractor_type: str
+    text_length: int
+    duration_s: float
+    files: list[str]
+    size_bytes: int = 0
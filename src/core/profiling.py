@@ -0,0 +1,184 @@
+import cProfile
+import io
+import pstats
+import random
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Mapping, TypeVar
+
+from loguru import logger
+
+from src.core.models import TraceInfo
+
+R = TypeVar("R")
+
+META_FILE_NAME = "meta.json"
+TRUE_FLAGS = {"1", "true", "yes", "on"}
+N_STATS_LINES = 60
+trace_id_pattern = re.compile(r"^\w[\w.-]*$")
+
+
+class TraceStore:
+    """
+    Directory of traces, one subdirectory per trace. Oldest traces are deleted once
+    number of traces or their total size exceeds limits
+    """
+
+    def __init__(self, directory: Path, max_traces: int, max_total_bytes: int):
+        self.directory = directory
+        self.max_traces = max_traces
+        self.max_total_bytes = max_total_bytes
+        self._lock = threading.Lock()
+
+    def new_trace_dir(self) -> tuple[str, Path]:
+        trace_id = f"{time.strftime('%Y%m%dT%H%M%S')}_{socket.gethostname()}_{uuid.uuid4().hex[:8]}"
+        tmp_dir = self.directory / f".{trace_id}.tmp"
+        tmp_dir.mkdir(parents=True)
+        return trace_id, tmp_dir
+
+    def commit(self, trace_id: str, tmp_dir: Path, info: TraceInfo) -> None:
+        """
+        Writes metadata and publishes trace by renaming its temporary directory, then rotates the store
+        """
+        info.size_bytes = sum(path.stat().st_size for path in tmp_dir.iterdir())
+        (tmp_dir / META_FILE_NAME).write_text(info.model_dump_json(indent=2))
+        tmp_dir.rename(self.directory / trace_id)
+        self.rotate()
+
+    def rotate(self) -> None:
+        with self._lock:
+            traces = self.list()
+            total_bytes = sum(trace.size_bytes for trace in traces)
+            while traces and (len(traces) > self.max_traces or total_bytes > self.max_total_bytes):
+                oldest = traces.pop()
+                total_bytes -= oldest.size_bytes
+                # other replicas share the volume and may have deleted it already
+                shutil.rmtree(self.directory / oldest.trace_id, ignore_errors=True)
+
+    def list(self) -> list[TraceInfo]:
+        """
+        :return: list[TraceInfo] - traces from newest to oldest
+        """
+        if not self.directory.exists():
+            return []
+
+        traces: list[TraceInfo] = []
+        for meta_path in self.directory.glob(f"*/{META_FILE_NAME}"):
+            try:
+                traces.append(TraceInfo.model_validate_json(meta_path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return sorted(traces, key=lambda trace: trace.created_at, reverse=True)
+
+    def get_file(self, trace_id: str, file_name: str) -> Path | None:
+        if not trace_id_pattern.match(trace_id) or not trace_id_pattern.match(file_name):
+            return None
+        path = self.directory / trace_id / file_name
+        return path if path.is_file() else None
+
+
+class RequestProfiler:
+    """
+    Profiles sampled or explicitly flagged extraction calls with cProfile and, optionally, torch.profiler.
+    Both profilers are process-wide, so one call is profiled at a time and calls arriving meanwhile run unprofiled
+    """
+
+    def __init__(self, store: TraceStore, sample_rate: float, header: str, with_torch: bool):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.header = header
+        self.with_torch = with_torch
+        self._active = threading.Lock()
+
+    def should_profile(self, headers: Mapping[str, str], trusted: bool = False) -> bool:
+        """
+        :param trusted: request is authorised to force profiling with header, otherwise only sampling applies
+        """
+        if trusted and (flag := headers.get(self.header)) is not None:
+            return flag.lower() in TRUE_FLAGS
+        return random.random() < self.sample_rate
+
+    def profile_call(
+        self, func: Callable[[str], R], text: str, extractor_type: str, with_torch: bool = False
+    ) -> tuple[R, str | None]:
+        """
+        Runs func(text) under profilers and saves trace
+        :param with_torch: also record torch operators, for extractors running torch models
+        :return: tuple[R, str | None] - result of func and trace id, None if another call was being profiled
+        """
+        if not self._active.acquire(blocking=False):
+            return func(text), None
+        try:
+            return self._profile_call(func, text, extractor_type, with_torch)
+        finally:
+            self._active.release()
+
+    def _profile_call(
+        self, func: Callable[[str], R], text: str, extractor_type: str, with_torch: bool
+    ) -> tuple[R, str]:
+        trace_id, tmp_dir = self.store.new_trace_dir()
+        python_profile = cProfile.Profile()
+        torch_profile = self._make_torch_profiler() if self.with_torch and with_torch else None
+
+        start = time.perf_counter()
+        try:
+            with torch_profile if torch_profile is not None else nullcontext():
+                python_profile.enable()
+                try:
+                    result = func(text)
+                finally:
+                    python_profile.disable()
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        duration_s = time.perf_counter() - start
+
+        files = self._dump_python_profile(python_profile, tmp_dir)
+        if torch_profile is not None:
+            files += self._dump_torch_profile(torch_profile, tmp_dir)
+
+        self.store.commit(
+            trace_id,
+            tmp_dir,
+            TraceInfo(
+                trace_id=trace_id,
+                created_at=time.time(),
+                host=socket.gethostname(),
+                extractor_type=extractor_type,
+                text_length=len(text),
+                duration_s=duration_s,
+                files=files,
+            ),
+        )
+        logger.info(f"Saved trace {trace_id} of {extractor_type} for text of length {len(text)}: {duration_s:.3f}s")
+        return result, trace_id
+
+    @staticmethod
+    def _make_torch_profiler() -> Any:
+        from torch.profiler import ProfilerActivity, profile
+
+        return profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+
+    @staticmethod
+    def _dump_python_profile(python_profile: cProfile.Profile, trace_dir: Path) -> list[str]:
+        python_profile.dump_stats(trace_dir / "python.pstats")
+        summary = io.StringIO()
+        pstats.Stats(python_profile, stream=summary).sort_stats("cumulative").print_stats(N_STATS_LINES)
+        (trace_dir / "python.txt").write_text(summary.getvalue())
+        return ["python.pstats", "python.txt"]
+
+    @staticmethod
+    def _dump_torch_profile(torch_profile: Any, trace_dir: Path) -> list[str]:
+        torch_profile.export_chrome_trace(str(trace_dir / "torch_trace.json"))
+        (trace_dir / "torch_ops.txt").write_text(
+            torch_profile.key_averages(group_by_input_shape=True).table(
+                sort_by="self_cpu_time_total", row_limit=N_STATS_LINES
+            )
+        )
+        return ["torch_trace.json", "torch_ops.txt"]
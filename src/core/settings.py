@@ -6,7 +6,7 @@ import yaml
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings
 
-from src.core.models import ProcessAttentions
+from src.core.models import BertBackend, ProcessAttentions
 
 ROOT_DIR = Path.cwd()
 CONFIGS_DIR = ROOT_DIR / "configs"
@@ -16,11 +16,40 @@ class ExtractorType(StrEnum):
     pos_extractor = auto()
     llm_extractor = auto()
     bert_extractor = auto()
+    cascade_extractor = auto()
 
 
 class AppSettings(BaseSettings):
     text_max_len: int = 1024
+    long_text_max_len: int = 65536
+    batch_max_texts: int = 1024
+    stream_batch_size: int = 64
+    stream_max_in_flight_batches: int = 4
+    stream_max_line_len: int = 2**20
     api_selected_extractor: ExtractorType = ExtractorType.bert_extractor
+    cpu_executor_workers: int | None = None
+    warm_up_text: str = "a small white dog runs on green grass"
+
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 1
+    server_torch_threads: int | None = None
+    server_memory_report_interval_s: float = 60.0
+
+    result_cache_enabled: bool = True
+    result_cache_max_size: int = 100_000
+    result_cache_ttl_s: float | None = None
+    result_cache_db_path: Path | None = None
+    result_cache_db_max_rows: int | None = 1_000_000
+
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0
+    profiling_header: str = "X-Profile"
+    profiling_torch: bool = True
+    profiling_traces_dir: Path = ROOT_DIR / "data" / "traces"
+    profiling_max_traces: int = 200
+    profiling_max_total_bytes: int = 256 * 2**20
+    admin_token: SecretStr | None = None
 
     @classmethod
     def from_yaml(cls, config_path: str | Path, common_settings_path: str | Path = "") -> "AppSettings":
@@ -44,11 +73,16 @@ class PosExtractorSettings(BaseSettings):
 class ExtractorClientSettings(AppSettings):
     extractor_url: str = ""
     extract_objects_handler: str = "/extract"
+    extract_objects_batch_handler: str = "/extract/batch"
 
     @property
     def extract_object_endpoint(self) -> str:
         return self.extractor_url + self.extract_objects_handler
 
+    @property
+    def extract_objects_batch_endpoint(self) -> str:
+        return self.extractor_url + self.extract_objects_batch_handler
+
     @classmethod
     def from_yaml(cls, config_path: str | Path, common_settings_path: str | Path = "") -> "ExtractorClientSettings":
         with open(config_path) as file:
@@ -58,6 +92,20 @@ class ExtractorClientSettings(AppSettings):
         return cls(**config)
 
 
+class CascadeExtractorSettings(BaseSettings):
+    # texts with POS confidence below threshold are escalated to BERT, 1.0 escalates every ambiguous text
+    bert_threshold: float = 1.0
+    llm_enabled: bool = False
+    # texts escalated to BERT with attention margin below threshold are escalated to LLM
+    llm_threshold: float = 0.1
+
+    @classmethod
+    def from_yaml(cls, config_path: str | Path) -> "CascadeExtractorSettings":
+        with open(config_path) as file:
+            config = yaml.safe_load(file)
+        return cls(**config)
+
+
 class LLMExtractorSettings(BaseSettings):
     openai_key: SecretStr
     prompt_task: str = ""
@@ -72,8 +120,22 @@ class LLMExtractorSettings(BaseSettings):
     openai_handler: str = "/v1/chat/completions"
 
     multi_request_batch_size: int = 16
+    multi_request_max_input_tokens: int = 4096
+    multi_request_max_output_tokens: int = 4096
+    multi_request_label_tokens: int = 16
     max_retries: int = 10
 
+    max_concurrency: int = 8
+    max_open_streams: int = 32
+    requests_per_minute: int = 500
+    tokens_per_minute: int = 30_000
+    expected_completion_tokens: int = 256
+    request_timeout_s: float = 120.0
+    backoff_base_s: float = 1.0
+    backoff_max_s: float = 60.0
+
+    labels_store_path: Path | None = None
+
     @property
     def openai_endpoint(self) -> str:
         return self.openai_url + self.openai_handler
@@ -82,10 +144,9 @@ class LLMExtractorSettings(BaseSettings):
         return self.prompt_task + self.prompt_example + self.prompt_input.format(input_text=input_text)
 
     def make_multi_texts_prompt(self, input_texts: Iterable[str]) -> str:
+        numbered_texts = "\n".join(f"{position}. <{text}>" for position, text in enumerate(input_texts, start=1))
         return (
-            self.prompt_task
-            + self.multi_text_prompt_example
-            + self.multi_text_input.format(input_texts=[f"<{input_text}>" for input_text in input_texts])
+            self.prompt_task + self.multi_text_prompt_example + self.multi_text_input.format(input_texts=numbered_texts)
         )
 
     @classmethod
@@ -110,6 +171,31 @@ class BertExtractorSettings(BaseSettings):
     pretrained_model_name: str = "google-bert/bert-base-uncased"
     process_attentions: ProcessAttentions
     n_blocks_to_average: int = 12
+    # (layer, head) pairs to average instead of all heads of process_attentions layers, see src.metrics.head_calibration
+    selected_heads: list[tuple[int, int]] | None = None
+    prune_heads: bool = True
+    truncate_encoder: bool = True
+    reduce_selected_attentions_only: bool = True
+    chunking_enabled: bool = False
+    chunk_max_tokens: int = 128
+
+    backend: BertBackend = BertBackend.torch_eager
+    mmap_weights: bool = False
+    onnx_model_path: Path = ROOT_DIR / "data" / "onnx" / "bert_attentions.onnx"
+
+    batching_enabled: bool = True
+    max_batch_size: int = 16
+    max_wait_ms: float = 5.0
+
+    @property
+    def n_layers_needed(self) -> int:
+        if self.selected_heads:
+            return max(layer for layer, _ in self.selected_heads) + 1
+        match self.process_attentions:
+            case ProcessAttentions.get_first:
+                return 1
+            case ProcessAttentions.get_all_mean:
+                return self.n_blocks_to_average
 
     @classmethod
     def from_yaml(cls, config_path: str | Path) -> "BertExtractorSettings":
@@ -0,0 +1,7 @@
+import re
+
+multiple_spaces_pattern = re.compile(r"\s{2,}")
+
+
+def preprocess_text(text: str) -> str:
+    return re.sub(multiple_spaces_pattern, " ", text).lower().strip()
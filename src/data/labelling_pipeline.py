@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+from loguru import logger
+from pydantic import BaseModel
+
+from src.core.settings import ROOT_DIR
+from src.data.utils import doc_has_objectives, make_labels_from_doc, parse_texts
+from src.extractor.pos_extractor import (
+    SPACY_MODEL_NAME,
+    SPACY_PIPE_BATCH_SIZE,
+    load_spacy_pipeline,
+)
+
+DATA_DIR = ROOT_DIR / "data"
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+SHARD_FILE_TEMPLATE = "labels_{:05d}.csv"
+SHARD_FILE_GLOB = "labels_*.csv"
+CHUNK_END = -1
+
+
+class ChunkStats(BaseModel):
+    n_rows: int = 0
+    n_unparsed_rows: int = 0
+    n_texts: int = 0
+    n_labelled: int = 0
+    elapsed_s: float = 0.0
+
+
+class LabellingCheckpoint(BaseModel):
+    input_path: str
+    input_size: int
+    text_column: str
+    chunk_size: int
+    parse_rows: bool
+    completed_chunks: dict[int, ChunkStats] = {}
+
+    def is_compatible(self, other: "LabellingCheckpoint") -> bool:
+        return self.model_dump(exclude={"completed_chunks"}) == other.model_dump(exclude={"completed_chunks"})
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """
+    Writes file through temporary sibling, so interrupted run never leaves partial shard or checkpoint
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(output_dir: Path, expected: LabellingCheckpoint) -> LabellingCheckpoint:
+    checkpoint_path = output_dir / CHECKPOINT_FILE_NAME
+    if not checkpoint_path.exists():
+        return expected
+
+    checkpoint = LabellingCheckpoint.model_validate_json(checkpoint_path.read_text(encoding="utf-8"))
+    if not checkpoint.is_compatible(expected):
+        raise ValueError(f"Checkpoint {checkpoint_path} was made for other input or options, use --overwrite")
+
+    logger.info(f"Resuming from checkpoint, {len(checkpoint.completed_chunks)} chunks already labelled")
+    return checkpoint
+
+
+def chunk_texts(chunk: pd.DataFrame, text_column: str, parse_rows: bool, stats: ChunkStats) -> list[str]:
+    texts: list[str] = []
+    for raw in chunk[text_column].dropna().astype(str):  # pyright: ignore
+        parsed = parse_texts(raw) if parse_rows else [raw]  # pyright: ignore
+        if parsed is None:
+            stats.n_unparsed_rows += 1
+            continue
+        texts.extend(parsed)
+
+    stats.n_rows = len(chunk)
+    stats.n_texts = len(texts)
+    return texts
+
+
+def iter_pending_texts(
+    input_path: Path, checkpoint: LabellingCheckpoint, chunk_stats: dict[int, ChunkStats]
+) -> Iterator[tuple[str, tuple[int, int]]]:
+    """
+    Yields (text, (chunk index, text index)) of chunks missing in checkpoint, every chunk is closed
+    with empty text marked by CHUNK_END, so consumer knows when its shard is complete
+    """
+    chunks = pd.read_csv(input_path, chunksize=checkpoint.chunk_size)  # pyright: ignore
+    for chunk_index, chunk in enumerate(chunks):  # pyright: ignore
+        if chunk_index in checkpoint.completed_chunks:
+            continue
+
+        stats = chunk_stats[chunk_index] = ChunkStats()
+        for text_index, text in enumerate(chunk_texts(chunk, checkpoint.text_column, checkpoint.parse_rows, stats)):
+            yield text, (chunk_index, text_index)
+        yield "", (chunk_index, CHUNK_END)
+
+
+def run_pipeline(
+    input_path: Path,
+    output_dir: Path,
+    text_column: str = "captions",
+    chunk_size: int = 10_000,
+    parse_rows: bool = True,
+    n_process: int = 1,
+    batch_size: int = SPACY_PIPE_BATCH_SIZE,
+    spacy_model_name: str = SPACY_MODEL_NAME,
+    overwrite: bool = False,
+) -> ChunkStats:
+    """
+    Labels captions with spaCy dependency parse, texts without adjectives are filtered out.
+    Every input chunk is written to its own shard and recorded in checkpoint, so rerun skips labelled chunks
+    :param input_path: CSV with captions
+    :param output_dir: directory for shards and checkpoint
+    :param text_column: column with captions
+    :param chunk_size: number of CSV rows per shard
+    :param parse_rows: rows hold list of captions from original dataset, parse them with parse_texts
+    :param n_process: number of spaCy worker processes
+    :param batch_size: spaCy pipe batch size
+    :param spacy_model_name: name of installed spaCy pipeline
+    :param overwrite: drop existing checkpoint and shards
+    :return: ChunkStats - totals of this run
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if overwrite:
+        for path in [*output_dir.glob(SHARD_FILE_GLOB), output_dir / CHECKPOINT_FILE_NAME]:
+            path.unlink(missing_ok=True)
+
+    checkpoint = load_checkpoint(
+        output_dir,
+        LabellingCheckpoint(
+            input_path=str(input_path.resolve()),
+            input_size=input_path.stat().st_size,
+            text_column=text_column,
+            chunk_size=chunk_size,
+            parse_rows=parse_rows,
+        ),
+    )
+    nlp = load_spacy_pipeline(spacy_model_name)
+    chunk_stats: dict[int, ChunkStats] = {}
+    total = ChunkStats()
+    rows: list[dict[str, str]] = []
+    started_at = chunk_started_at = time.perf_counter()
+
+    docs = nlp.pipe(
+        iter_pending_texts(input_path, checkpoint, chunk_stats),
+        as_tuples=True,
+        n_process=n_process,
+        batch_size=batch_size,
+    )
+    for doc, (chunk_index, text_index) in docs:
+        if text_index != CHUNK_END:
+            if doc_has_objectives(doc):
+                rows.append({"text": doc.text, "labels": json.dumps(make_labels_from_doc(doc))})
+            continue
+
+        stats = chunk_stats.pop(chunk_index)
+        stats.n_labelled = len(rows)
+        stats.elapsed_s = time.perf_counter() - chunk_started_at
+        write_atomic(
+            output_dir / SHARD_FILE_TEMPLATE.format(chunk_index),
+            pd.DataFrame(rows, columns=["text", "labels"]).to_csv(index=False),  # pyright: ignore
+        )
+        checkpoint.completed_chunks[chunk_index] = stats
+        write_atomic(output_dir / CHECKPOINT_FILE_NAME, checkpoint.model_dump_json(indent=2))
+
+        for field in ("n_rows", "n_unparsed_rows", "n_texts", "n_labelled"):
+            setattr(total, field, getattr(total, field) + getattr(stats, field))
+        logger.info(
+            f"Chunk {chunk_index}: {stats.n_labelled}/{stats.n_texts} texts labelled, "
+            f"{stats.n_texts / max(stats.elapsed_s, 1e-9):.1f} docs/s"
+        )
+        rows = []
+        chunk_started_at = time.perf_counter()
+
+    total.elapsed_s = time.perf_counter() - started_at
+    logger.info(
+        f"Labelled {total.n_labelled}/{total.n_texts} texts from {total.n_rows} rows "
+        f"({total.n_unparsed_rows} unparsed) in {total.elapsed_s:.1f}s, "
+        f"{total.n_texts / max(total.elapsed_s, 1e-9):.1f} docs/s"
+    )
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Label captions with spaCy in parallel, resumable by chunks")
+    parser.add_argument("--input", type=Path, required=True, help="CSV with captions")
+    parser.add_argument("--output-dir", type=Path, default=DATA_DIR / "labels")
+    parser.add_argument("--text-column", default="captions")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="CSV rows per shard")
+    parser.add_argument(
+        "--parse-rows",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="rows hold list of captions from original dataset",
+    )
+    parser.add_argument("--n-process", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=SPACY_PIPE_BATCH_SIZE)
+    parser.add_argument("--spacy-model", default=SPACY_MODEL_NAME)
+    parser.add_argument("--overwrite", action="store_true", help="drop existing checkpoint and shards")
+    args = parser.parse_args()
+
+    run_pipeline(
+        input_path=args.input,
+        output_dir=args.output_dir,
+        text_column=args.text_column,
+        chunk_size=args.chunk_size,
+        parse_rows=args.parse_rows,
+        n_process=args.n_process,
+        batch_size=args.batch_size,
+        spacy_model_name=args.spacy_model,
+        overwrite=args.overwrite,
+    )
+
+
+if __name__ == "__main__":
+    main()
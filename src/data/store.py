@@ -0,0 +1,419 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from loguru import logger
+
+from src.cache import ResultCache
+from src.core.models import ExtractedObjectsDict
+from src.core.settings import ROOT_DIR
+from src.core.text import preprocess_text
+from src.extractor.base import BaseObjectsExtractor
+from src.metrics.engine import (
+    EvaluationResult,
+    IntArray,
+    Objects,
+    PairTable,
+    predict,
+    score_pairs,
+    unwrap_objects,
+)
+
+DATA_DIR = ROOT_DIR / "data"
+STORE_DIR = DATA_DIR / "store"
+CAPTIONS_FILE_NAME = "captions.arrow"
+VOCABULARY_FILE_NAME = "vocabulary.arrow"
+LABELS_DIR_NAME = "labels"
+LABELS_FILE_SUFFIX = ".arrow"
+# adjective id of noun without adjectives
+NO_ADJECTIVE = -1
+# "~" labels line is text, "~" and JSON object, text itself may contain "~"
+TILDE_SEPARATOR = "~{"
+
+column_name_pattern = re.compile(r"^[\w.-]+$")
+PAIR_TYPE = pa.struct([("noun", pa.int32()), ("adjective", pa.int32())])
+PAIRS_TYPE = pa.list_(PAIR_TYPE)
+LABELS_SCHEMA = pa.schema([("pairs", PAIRS_TYPE)])
+CAPTIONS_SCHEMA = pa.schema([("text", pa.large_string())])
+VOCABULARY_SCHEMA = pa.schema([("word", pa.large_string()), ("lower_id", pa.int32())])
+
+Labels = Objects | ExtractedObjectsDict
+BoolArray = npt.NDArray[np.bool_]
+
+
+def read_table(path: Path) -> pa.Table:
+    """
+    Memory-maps Arrow IPC file, columns reference mapped pages, so nothing is copied until values are converted
+    """
+    return ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def write_table(path: Path, table: pa.Table) -> None:
+    """
+    Writes table as single record batch through temporary sibling. Replaced file stays mapped by open readers
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table.combine_chunks(), max_chunksize=max(table.num_rows, 1))
+    os.replace(tmp_path, path)
+
+
+def single_chunk(column: pa.ChunkedArray) -> pa.Array:
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+
+class WordVocabulary:
+    """
+    Interns nouns and adjectives into int32 ids, lower_id is id of lowercased word used for scoring
+    """
+
+    def __init__(self, table: pa.Table | None = None):
+        self.words: list[str] = table.column("word").to_pylist() if table is not None else []
+        self.lower_ids: list[int] = table.column("lower_id").to_pylist() if table is not None else []
+        self.ids = {word: word_id for word_id, word in enumerate(self.words)}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def add(self, word: str) -> int:
+        if (word_id := self.ids.get(word)) is not None:
+            return word_id
+
+        lower = word.lower()
+        lower_id = self.add(lower) if lower != word else len(self.words)
+        word_id = self.ids[word] = len(self.words)
+        self.words.append(word)
+        self.lower_ids.append(lower_id)
+        return word_id
+
+    def to_table(self) -> pa.Table:
+        return pa.table(
+            {"word": pa.array(self.words, pa.large_string()), "lower_id": pa.array(self.lower_ids, pa.int32())},
+            schema=VOCABULARY_SCHEMA,
+        )
+
+
+class DatasetStore:
+    """
+    Split of captions with gold labels and extractor predictions as Arrow IPC files in one directory:
+    captions, vocabulary of interned words and file per labels column with noun-adjective id pairs of every
+    caption, aligned with captions rows, null for unlabelled ones. Files are memory-mapped, so opening split
+    and joining columns reads only pages touched by query and pages are shared between processes
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.captions = read_table(path / CAPTIONS_FILE_NAME)
+        self._labels: dict[str, pa.ListArray] = {}
+        self._load_vocabulary()
+
+    @classmethod
+    def create(cls, path: Path, texts: Sequence[str], overwrite: bool = False) -> "DatasetStore":
+        if path.exists():
+            if not overwrite:
+                raise FileExistsError(f"Dataset store {path} already exists, use overwrite")
+            shutil.rmtree(path)
+
+        (path / LABELS_DIR_NAME).mkdir(parents=True)
+        write_table(path / CAPTIONS_FILE_NAME, pa.table([pa.array(texts, pa.large_string())], schema=CAPTIONS_SCHEMA))
+        write_table(path / VOCABULARY_FILE_NAME, WordVocabulary().to_table())
+        return cls(path)
+
+    def _load_vocabulary(self) -> None:
+        self.vocabulary = read_table(self.path / VOCABULARY_FILE_NAME)
+        self._lower_ids = single_chunk(self.vocabulary.column("lower_id")).to_numpy()
+
+    def __len__(self) -> int:
+        return self.captions.num_rows
+
+    @property
+    def columns(self) -> list[str]:
+        return sorted(path.stem for path in (self.path / LABELS_DIR_NAME).glob(f"*{LABELS_FILE_SUFFIX}"))
+
+    def labels_path(self, column: str) -> Path:
+        if not column_name_pattern.match(column):
+            raise ValueError(f"Labels column name {column!r} must contain only letters, digits, '_', '.' and '-'")
+        return self.path / LABELS_DIR_NAME / f"{column}{LABELS_FILE_SUFFIX}"
+
+    def labels(self, column: str) -> pa.ListArray:
+        if column not in self._labels:
+            if not (path := self.labels_path(column)).exists():
+                raise KeyError(f"No labels column {column!r} in {self.path}, columns: {self.columns}")
+            self._labels[column] = single_chunk(read_table(path).column("pairs"))  # pyright: ignore
+        return self._labels[column]
+
+    def texts(self, rows: IntArray | None = None) -> list[str]:
+        texts = single_chunk(self.captions.column("text"))
+        return (texts.take(rows) if rows is not None else texts).to_pylist()  # pyright: ignore
+
+    def labelled(self, column: str) -> BoolArray:
+        """
+        :return: BoolArray - mask of captions labelled in column, all False if column doesn't exist
+        """
+        if not self.labels_path(column).exists():
+            return np.zeros(len(self), dtype=np.bool_)
+        return self.labels(column).is_valid().to_numpy(zero_copy_only=False)
+
+    def _pair_ids(self, column: str) -> tuple[IntArray, IntArray, IntArray]:
+        """
+        :return: tuple[IntArray, IntArray, IntArray] - caption index, noun id and adjective id of every pair
+        """
+        labels = self.labels(column)
+        offsets = labels.offsets.to_numpy()
+        pairs = labels.values.slice(offsets[0], offsets[-1] - offsets[0])  # pyright: ignore
+        example_idx = np.repeat(np.arange(len(labels), dtype=np.int64), np.diff(offsets))
+        return example_idx, pairs.field("noun").to_numpy(), pairs.field("adjective").to_numpy()  # pyright: ignore
+
+    def pairs(self, column: str, rows: IntArray | None = None) -> PairTable:
+        """
+        Lowercased noun-adjective pairs of column without nouns without adjectives, pair id is
+        lower noun id * vocabulary size + lower adjective id, so tables of all columns share pair ids
+        :param rows: captions to select, example index of the table is position in rows
+        """
+        example_idx, nouns, adjectives = self._pair_ids(column)
+        has_adjective = adjectives != NO_ADJECTIVE
+        example_idx = example_idx[has_adjective]
+        pair_id = self._lower_ids[nouns[has_adjective]].astype(np.int64) * max(len(self._lower_ids), 1)
+        pair_id += self._lower_ids[adjectives[has_adjective]]
+        if rows is None:
+            return PairTable(example_idx=example_idx, pair_id=pair_id, n_examples=len(self))
+
+        positions = np.full(len(self), -1, dtype=np.int64)
+        positions[rows] = np.arange(len(rows))
+        example_idx = positions[example_idx]
+        selected = example_idx >= 0
+        return PairTable(example_idx=example_idx[selected], pair_id=pair_id[selected], n_examples=len(rows))
+
+    def objects(self, column: str, rows: IntArray | None = None) -> list[ExtractedObjectsDict | None]:
+        labels = self.labels(column)
+        words: list[str] = self.vocabulary.column("word").to_pylist()
+        objects: list[ExtractedObjectsDict | None] = []
+        for caption_pairs in (labels.take(rows) if rows is not None else labels).to_pylist():  # pyright: ignore
+            if caption_pairs is None:
+                objects.append(None)
+                continue
+            caption_objects: dict[str, list[str]] = {}
+            for pair in caption_pairs:  # pyright: ignore
+                descriptions = caption_objects.setdefault(words[pair["noun"]], [])
+                if pair["adjective"] != NO_ADJECTIVE:
+                    descriptions.append(words[pair["adjective"]])
+            objects.append({"objects": caption_objects})
+        return objects
+
+    def write_labels(self, column: str, labels: Sequence[Labels | None], rows: IntArray | None = None) -> None:
+        """
+        Writes labels of captions, None for unlabelled ones
+        :param rows: captions of labels, other captions keep labels already stored in column
+        """
+        if rows is None and len(labels) != len(self):
+            raise ValueError(f"Got {len(labels)} labels for {len(self)} captions")
+
+        vocabulary = WordVocabulary(self.vocabulary)
+        n_words = len(vocabulary)
+        pairs: list[list[dict[str, int]] | None] = [
+            encode_labels(row_labels, vocabulary) if row_labels is not None else None for row_labels in labels
+        ]
+        if rows is not None:
+            row_pairs = pairs
+            pairs = self.labels(column).to_pylist() if self.labels_path(column).exists() else [None] * len(self)
+            for row, pair_list in zip(rows.tolist(), row_pairs):
+                pairs[row] = pair_list
+
+        if len(vocabulary) > n_words:
+            write_table(self.path / VOCABULARY_FILE_NAME, vocabulary.to_table())
+            self._load_vocabulary()
+        write_table(self.labels_path(column), pa.table([pa.array(pairs, PAIRS_TYPE)], schema=LABELS_SCHEMA))
+        self._labels.pop(column, None)
+        logger.info(f"Wrote {sum(row_pairs is not None for row_pairs in pairs)} labels of {column} to {self.path}")
+
+    def merge_labels(self, column: str, labels_by_text: Mapping[str, Labels]) -> int:
+        """
+        Joins labels to captions on normalised text, as labels keep texts the way labelling saw them
+        :return: int - number of labelled captions
+        """
+        rows_by_text: dict[str, list[int]] = defaultdict(list)
+        for row, text in enumerate(self.texts()):
+            rows_by_text[preprocess_text(text)].append(row)
+
+        rows: list[int] = []
+        labels: list[Labels] = []
+        n_unmatched = 0
+        for text, text_labels in labels_by_text.items():
+            text_rows = rows_by_text.get(preprocess_text(text), [])
+            n_unmatched += not text_rows
+            for row in text_rows:
+                rows.append(row)
+                labels.append(text_labels)
+        if n_unmatched:
+            logger.warning(f"{n_unmatched} of {len(labels_by_text)} labelled texts are not captions of {self.path}")
+        self.write_labels(column, labels, rows=np.array(rows, dtype=np.int64))
+        return len(rows)
+
+    def evaluate(self, pred_column: str, target_column: str, rows: IntArray | None = None) -> EvaluationResult:
+        """
+        Scores predictions against targets on captions labelled in target column
+        :param rows: captions to score, all labelled in target column by default
+        """
+        if rows is None:
+            rows = np.flatnonzero(self.labelled(target_column))
+        if n_missing := int((~self.labelled(pred_column)[rows]).sum()):
+            raise ValueError(f"{n_missing} of {len(rows)} captions have no predictions in {pred_column}")
+        n_pairs = max(len(self._lower_ids), 1) ** 2
+        return score_pairs(self.pairs(pred_column, rows), self.pairs(target_column, rows), n_pairs=n_pairs)
+
+
+def encode_labels(labels: Labels, vocabulary: WordVocabulary) -> list[dict[str, int]]:
+    pairs: list[dict[str, int]] = []
+    for noun, adjectives in unwrap_objects(labels).items():
+        noun_id = vocabulary.add(noun)
+        pairs += [{"noun": noun_id, "adjective": vocabulary.add(adjective)} for adjective in adjectives]
+        if not adjectives:
+            pairs.append({"noun": noun_id, "adjective": NO_ADJECTIVE})
+    return pairs
+
+
+def parse_labels_column(values: Iterable[object]) -> list[ExtractedObjectsDict | None] | None:
+    """
+    :return: list[ExtractedObjectsDict | None] | None - parsed JSON labels, None if column isn't JSON labels
+    """
+    labels: list[ExtractedObjectsDict | None] = []
+    for value in values:
+        if not isinstance(value, str):
+            labels.append(None)
+            continue
+        try:
+            parsed = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(parsed, dict):
+            return None
+        labels.append(parsed)  # pyright: ignore
+    return labels
+
+
+def convert_csv(
+    csv_path: Path,
+    store_path: Path,
+    text_column: str = "text",
+    label_columns: Sequence[str] | None = None,
+    overwrite: bool = False,
+) -> DatasetStore:
+    """
+    Converts CSV with captions and JSON labels columns, by default every column of JSON objects is imported
+    """
+    data = pd.read_csv(csv_path, dtype=str, keep_default_na=False, na_values=[""])  # pyright: ignore
+    store = DatasetStore.create(
+        store_path, data[text_column].fillna("").tolist(), overwrite=overwrite
+    )  # pyright: ignore
+    for column in label_columns or [column for column in data.columns if column != text_column]:
+        if (labels := parse_labels_column(data[column])) is None:  # pyright: ignore
+            if label_columns:
+                raise ValueError(f"Column {column} of {csv_path} has values that aren't JSON objects")
+            logger.info(f"Skipping column {column} of {csv_path}, it isn't JSON labels")
+            continue
+        store.write_labels(str(column), labels)
+    return store
+
+
+def read_tilde_labels(path: Path) -> tuple[str | None, dict[str, ExtractedObjectsDict]]:
+    """
+    Reads "text~{json}" lines written by LLMExtractor, later labels of the same text replace earlier ones
+    :return: tuple[str | None, dict[str, ExtractedObjectsDict]] - labels column from header line and labels by text
+    """
+    column: str | None = None
+    labels: dict[str, ExtractedObjectsDict] = {}
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file):
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if (separator := line.find(TILDE_SEPARATOR)) < 0:
+                if line_number == 0 and "~" in line:
+                    column = line.rsplit("~", 1)[1]
+                else:
+                    logger.warning(f"Skipping line {line_number + 1} of {path} without labels")
+                continue
+            try:
+                labels[line[:separator]] = json.loads(line[separator + 1 :])
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping line {line_number + 1} of {path} with malformed labels")
+    return column, labels
+
+
+def import_tilde_labels(store: DatasetStore, path: Path, column: str | None = None) -> str:
+    """
+    :param column: labels column, by default name from header of file or file name
+    :return: str - labels column
+    """
+    header_column, labels = read_tilde_labels(path)
+    column = column or header_column or path.stem
+    n_labelled = store.merge_labels(column, labels)
+    logger.info(f"Imported {len(labels)} labels from {path} to {n_labelled} captions of column {column}")
+    return column
+
+
+def predictions_column(extractor: BaseObjectsExtractor) -> str:
+    """
+    Labels column of extractor predictions, changes with extractor fingerprint
+    """
+    digest = hashlib.sha256(extractor.fingerprint().encode()).hexdigest()[:12]
+    return f"pred_{type(extractor).__name__}_{digest}"
+
+
+def evaluate_extractor_on_store(
+    extractor: BaseObjectsExtractor,
+    store: DatasetStore,
+    target_column: str,
+    batch_size: int = 64,
+    cache: ResultCache | None = None,
+    limit: int | None = None,
+) -> tuple[IntArray, EvaluationResult]:
+    """
+    Scores extractor on captions labelled in target column. Predictions are written to store,
+    so only captions without predictions of extractor with the same fingerprint are extracted
+    :return: tuple[IntArray, EvaluationResult] - scored captions and result
+    """
+    rows = np.flatnonzero(store.labelled(target_column))[:limit]
+    column = predictions_column(extractor)
+    missing = rows[~store.labelled(column)[rows]]
+    if len(missing):
+        predictions = predict(extractor, store.texts(missing), batch_size=batch_size, cache=cache)
+        store.write_labels(column, predictions, rows=missing)
+    return rows, store.evaluate(column, target_column, rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert captions with labels to memory-mapped dataset store")
+    parser.add_argument("--csv", type=Path, required=True, help="CSV with captions and JSON labels columns")
+    parser.add_argument("--store", type=Path, default=None, help=f"store directory, default is {STORE_DIR}/<csv name>")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-columns", nargs="*", default=None, help="default is every JSON labels column")
+    parser.add_argument("--labels", type=Path, nargs="*", default=[], help='"~" separated labels files to join')
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    store = convert_csv(
+        args.csv,
+        args.store or STORE_DIR / args.csv.stem,
+        text_column=args.text_column,
+        label_columns=args.label_columns,
+        overwrite=args.overwrite,
+    )
+    for labels_path in args.labels:
+        import_tilde_labels(store, labels_path)
+    logger.info(f"Store {store.path}: {len(store)} captions, {store.vocabulary.num_rows} words, {store.columns}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 import json
 import re
 
-import spacy
 from loguru import logger
+from spacy.tokens import Doc
 
 from src.core.models import ExtractedObjectsDict, LanguageDependency, PartOfSpeech
+from src.extractor.pos_extractor import load_spacy_pipeline
 
-nlp = spacy.load("en_core_web_sm")
 word_quote_pattern = re.compile(r"([a-zA-Z])'([a-zA-Z])")
 
 
@@ -28,14 +28,15 @@ def parse_texts(raw_string: str) -> list[str] | None:
         return
 
 
-def text_has_objectives(text: str) -> bool:
-    doc = nlp(text)
+def doc_has_objectives(doc: Doc) -> bool:
     return PartOfSpeech.adjective in {token.pos_ for token in doc}
 
 
-def make_labels(text: str) -> ExtractedObjectsDict:
-    doc = nlp(text)
+def text_has_objectives(text: str) -> bool:
+    return doc_has_objectives(load_spacy_pipeline()(text))
+
 
+def make_labels_from_doc(doc: Doc) -> ExtractedObjectsDict:
     objects: dict[str, list[str]] = {}
 
     for token in doc:
@@ -48,6 +49,10 @@ def make_labels(text: str) -> ExtractedObjectsDict:
     return {"objects": objects}
 
 
+def make_labels(text: str) -> ExtractedObjectsDict:
+    return make_labels_from_doc(load_spacy_pipeline()(text))
+
+
 if __name__ == "__main__":
     import pandas as pd
 
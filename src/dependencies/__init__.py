@@ -1,7 +1,15 @@
 from src.dependencies.extractors import (
     get_bert_extractor,
+    get_extractor_registry,
     get_llm_extractor,
     get_pos_extractor,
+    get_selected_extractor,
 )
 
-__all__ = ["get_pos_extractor", "get_llm_extractor", "get_bert_extractor"]
+__all__ = [
+    "get_pos_extractor",
+    "get_llm_extractor",
+    "get_bert_extractor",
+    "get_extractor_registry",
+    "get_selected_extractor",
+]
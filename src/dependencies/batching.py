@@ -0,0 +1,44 @@
+from typing import TYPE_CHECKING, cast
+
+from fastapi import Depends
+
+from src.core.models import ExtractedObjectsDict
+from src.core.settings import AppSettings, ExtractorType
+from src.dependencies.extractors import extractor_registry
+from src.dependencies.settings import get_app_settings
+from src.extractor.batching import MicroBatcher
+
+if TYPE_CHECKING:
+    from src.extractor.bert_extractor import BertExtractor
+
+ExtractorBatcher = MicroBatcher[str, ExtractedObjectsDict]
+
+extractor_batchers: dict[ExtractorType, ExtractorBatcher] = {}
+
+
+def start_batchers(app_settings: AppSettings) -> None:
+    if app_settings.api_selected_extractor != ExtractorType.bert_extractor:
+        return
+
+    bert_extractor = cast("BertExtractor", extractor_registry.get(ExtractorType.bert_extractor))
+    if not bert_extractor.config.batching_enabled:
+        return
+
+    batcher = ExtractorBatcher(
+        batch_fn=bert_extractor.extract_batch,
+        max_batch_size=bert_extractor.config.max_batch_size,
+        max_wait_ms=bert_extractor.config.max_wait_ms,
+        name=ExtractorType.bert_extractor,
+    )
+    batcher.start()
+    extractor_batchers[ExtractorType.bert_extractor] = batcher
+
+
+async def stop_batchers() -> None:
+    for batcher in extractor_batchers.values():
+        await batcher.stop()
+    extractor_batchers.clear()
+
+
+def get_selected_batcher(app_settings: AppSettings = Depends(get_app_settings)) -> ExtractorBatcher | None:
+    return extractor_batchers.get(app_settings.api_selected_extractor)
@@ -0,0 +1,33 @@
+from fastapi import Depends
+
+from src.cache import ResultCache
+from src.core.settings import AppSettings, ExtractorType
+from src.dependencies.extractors import extractor_registry
+from src.dependencies.settings import get_app_settings
+
+result_caches: dict[ExtractorType, ResultCache] = {}
+
+
+def start_result_caches(app_settings: AppSettings) -> None:
+    if not app_settings.result_cache_enabled:
+        return
+
+    extractor_type = app_settings.api_selected_extractor
+    result_caches[extractor_type] = ResultCache(
+        scope=extractor_type,
+        fingerprint=extractor_registry.get(extractor_type).fingerprint(),
+        max_size=app_settings.result_cache_max_size,
+        ttl_s=app_settings.result_cache_ttl_s,
+        db_path=app_settings.result_cache_db_path,
+        max_disk_rows=app_settings.result_cache_db_max_rows,
+    )
+
+
+def stop_result_caches() -> None:
+    for result_cache in result_caches.values():
+        result_cache.close()
+    result_caches.clear()
+
+
+def get_selected_result_cache(app_settings: AppSettings = Depends(get_app_settings)) -> ResultCache | None:
+    return result_caches.get(app_settings.api_selected_extractor)
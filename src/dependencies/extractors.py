@@ -1,18 +1,102 @@
-from src.core.settings import CONFIGS_DIR
-from src.extractor.bert_extractor import BertExtractor, BertExtractorSettings
-from src.extractor.llm_extractor import LLMExtractor, LLMExtractorSettings
-from src.extractor.pos_extractor import PosExtractor
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
 
-# configs_path = Path(__file__).parent.parent.parent / "configs"
+from fastapi import Depends
 
+from src.core.settings import (
+    CONFIGS_DIR,
+    AppSettings,
+    BertExtractorSettings,
+    CascadeExtractorSettings,
+    ExtractorType,
+    LLMExtractorSettings,
+)
+from src.dependencies.settings import get_app_settings
+from src.extractor.base import BaseObjectsExtractor
+from src.extractor.registry import ExtractorRegistry
+
+# extractor modules import spaCy, torch and aiohttp, factories import them only when extractor is built
+if TYPE_CHECKING:
+    from src.extractor.bert_extractor import BertExtractor
+    from src.extractor.cascade_extractor import CascadeExtractor
+    from src.extractor.llm_extractor import LLMExtractor
+    from src.extractor.pos_extractor import PosExtractor
+
+
+LLM_CONFIG_PATH = CONFIGS_DIR / "llm_extractor_settings.yaml"
+BERT_CONFIG_PATH = CONFIGS_DIR / "bert_extractor_settings.yaml"
+CASCADE_CONFIG_PATH = CONFIGS_DIR / "cascade_extractor_settings.yaml"
+
+
+def build_pos_extractor() -> "PosExtractor":
+    from src.extractor.pos_extractor import PosExtractor
 
-def get_pos_extractor() -> PosExtractor:
     return PosExtractor()
 
 
-def get_llm_extractor() -> LLMExtractor:
-    return LLMExtractor(LLMExtractorSettings.from_yaml(CONFIGS_DIR / "llm_extractor_settings.yaml"))
+def build_llm_extractor(config_path: Path = LLM_CONFIG_PATH) -> "LLMExtractor":
+    from src.extractor.llm_extractor import LLMExtractor
+
+    return LLMExtractor(LLMExtractorSettings.from_yaml(config_path))
+
+
+def build_bert_extractor(
+    config_path: Path = BERT_CONFIG_PATH, pos_extractor: "PosExtractor | None" = None
+) -> "BertExtractor":
+    from src.extractor.bert_extractor import BertExtractor
+
+    return BertExtractor(BertExtractorSettings.from_yaml(config_path), pos_extractor=pos_extractor)
+
+
+def build_cascade_extractor(
+    config_path: Path = CASCADE_CONFIG_PATH,
+    bert_config_path: Path | None = None,
+    llm_config_path: Path | None = None,
+) -> "CascadeExtractor":
+    """
+    Tiers are the extractors of registry, a tier with its own config path is built separately
+    """
+    from src.extractor.cascade_extractor import CascadeExtractor
+
+    config = CascadeExtractorSettings.from_yaml(config_path)
+    pos_extractor = get_pos_extractor()
+    if bert_config_path is None:
+        bert_extractor = get_bert_extractor()
+    else:
+        bert_extractor = build_bert_extractor(bert_config_path, pos_extractor=pos_extractor)
+    llm_extractor = None
+    if config.llm_enabled:
+        llm_extractor = get_llm_extractor() if llm_config_path is None else build_llm_extractor(llm_config_path)
+    return CascadeExtractor(
+        config, pos_extractor=pos_extractor, bert_extractor=bert_extractor, llm_extractor=llm_extractor
+    )
+
+
+extractor_registry = ExtractorRegistry(
+    factories={
+        ExtractorType.pos_extractor: build_pos_extractor,
+        ExtractorType.llm_extractor: build_llm_extractor,
+        ExtractorType.bert_extractor: build_bert_extractor,
+        ExtractorType.cascade_extractor: build_cascade_extractor,
+    }
+)
+
+
+def get_extractor_registry() -> ExtractorRegistry:
+    return extractor_registry
+
+
+def get_pos_extractor() -> "PosExtractor":
+    return cast("PosExtractor", extractor_registry.get(ExtractorType.pos_extractor))
+
+
+def get_llm_extractor() -> "LLMExtractor":
+    return cast("LLMExtractor", extractor_registry.get(ExtractorType.llm_extractor))
+
+
+def get_bert_extractor() -> "BertExtractor":
+    return cast("BertExtractor", extractor_registry.get(ExtractorType.bert_extractor))
 
 
-def get_bert_extractor() -> BertExtractor:
-    return BertExtractor(BertExtractorSettings.from_yaml(CONFIGS_DIR / "bert_extractor_settings.yaml"))
+def get_selected_extractor(app_settings: AppSettings = Depends(get_app_settings)) -> BaseObjectsExtractor:
+    return extractor_registry.get(app_settings.api_selected_extractor)
@@ -0,0 +1,35 @@
+from src.core.profiling import RequestProfiler, TraceStore
+from src.core.settings import AppSettings
+
+_trace_store: TraceStore | None = None
+_request_profiler: RequestProfiler | None = None
+
+
+def start_request_profiler(app_settings: AppSettings) -> None:
+    global _trace_store, _request_profiler
+    _trace_store = TraceStore(
+        directory=app_settings.profiling_traces_dir,
+        max_traces=app_settings.profiling_max_traces,
+        max_total_bytes=app_settings.profiling_max_total_bytes,
+    )
+    if app_settings.profiling_enabled:
+        _request_profiler = RequestProfiler(
+            store=_trace_store,
+            sample_rate=app_settings.profiling_sample_rate,
+            header=app_settings.profiling_header,
+            with_torch=app_settings.profiling_torch,
+        )
+
+
+def stop_request_profiler() -> None:
+    global _trace_store, _request_profiler
+    _trace_store = None
+    _request_profiler = None
+
+
+def get_request_profiler() -> RequestProfiler | None:
+    return _request_profiler
+
+
+def get_trace_store() -> TraceStore | None:
+    return _trace_store
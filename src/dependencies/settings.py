@@ -1,5 +1,8 @@
+from functools import cache
+
 from src.core.settings import CONFIGS_DIR, AppSettings
 
 
+@cache
 def get_app_settings() -> AppSettings:
     return AppSettings.from_yaml(CONFIGS_DIR / "app_settings.yaml")
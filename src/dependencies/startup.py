@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+from loguru import logger
+
+from src.core.executor import run_in_cpu_executor
+from src.core.instrumentation import STARTUP_PHASE_SECONDS
+from src.core.models import StartupReport
+from src.core.settings import AppSettings
+from src.dependencies.batching import start_batchers
+from src.dependencies.cache import start_result_caches
+from src.dependencies.extractors import extractor_registry
+
+_PROC_STAT_PATH = "/proc/self/stat"
+_PROC_UPTIME_PATH = "/proc/uptime"
+# index of starttime among fields following the command name in /proc/<pid>/stat
+_STARTTIME_FIELD_INDEX = 19
+
+_startup_report: StartupReport | None = None
+_warm_up_task: asyncio.Task[None] | None = None
+
+
+def get_process_uptime_s() -> float | None:
+    """
+    :return: float | None - seconds since process start, None where /proc is unavailable
+    """
+    try:
+        with open(_PROC_STAT_PATH) as file:
+            # command name is in parentheses and may contain spaces
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[_STARTTIME_FIELD_INDEX])
+        with open(_PROC_UPTIME_PATH) as file:
+            uptime_s = float(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime_s - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def warm_up_extractor(app_settings: AppSettings, report: StartupReport) -> None:
+    start = time.perf_counter()
+    extractor = extractor_registry.get(app_settings.api_selected_extractor)
+    report.model_load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extractor.warm_up(app_settings.warm_up_text)
+    report.first_inference_s = time.perf_counter() - start
+
+
+async def run_startup(app_settings: AppSettings, report: StartupReport) -> None:
+    try:
+        await run_in_cpu_executor(warm_up_extractor, app_settings, report)
+        start_batchers(app_settings)
+        start_result_caches(app_settings)
+    except Exception as e:
+        report.error = f"{type(e).__name__}: {e}"
+        logger.exception(f"Warm-up of {report.extractor_type} failed")
+        return
+
+    report.total_s = get_process_uptime_s()
+    report.ready = True
+    for phase in ("import", "model_load", "first_inference", "total"):
+        if (duration_s := getattr(report, f"{phase}_s")) is not None:
+            STARTUP_PHASE_SECONDS.set(duration_s, phase=phase)
+    logger.info(f"Ready: {report.model_dump_json(exclude={'ready', 'error'})}")
+
+
+def start_warm_up(app_settings: AppSettings) -> None:
+    """
+    Builds and warms up the selected extractor in background, so /health answers while model loads
+    and /ready turns ready once extraction is fast
+    """
+    global _startup_report, _warm_up_task
+    _startup_report = StartupReport(extractor_type=app_settings.api_selected_extractor, import_s=get_process_uptime_s())
+    _warm_up_task = asyncio.create_task(run_startup(app_settings, _startup_report))
+
+
+async def stop_warm_up() -> None:
+    global _startup_report, _warm_up_task
+    if _warm_up_task is not None and not _warm_up_task.done():
+        _warm_up_task.cancel()
+        try:
+            await _warm_up_task
+        except asyncio.CancelledError:
+            pass
+    _startup_report = None
+    _warm_up_task = None
+
+
+def get_startup_report() -> StartupReport | None:
+    return _startup_report
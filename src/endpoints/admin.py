@@ -0,0 +1,54 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+
+from src.core.models import TraceInfo
+from src.core.profiling import TraceStore
+from src.core.settings import AppSettings
+from src.dependencies.profiling import get_trace_store
+from src.dependencies.settings import get_app_settings
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def is_admin_token_valid(token: str | None, app_settings: AppSettings) -> bool:
+    """
+    Admin access is closed while admin_token isn't configured
+    """
+    if app_settings.admin_token is None or token is None:
+        return False
+    return secrets.compare_digest(token, app_settings.admin_token.get_secret_value())
+
+
+def check_admin_token(
+    x_admin_token: str | None = Header(default=None),
+    app_settings: AppSettings = Depends(get_app_settings),
+) -> None:
+    if app_settings.admin_token is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled")
+    if not is_admin_token_valid(x_admin_token, app_settings):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+def require_trace_store(trace_store: TraceStore | None = Depends(get_trace_store)) -> TraceStore:
+    if trace_store is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Trace store is not started")
+    return trace_store
+
+
+@router.get("/traces", dependencies=[Depends(check_admin_token)])
+def list_traces(trace_store: TraceStore = Depends(require_trace_store)) -> list[TraceInfo]:
+    return trace_store.list()
+
+
+@router.get("/traces/{trace_id}/{file_name}", dependencies=[Depends(check_admin_token)])
+def download_trace_file(
+    trace_id: str, file_name: str, trace_store: TraceStore = Depends(require_trace_store)
+) -> FileResponse:
+    path = trace_store.get_file(trace_id, file_name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No {file_name} in trace {trace_id}")
+    return FileResponse(path, filename=f"{trace_id}_{file_name}")
@@ -0,0 +1,86 @@
+import time
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Body, Depends
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from src.cache import ResultCache
+from src.core.instrumentation import (
+    EXTRACT_FIRST_OBJECT_SECONDS,
+    record_texts,
+    track_request,
+)
+from src.core.models import ExtractedObjectLine
+from src.core.settings import AppSettings
+from src.dependencies import get_selected_extractor
+from src.dependencies.cache import get_selected_result_cache
+from src.dependencies.settings import get_app_settings
+from src.endpoints.extract_objects import get_text_max_len, truncate_text
+from src.endpoints.extract_stream import NDJSON_MEDIA_TYPE
+from src.extractor.base import BaseObjectsExtractor
+
+ENDPOINT = "/extract/incremental"
+
+router = APIRouter(tags=["extract"])
+
+
+async def iter_objects(
+    text: str, extractor: BaseObjectsExtractor, result_cache: ResultCache | None
+) -> AsyncIterator[tuple[str, list[str]]]:
+    """
+    Yields cached objects at once, otherwise streams them from extractor. Result is cached only when
+    the stream finished normally: failed or abandoned stream raises before reaching the cache
+    """
+    if result_cache is not None and (cached := await result_cache.aget(text)) is not None:
+        for name, descriptions in cached["objects"].items():
+            yield name, descriptions
+        return
+
+    objects: dict[str, list[str]] = {}
+    async for name, descriptions in extractor.astream_objects(text):
+        objects[name] = descriptions
+        yield name, descriptions
+    if result_cache is not None:
+        await result_cache.aset(text, {"objects": objects})
+
+
+async def iter_object_lines(
+    text: str, extractor: BaseObjectsExtractor, result_cache: ResultCache | None
+) -> AsyncIterator[str]:
+    extractor_name = type(extractor).__name__
+    with track_request(extractor_name, ENDPOINT):
+        start = time.perf_counter()
+        is_first = True
+        try:
+            async for name, descriptions in iter_objects(text, extractor, result_cache):
+                if is_first:
+                    EXTRACT_FIRST_OBJECT_SECONDS.observe(
+                        time.perf_counter() - start, extractor=extractor_name, endpoint=ENDPOINT
+                    )
+                    is_first = False
+                yield ExtractedObjectLine(object=name, descriptions=descriptions).model_dump_json() + "\n"
+        except Exception as e:
+            # status is already sent with the first line, so failure is reported as the last one
+            logger.warning(f"Incremental extraction failed: {e!r}")
+            yield ExtractedObjectLine(error=f"{type(e).__name__}: {e}").model_dump_json() + "\n"
+
+
+@router.post(ENDPOINT, response_class=StreamingResponse)
+async def extract_objects_incremental(
+    text: str = Body(embed=False),
+    app_settings: AppSettings = Depends(get_app_settings),
+    extractor: BaseObjectsExtractor = Depends(get_selected_extractor),
+    result_cache: ResultCache | None = Depends(get_selected_result_cache),
+) -> StreamingResponse:
+    """
+    Response is NDJSON of ExtractedObjectLine, each object is sent as soon as extractor completes it.
+    LLM extractor streams completion, so first object arrives long before the whole result is generated
+    """
+    text, input_text_truncated = truncate_text(text, get_text_max_len(app_settings, extractor))
+    record_texts(type(extractor).__name__, ENDPOINT, n_texts=1, n_truncated=int(input_text_truncated))
+    return StreamingResponse(
+        iter_object_lines(text, extractor, result_cache),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"X-Input-Text-Truncated": str(input_text_truncated).lower()},
+    )
@@ -1,37 +1,133 @@
-from fastapi import APIRouter, Body, Depends
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response, status
 
-from src.core.models import ExtractObjectsResponse
-from src.core.settings import CONFIGS_DIR, AppSettings, ExtractorType
-from src.dependencies import get_bert_extractor, get_llm_extractor, get_pos_extractor
+from src.cache import ResultCache
+from src.core.executor import run_in_cpu_executor
+from src.core.instrumentation import record_texts, track_request
+from src.core.models import (
+    ExtractedObjectsDict,
+    ExtractObjectsBatchResponse,
+    ExtractObjectsResponse,
+)
+from src.core.profiling import RequestProfiler
+from src.core.settings import AppSettings
+from src.dependencies import get_selected_extractor
+from src.dependencies.batching import ExtractorBatcher, get_selected_batcher
+from src.dependencies.cache import get_selected_result_cache
+from src.dependencies.profiling import get_request_profiler
 from src.dependencies.settings import get_app_settings
-from src.extractor import BertExtractor, PosExtractor
-from src.extractor.llm_extractor import LLMExtractor
+from src.endpoints.admin import ADMIN_TOKEN_HEADER, is_admin_token_valid
+from src.extractor.base import BaseObjectsExtractor
 
 router = APIRouter(tags=["extract"])
-app_settings = AppSettings.from_yaml(config_path=CONFIGS_DIR / "app_settings.yaml", common_settings_path="")
+
+
+def truncate_text(text: str, max_len: int) -> tuple[str, bool]:
+    if len(text) > max_len:
+        return text[:max_len], True
+    return text, False
+
+
+def get_text_max_len(app_settings: AppSettings, extractor: BaseObjectsExtractor) -> int:
+    return app_settings.long_text_max_len if extractor.handles_long_texts else app_settings.text_max_len
+
+
+async def extract_batch_cached(
+    texts: list[str], extractor: BaseObjectsExtractor, result_cache: ResultCache | None
+) -> list[ExtractedObjectsDict]:
+    if result_cache is None:
+        return await extractor.aextract_batch(texts)
+
+    cached = await result_cache.aget_many(texts)
+    missed_texts = list(dict.fromkeys(text for text, objects in zip(texts, cached) if objects is None))
+    extracted: dict[str, ExtractedObjectsDict] = {}
+    if missed_texts:
+        extracted = dict(zip(missed_texts, await extractor.aextract_batch(missed_texts)))
+        await result_cache.aset_many(list(extracted.keys()), list(extracted.values()))
+
+    return [extracted[text] if objects is None else objects for text, objects in zip(texts, cached)]
+
+
+async def extract_profiled(
+    text: str, extractor: BaseObjectsExtractor, extractor_type: str, profiler: RequestProfiler, response: Response
+) -> ExtractedObjectsDict:
+    """
+    Extracts single text alone, bypassing micro-batcher and result cache, so trace describes this text only
+    """
+    objects, trace_id = await run_in_cpu_executor(
+        profiler.profile_call,
+        extractor.extract,
+        text,
+        extractor_type=extractor_type,
+        with_torch=extractor.uses_torch,
+    )
+    if trace_id is not None:
+        response.headers["X-Trace-Id"] = trace_id
+    return objects
 
 
 @router.post("/extract")
-def extract_objects(
+async def extract_objects(
+    request: Request,
+    response: Response,
     text: str = Body(embed=False),
     app_settings: AppSettings = Depends(get_app_settings),
-    pos_extractor: PosExtractor = Depends(get_pos_extractor),
-    llm_extractor: LLMExtractor = Depends(get_llm_extractor),
-    bert_extractor: BertExtractor = Depends(get_bert_extractor),
+    extractor: BaseObjectsExtractor = Depends(get_selected_extractor),
+    batcher: ExtractorBatcher | None = Depends(get_selected_batcher),
+    result_cache: ResultCache | None = Depends(get_selected_result_cache),
+    profiler: RequestProfiler | None = Depends(get_request_profiler),
 ) -> ExtractObjectsResponse:
-    if len(text) > (max_len := app_settings.text_max_len):
-        text = text[:max_len]
-        input_text_truncated = True
-    else:
-        input_text_truncated = False
-
-    match app_settings.api_selected_extractor:
-        case ExtractorType.pos_extractor:
-            extractor = pos_extractor
-        case ExtractorType.llm_extractor:
-            extractor = llm_extractor
-        case ExtractorType.bert_extractor:
-            extractor = bert_extractor
-
-    objects = extractor.extract(text=text)
-    return ExtractObjectsResponse(result=objects, input_text_truncated=input_text_truncated)
+    with track_request(type(extractor).__name__, "/extract"):
+        text, input_text_truncated = truncate_text(text, get_text_max_len(app_settings, extractor))
+        record_texts(type(extractor).__name__, "/extract", n_texts=1, n_truncated=int(input_text_truncated))
+
+        if profiler is not None and profiler.should_profile(
+            request.headers, trusted=is_admin_token_valid(request.headers.get(ADMIN_TOKEN_HEADER), app_settings)
+        ):
+            objects = await extract_profiled(
+                text, extractor, app_settings.api_selected_extractor, profiler=profiler, response=response
+            )
+            return ExtractObjectsResponse(result=objects, input_text_truncated=input_text_truncated)
+
+        if result_cache is not None and (objects := await result_cache.aget(text)) is not None:
+            return ExtractObjectsResponse(result=objects, input_text_truncated=input_text_truncated)
+
+        if batcher is not None:
+            objects = await batcher.submit(text)
+        else:
+            objects = await extractor.aextract(text)
+
+        if result_cache is not None:
+            await result_cache.aset(text, objects)
+        return ExtractObjectsResponse(result=objects, input_text_truncated=input_text_truncated)
+
+
+@router.post("/extract/batch")
+async def extract_objects_batch(
+    texts: list[str] = Body(embed=False),
+    app_settings: AppSettings = Depends(get_app_settings),
+    extractor: BaseObjectsExtractor = Depends(get_selected_extractor),
+    result_cache: ResultCache | None = Depends(get_selected_result_cache),
+) -> ExtractObjectsBatchResponse:
+    with track_request(type(extractor).__name__, "/extract/batch"):
+        if len(texts) > app_settings.batch_max_texts:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Batch size {len(texts)} exceeds limit of {app_settings.batch_max_texts} texts",
+            )
+
+        truncated = [truncate_text(text, get_text_max_len(app_settings, extractor)) for text in texts]
+        record_texts(
+            type(extractor).__name__,
+            "/extract/batch",
+            n_texts=len(texts),
+            n_truncated=sum(input_text_truncated for _, input_text_truncated in truncated),
+        )
+        objects = await extract_batch_cached(
+            [text for text, _ in truncated], extractor=extractor, result_cache=result_cache
+        )
+        return ExtractObjectsBatchResponse(
+            results=[
+                ExtractObjectsResponse(result=result, input_text_truncated=input_text_truncated)
+                for result, (_, input_text_truncated) in zip(objects, truncated)
+            ]
+        )
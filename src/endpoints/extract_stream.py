@@ -0,0 +1,214 @@
+import asyncio
+import codecs
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.types import Receive, Scope, Send
+
+from src.cache import ResultCache
+from src.core.instrumentation import record_texts, track_request
+from src.core.models import ExtractedObjectsDict, ExtractObjectsStreamLine
+from src.core.settings import AppSettings
+from src.dependencies import get_selected_extractor
+from src.dependencies.cache import get_selected_result_cache
+from src.dependencies.settings import get_app_settings
+from src.endpoints.extract_objects import (
+    extract_batch_cached,
+    get_text_max_len,
+    truncate_text,
+)
+from src.extractor.base import BaseObjectsExtractor
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ENDPOINT = "/extract/stream"
+
+router = APIRouter(tags=["extract"])
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for content that keeps reading request body while response is sent. StreamingResponse
+    listens for disconnect concurrently and that listener would swallow body messages, here disconnect
+    surfaces as ClientDisconnect from request.stream() instead
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@dataclass(slots=True)
+class StreamItem:
+    line: int
+    text: str | None = None
+    error: str | None = None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_len: int) -> AsyncIterator[str | None]:
+    """
+    Splits streamed body into lines without buffering it, lines longer than max_line_len are
+    dropped and yielded as None, so single huge line can't exhaust memory
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    oversized = False
+    async for chunk in chunks:
+        *lines, buffer = (buffer + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield None if oversized or len(line) > max_line_len else line.rstrip("\r")
+            oversized = False
+        if len(buffer) > max_line_len:
+            buffer, oversized = "", True
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer or oversized:
+        yield None if oversized or len(buffer) > max_line_len else buffer.rstrip("\r")
+
+
+def parse_line(line_number: int, line: str | None, is_ndjson: bool) -> StreamItem | None:
+    """
+    :return: StreamItem | None - parsed item, None for blank line
+    """
+    if line is None:
+        return StreamItem(line=line_number, error="Line is too long")
+    if not line.strip():
+        return None
+    if not is_ndjson:
+        return StreamItem(line=line_number, text=line)
+
+    try:
+        value = json.loads(line)
+    except json.JSONDecodeError as e:
+        return StreamItem(line=line_number, error=f"Invalid JSON: {e}")
+    if isinstance(value, dict) and isinstance(value.get("text"), str):  # pyright: ignore
+        value = value["text"]  # pyright: ignore
+    if not isinstance(value, str):
+        return StreamItem(line=line_number, error='Expected JSON string or object with "text" string')
+    return StreamItem(line=line_number, text=value)
+
+
+async def iter_items(request: Request, max_line_len: int) -> AsyncIterator[StreamItem]:
+    is_ndjson = "json" in request.headers.get("content-type", NDJSON_MEDIA_TYPE)
+    line_number = 0
+    async for line in iter_lines(request.stream(), max_line_len):
+        line_number += 1
+        if (item := parse_line(line_number, line, is_ndjson)) is not None:
+            yield item
+
+
+async def extract_stream_batch(
+    items: list[StreamItem],
+    extractor: BaseObjectsExtractor,
+    result_cache: ResultCache | None,
+    text_max_len: int,
+) -> list[ExtractObjectsStreamLine]:
+    """
+    Extracts valid items of batch at once, when batch fails items are retried one by one,
+    so failure of one text is reported on its own line
+    """
+    lines = {item.line: ExtractObjectsStreamLine(line=item.line, error=item.error) for item in items}
+    valid = [(item.line, *truncate_text(item.text, text_max_len)) for item in items if item.text is not None]
+    record_texts(
+        type(extractor).__name__, ENDPOINT, n_texts=len(valid), n_truncated=sum(truncated for *_, truncated in valid)
+    )
+
+    results: list[ExtractedObjectsDict | None]
+    try:
+        results = await extract_batch_cached([text for _, text, _ in valid], extractor, result_cache)
+    except Exception as e:
+        logger.warning(f"Stream batch of {len(valid)} texts failed, retrying one by one: {e}")
+        results = [None] * len(valid)
+
+    for (line, text, truncated), result in zip(valid, results):
+        if result is None:
+            try:
+                (result,) = await extract_batch_cached([text], extractor, result_cache)
+            except Exception as e:
+                lines[line].error = f"{type(e).__name__}: {e}"
+                continue
+        lines[line].result = result
+        lines[line].input_text_truncated = truncated
+
+    return list(lines.values())
+
+
+async def iter_batches(items: AsyncIterator[StreamItem], batch_size: int) -> AsyncIterator[list[StreamItem]]:
+    batch: list[StreamItem] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_results(
+    items: AsyncIterator[StreamItem],
+    run_batch: Callable[[list[StreamItem]], Awaitable[list[ExtractObjectsStreamLine]]],
+    batch_size: int,
+    max_in_flight_batches: int,
+) -> AsyncIterator[str]:
+    """
+    Runs items in batches with at most max_in_flight_batches running at once, reading of input
+    waits while the window is full. Results are yielded in input order as soon as their batch finishes
+    """
+    in_flight: deque[asyncio.Task[list[ExtractObjectsStreamLine]]] = deque()
+
+    async def drain(max_pending: int) -> AsyncIterator[str]:
+        while in_flight and (in_flight[0].done() or len(in_flight) > max_pending):
+            for line in await in_flight.popleft():
+                yield line.model_dump_json() + "\n"
+
+    try:
+        async for batch in iter_batches(items, batch_size):
+            in_flight.append(asyncio.create_task(run_batch(batch)))
+            async for line in drain(max_pending=max_in_flight_batches - 1):
+                yield line
+        async for line in drain(max_pending=0):
+            yield line
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+@router.post(
+    ENDPOINT,
+    response_class=RequestStreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}, "text/plain": {"schema": {"type": "string"}}}
+        }
+    },
+)
+async def extract_objects_stream(
+    request: Request,
+    app_settings: AppSettings = Depends(get_app_settings),
+    extractor: BaseObjectsExtractor = Depends(get_selected_extractor),
+    result_cache: ResultCache | None = Depends(get_selected_result_cache),
+) -> RequestStreamingResponse:
+    """
+    Body is streamed NDJSON (JSON string or {"text": ...} per line) or plain text (caption per line).
+    Response is NDJSON of ExtractObjectsStreamLine, one per non-blank input line, with 1-based line numbers
+    """
+
+    async def run_batch(items: list[StreamItem]) -> list[ExtractObjectsStreamLine]:
+        return await extract_stream_batch(items, extractor, result_cache, get_text_max_len(app_settings, extractor))
+
+    async def body() -> AsyncIterator[str]:
+        with track_request(type(extractor).__name__, ENDPOINT):
+            async for line in stream_results(
+                iter_items(request, app_settings.stream_max_line_len),
+                run_batch,
+                batch_size=app_settings.stream_batch_size,
+                max_in_flight_batches=app_settings.stream_max_in_flight_batches,
+            ):
+                yield line
+
+    return RequestStreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
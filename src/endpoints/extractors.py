@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from src.core.models import BatchingStats, CacheStats, ExtractorLoadStats
+from src.dependencies import get_extractor_registry
+from src.dependencies.batching import extractor_batchers
+from src.dependencies.cache import result_caches
+from src.extractor.registry import ExtractorRegistry
+
+router = APIRouter(tags=["extractors"])
+
+
+@router.get("/extractors/stats")
+def get_extractors_stats(
+    extractor_registry: ExtractorRegistry = Depends(get_extractor_registry),
+) -> list[ExtractorLoadStats]:
+    return extractor_registry.stats
+
+
+@router.get("/extractors/batching")
+def get_batching_stats() -> dict[str, BatchingStats]:
+    return {extractor_type: batcher.stats for extractor_type, batcher in extractor_batchers.items()}
+
+
+@router.get("/extractors/cache")
+def get_cache_stats() -> dict[str, CacheStats]:
+    return {extractor_type: result_cache.stats for extractor_type, result_cache in result_caches.items()}
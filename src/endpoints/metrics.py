@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from src.core.instrumentation import format_family, metrics_registry
+from src.core.memory import get_memory_usage, get_rss_bytes
+from src.core.models import BatchingStats, CacheStats, ExtractorLoadStats, MemoryUsage
+from src.dependencies import get_extractor_registry
+from src.dependencies.batching import extractor_batchers
+from src.dependencies.cache import result_caches
+from src.extractor.registry import ExtractorRegistry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(tags=["metrics"])
+
+
+def collect_cache_metrics(cache_stats: dict[str, CacheStats]) -> list[str]:
+    def samples(field: str) -> list[tuple[dict[str, str], float]]:
+        return [({"extractor_type": name}, getattr(stats, field)) for name, stats in cache_stats.items()]
+
+    hits = [
+        ({"extractor_type": name, "tier": tier}, getattr(stats, f"{tier}_hits"))
+        for name, stats in cache_stats.items()
+        for tier in ("memory", "disk")
+    ]
+    return [
+        *format_family("result_cache_hits_total", "counter", "Result cache hits by tier", hits),
+        *format_family("result_cache_misses_total", "counter", "Result cache misses", samples("misses")),
+        *format_family("result_cache_evictions_total", "counter", "Result cache LRU evictions", samples("evictions")),
+        *format_family(
+            "result_cache_expirations_total", "counter", "Result cache TTL expirations", samples("expirations")
+        ),
+        *format_family("result_cache_size", "gauge", "Entries in in-memory result cache", samples("size")),
+    ]
+
+
+def collect_batching_metrics(batching_stats: dict[str, BatchingStats]) -> list[str]:
+    def samples(field: str) -> list[tuple[dict[str, str], float]]:
+        return [({"extractor_type": name}, getattr(stats, field)) for name, stats in batching_stats.items()]
+
+    return [
+        *format_family("batcher_batches_total", "counter", "Micro-batches run", samples("batches_total")),
+        *format_family("batcher_items_total", "counter", "Items run in micro-batches", samples("items_total")),
+        *format_family(
+            "batcher_failed_batches_total",
+            "counter",
+            "Micro-batches retried item by item",
+            samples("failed_batches_total"),
+        ),
+        *format_family(
+            "batcher_queue_wait_seconds_total",
+            "counter",
+            "Total time items waited for batch",
+            samples("queue_wait_s_sum"),
+        ),
+        *format_family("batcher_queue_wait_seconds_max", "gauge", "Longest queue wait", samples("queue_wait_s_max")),
+        *format_family(
+            "batcher_queue_wait_seconds_p99", "gauge", "p99 of recent queue waits", samples("queue_wait_s_p99")
+        ),
+        *format_family("batcher_busy_seconds_total", "counter", "Time spent running batches", samples("busy_s_sum")),
+    ]
+
+
+def collect_registry_metrics(load_stats: list[ExtractorLoadStats]) -> list[str]:
+    return [
+        *format_family(
+            "extractor_load_seconds",
+            "gauge",
+            "Time spent building extractor",
+            [({"extractor_type": stats.extractor_type}, stats.load_time_s) for stats in load_stats],
+        ),
+        *format_family(
+            "extractor_load_rss_bytes",
+            "gauge",
+            "Resident memory growth while building extractor",
+            [({"extractor_type": stats.extractor_type}, stats.rss_delta_bytes) for stats in load_stats],
+        ),
+        *format_family("process_resident_memory_bytes", "gauge", "Resident memory of process", [({}, get_rss_bytes())]),
+    ]
+
+
+def collect_memory_metrics(memory_usage: MemoryUsage | None) -> list[str]:
+    if memory_usage is None:
+        return []
+    return [
+        *format_family(
+            "process_shared_memory_bytes",
+            "gauge",
+            "Resident memory shared with other processes, e.g. with other workers",
+            [({}, memory_usage.shared_bytes)],
+        ),
+        *format_family(
+            "process_private_memory_bytes",
+            "gauge",
+            "Resident memory private to process",
+            [({}, memory_usage.private_bytes)],
+        ),
+        *format_family(
+            "process_proportional_memory_bytes",
+            "gauge",
+            "Proportional set size: private memory plus fair share of shared memory",
+            [({}, memory_usage.pss_bytes)],
+        ),
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(extractor_registry: ExtractorRegistry = Depends(get_extractor_registry)) -> PlainTextResponse:
+    lines = [
+        *metrics_registry.render(),
+        *collect_cache_metrics({name: result_cache.stats for name, result_cache in result_caches.items()}),
+        *collect_batching_metrics({name: batcher.stats for name, batcher in extractor_batchers.items()}),
+        *collect_registry_metrics(extractor_registry.stats),
+        *collect_memory_metrics(get_memory_usage()),
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,4 +1,20 @@
-from src.extractor.bert_extractor import BertExtractor
-from src.extractor.pos_extractor import PosExtractor
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from src.extractor.bert_extractor import BertExtractor
+    from src.extractor.pos_extractor import PosExtractor
 
 __all__ = ["PosExtractor", "BertExtractor"]
+
+# extractors pull in spaCy and torch, so they are imported on first attribute access
+_LAZY_EXPORTS = {
+    "PosExtractor": "src.extractor.pos_extractor",
+    "BertExtractor": "src.extractor.bert_extractor",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(_LAZY_EXPORTS[name]), name)
@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, Mapping, Sequence
+
+import torch
+from torch import nn
+from torch.utils.hooks import RemovableHandle
+
+# (rows, columns) pooling matrices of shapes (batch, n_rows, seq) and (batch, seq, n_columns), they map
+# attention between tokens of the tokenized batch to attention between selected words
+WordPooling = tuple[torch.Tensor, torch.Tensor]
+
+_DROPPED_ATTENTIONS = torch.empty(0)
+
+
+class AttentionReducer:
+    """
+    Accumulates attention probabilities of the first n_layers layers, summed over heads,
+    layer by layer, so the full stack of per-layer attentions is never kept in memory.
+    Special tokens ([CLS] and [SEP]) are stripped from the result
+
+    With pooling and pool_each_layer rows are pooled to words while the forward pass runs, so only
+    (batch, n_rows, seq) is accumulated instead of (batch, seq, seq)
+
+    With heads only listed heads of listed layers are averaged, with per_head pooled attention of every head
+    is kept instead of the mean
+    """
+
+    def __init__(
+        self,
+        n_layers: int,
+        pooling: WordPooling | None = None,
+        pool_each_layer: bool = True,
+        heads: Mapping[int, Sequence[int]] | None = None,
+        per_head: bool = False,
+    ):
+        """
+        :param heads: indices of heads to average in attention probabilities of each layer, None for all heads
+        """
+        if per_head and pooling is None:
+            raise ValueError("Attentions of each head are kept only pooled to words")
+        self.n_layers = n_layers
+        self.pooling = pooling
+        self.pool_each_layer = pool_each_layer and pooling is not None
+        self.heads = heads
+        self.per_head = per_head
+
+        self._sum: torch.Tensor | None = None
+        self._n_heads_added = 0
+        self._head_results: list[torch.Tensor] = []
+
+    def add(self, layer_index: int, attention_probs: torch.Tensor) -> None:
+        """
+        :param layer_index: index of encoder layer
+        :param attention_probs: attention probabilities of the layer, shape (batch, heads, seq, seq)
+        """
+        if layer_index >= self.n_layers:
+            return
+        if self.heads is not None:
+            if layer_index not in self.heads:
+                return
+            attention_probs = attention_probs[:, list(self.heads[layer_index])]
+        if self.per_head:
+            assert self.pooling is not None
+            rows, columns = self.pooling
+            pooled = torch.matmul(torch.matmul(rows.unsqueeze(1), attention_probs), columns.unsqueeze(1))
+            self._head_results.append(pooled)
+            return
+
+        self._n_heads_added += attention_probs.shape[1]
+        heads_sum = attention_probs.sum(dim=1)
+        if self.pool_each_layer:
+            assert self.pooling is not None
+            heads_sum = torch.bmm(self.pooling[0], heads_sum)
+        self._sum = heads_sum if self._sum is None else self._sum.add_(heads_sum)
+
+    def _mean(self) -> torch.Tensor:
+        if not self._n_heads_added:
+            raise RuntimeError("No attentions were added")
+        assert self._sum is not None
+        return self._sum / self._n_heads_added
+
+    def result(self, lengths: Sequence[int]) -> list[torch.Tensor]:
+        """
+        :param lengths: number of non-padding tokens of each text, special tokens included
+        :return: list[torch.Tensor] - mean attention matrix of each text
+        """
+        if self.pool_each_layer:
+            raise RuntimeError("Token attentions are not kept when rows are pooled on each layer")
+        mean = self._mean()
+        return [mean[i, 1 : length - 1, 1 : length - 1] for i, length in enumerate(lengths)]
+
+    def pooled_result(self) -> torch.Tensor:
+        """
+        :return: torch.Tensor - mean attention between selected words, shape (batch, n_rows, n_columns)
+        """
+        if self.pooling is None or self.per_head:
+            raise RuntimeError("Reducer was created without pooling or keeps each head")
+        rows, columns = self.pooling
+        mean = self._mean()
+        return torch.bmm(mean if self.pool_each_layer else torch.bmm(rows, mean), columns)
+
+    def per_head_result(self) -> torch.Tensor:
+        """
+        :return: torch.Tensor - attention between selected words of each head of each added layer,
+            shape (batch, n_layers, n_heads, n_rows, n_columns)
+        """
+        if not self._head_results:
+            raise RuntimeError("No attentions were added or reducer doesn't keep each head")
+        return torch.stack(self._head_results, dim=1)
+
+    @contextmanager
+    def attach(self, encoder_layers: nn.ModuleList) -> Iterator["AttentionReducer"]:
+        """
+        Registers forward hooks on self-attention of every encoder layer. The model must be run with
+        output_attentions=True, hooks consume attention probabilities and replace them with an empty
+        tensor, so model output doesn't hold them
+        """
+        handles: list[RemovableHandle] = [
+            layer.attention.self.register_forward_hook(self._make_hook(layer_index))
+            for layer_index, layer in enumerate(encoder_layers)
+        ]
+        try:
+            yield self
+        finally:
+            for handle in handles:
+                handle.remove()
+
+    def _make_hook(self, layer_index: int):
+        def hook(module: nn.Module, args: Any, outputs: tuple[torch.Tensor, ...]) -> tuple[torch.Tensor, ...]:
+            with torch.profiler.record_function(f"{type(self).__name__}.add"):
+                self.add(layer_index, outputs[1])
+            return (outputs[0], _DROPPED_ATTENTIONS, *outputs[2:])
+
+        return hook
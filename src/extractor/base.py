@@ -1,8 +1,67 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, ContextManager, Sequence
 
+from src.core.executor import run_in_cpu_executor
+from src.core.instrumentation import EXTRACTOR_STAGE_SECONDS
 from src.core.models import ExtractedObjectsDict
 
 
+class ExtractionError(RuntimeError):
+    """
+    Extraction failed for reasons other than text, e.g. upstream API is unavailable, result must not be cached
+    """
+
+
 class BaseObjectsExtractor(ABC):
     @abstractmethod
     def extract(self, text: str) -> ExtractedObjectsDict: ...
+
+    def extract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        return [self.extract(text) for text in texts]
+
+    @property
+    def handles_long_texts(self) -> bool:
+        """
+        Whether cost of extraction grows about linearly with text length, so texts may exceed text_max_len
+        """
+        return False
+
+    @property
+    def uses_torch(self) -> bool:
+        return False
+
+    def warm_up(self, text: str) -> None:
+        """
+        Runs extraction once, so lazy initialisation (thread pools, allocator caches) doesn't slow down first request
+        """
+        self.extract(text)
+
+    async def aextract(self, text: str) -> ExtractedObjectsDict:
+        return await run_in_cpu_executor(self.extract, text)
+
+    async def aextract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        return await run_in_cpu_executor(self.extract_batch, texts)
+
+    async def astream_objects(self, text: str) -> AsyncIterator[tuple[str, list[str]]]:
+        """
+        Yields each object with its descriptions as soon as it is extracted, by default all at once after extraction
+        """
+        for name, descriptions in (await self.aextract(text))["objects"].items():
+            yield name, descriptions
+
+    async def aclose(self) -> None:
+        """
+        Releases resources bound to event loop, e.g. HTTP sessions
+        """
+
+    def fingerprint(self) -> str:
+        """
+        Identifies model and settings of extractor: extractors with equal fingerprints return equal results
+        """
+        return type(self).__name__
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """
+        Times pipeline stage into extractor_stage_duration_seconds histogram
+        """
+        return EXTRACTOR_STAGE_SECONDS.time(extractor=type(self).__name__, stage=name)
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Callable, Generic, Sequence, TypeVar
+
+from loguru import logger
+
+from src.core.executor import run_in_cpu_executor
+from src.core.instrumentation import BATCHER_BATCH_SIZE
+from src.core.models import BatchingStats
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+WAIT_WINDOW_SIZE = 4096
+
+
+@dataclass(slots=True)
+class _PendingItem(Generic[T, R]):
+    item: T
+    future: asyncio.Future[R]
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects concurrently submitted items for up to max_wait_ms or max_batch_size
+    and runs them through batch_fn on CPU executor as a single batch. Batch sizes are exported
+    as batcher_batch_size histogram labelled with name
+    """
+
+    def __init__(
+        self, batch_fn: Callable[[Sequence[T]], list[R]], max_batch_size: int, max_wait_ms: float, name: str = ""
+    ):
+        self.batch_fn = batch_fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+
+        self._queue: asyncio.Queue[_PendingItem[T, R]] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+
+        self._batch_sizes: Counter[int] = Counter()
+        self._queue_waits: deque[float] = deque(maxlen=WAIT_WINDOW_SIZE)
+        self._stats = BatchingStats()
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.cancel()
+
+    async def submit(self, item: T) -> R:
+        if not self.is_running:
+            raise RuntimeError("MicroBatcher is not started")
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingItem(item=item, future=future))
+        return await future
+
+    @property
+    def stats(self) -> BatchingStats:
+        waits = sorted(self._queue_waits)
+        return self._stats.model_copy(
+            update={
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_s_p50": waits[len(waits) // 2] if waits else 0.0,
+                "queue_wait_s_p99": waits[int(len(waits) * 0.99)] if waits else 0.0,
+            }
+        )
+
+    async def _collect_batch(self) -> list[_PendingItem[T, R]]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            if (timeout := deadline - time.perf_counter()) <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = [pending for pending in await self._collect_batch() if not pending.future.cancelled()]
+            if not batch:
+                continue
+
+            started_at = time.perf_counter()
+            for pending in batch:
+                self._record_wait(started_at - pending.enqueued_at)
+
+            items = [pending.item for pending in batch]
+            try:
+                results = await run_in_cpu_executor(self.batch_fn, items)
+            except Exception as e:
+                logger.warning(f"Batch of {len(items)} failed, retrying items one by one: {e}")
+                self._stats.failed_batches_total += 1
+                await self._run_one_by_one(batch)
+            else:
+                for pending, result in zip(batch, results):
+                    if not pending.future.done():
+                        pending.future.set_result(result)
+
+            self._record_batch(len(batch), time.perf_counter() - started_at)
+
+    async def _run_one_by_one(self, batch: list[_PendingItem[T, R]]) -> None:
+        for pending in batch:
+            try:
+                (result,) = await run_in_cpu_executor(self.batch_fn, [pending.item])
+            except Exception as e:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            else:
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    def _record_wait(self, wait_s: float) -> None:
+        self._queue_waits.append(wait_s)
+        self._stats.queue_wait_s_sum += wait_s
+        self._stats.queue_wait_s_max = max(self._stats.queue_wait_s_max, wait_s)
+
+    def _record_batch(self, batch_size: int, busy_s: float) -> None:
+        self._batch_sizes[batch_size] += 1
+        BATCHER_BATCH_SIZE.observe(batch_size, extractor_type=self.name)
+        self._stats.batches_total += 1
+        self._stats.items_total += batch_size
+        self._stats.busy_s_sum += busy_s
@@ -0,0 +1,134 @@
+import argparse
+import json
+from pathlib import Path
+
+import pandas as pd
+import torch
+from loguru import logger
+from torch import nn
+from transformers import AutoTokenizer
+from transformers.models.bert.modeling_bert import BertForMaskedLM, BertModel
+
+from src.core.models import BertBackend
+from src.core.settings import CONFIGS_DIR, BertExtractorSettings
+from src.extractor.bert_backends import DATA_DIR, ONNX_INPUT_NAMES, load_torch_model
+from src.extractor.bert_extractor import BertExtractor
+from src.metrics import rouge_like_metric
+
+ONNX_OPSET = 14
+
+
+class _AttentionsOnly(nn.Module):
+    def __init__(self, model: BertModel | BertForMaskedLM):
+        super().__init__()
+        self.model = model
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor, token_type_ids: torch.Tensor
+    ) -> tuple[torch.Tensor, ...]:
+        return self.model(
+            input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids, output_attentions=True
+        ).attentions
+
+
+def export_onnx(config: BertExtractorSettings, output_path: Path, quantize: bool = False) -> Path:
+    """
+    Exports BERT encoder to ONNX, graph outputs are attention probabilities of each layer
+    :param config: extractor settings, truncate_encoder and process_attentions define exported depth
+    :param output_path: path of exported graph
+    :param quantize: quantize weights of exported graph to int8 with onnxruntime
+    :return: Path - path of exported graph
+    """
+    model = load_torch_model(config).eval()
+    tokenizer = AutoTokenizer.from_pretrained(config.pretrained_model_name, cache_dir=DATA_DIR)  # pyright: ignore
+    dummy_inputs = tokenizer(["beautiful furry rabbit in fresh snow"], return_tensors="pt")  # pyright: ignore
+
+    output_names = [f"attentions_{i}" for i in range(model.config.num_hidden_layers)]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ONNX_INPUT_NAMES} | {
+        name: {0: "batch", 2: "sequence", 3: "sequence"} for name in output_names
+    }
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_path.with_suffix(".fp32.onnx") if quantize else output_path
+    torch.onnx.export(
+        _AttentionsOnly(model),
+        tuple(dummy_inputs[name] for name in ONNX_INPUT_NAMES),  # pyright: ignore
+        str(fp32_path),
+        input_names=list(ONNX_INPUT_NAMES),
+        output_names=output_names,
+        dynamic_axes=dynamic_axes,
+        opset_version=ONNX_OPSET,
+    )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QInt8)
+
+    logger.info(f"Exported {len(output_names)} layers to {output_path}")
+    return output_path
+
+
+def check_parity(config: BertExtractorSettings, texts: list[str]) -> dict[str, float]:
+    """
+    Compares configured backend against eager torch on attention weights and extracted objects
+    :return: dict[str, float] - max attention difference, share of identical extractions and
+        mean rouge-like metric of backend extractions against eager ones
+    """
+    reference = BertExtractor(config.model_copy(update={"backend": BertBackend.torch_eager}))
+    candidate = BertExtractor(config, pos_extractor=reference.pos_extractor)
+
+    max_abs_diff = max(
+        (reference.get_attention_weights(text) - candidate.get_attention_weights(text)).abs().max().item()
+        for text in texts
+    )
+    reference_objects = reference.extract_batch(texts)
+    candidate_objects = candidate.extract_batch(texts)
+
+    scores = [
+        rouge_like_metric(pred=pred["objects"], target=target["objects"])
+        for pred, target in zip(candidate_objects, reference_objects)
+        if any(target["objects"].values())
+    ]
+    return {
+        "n_texts": len(texts),
+        "max_abs_attention_diff": max_abs_diff,
+        "identical_extractions_share": sum(pred == target for pred, target in zip(candidate_objects, reference_objects))
+        / len(texts),
+        "mean_rouge_like_vs_eager": sum(scores) / len(scores) if scores else 1.0,
+    }
+
+
+def read_captions(path: Path, limit: int) -> list[str]:
+    return pd.read_csv(path)["text"].head(limit).tolist()  # pyright: ignore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export BERT to ONNX and check backend parity")
+    parser.add_argument("--config", type=Path, default=CONFIGS_DIR / "bert_extractor_settings.yaml")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--output", type=Path, default=None)
+    export_parser.add_argument("--quantize", action="store_true")
+
+    parity_parser = subparsers.add_parser("parity")
+    parity_parser.add_argument("--backend", type=BertBackend, choices=list(BertBackend), default=None)
+    parity_parser.add_argument("--captions", type=Path, default=DATA_DIR / "val_clean.csv")
+    parity_parser.add_argument("--limit", type=int, default=1000)
+
+    args = parser.parse_args()
+    config = BertExtractorSettings.from_yaml(args.config)
+
+    match args.command:
+        case "export":
+            export_onnx(config, output_path=args.output or config.onnx_model_path, quantize=args.quantize)
+        case "parity":
+            if args.backend is not None:
+                config = config.model_copy(update={"backend": args.backend})
+            report = check_parity(config, read_captions(args.captions, args.limit))
+            logger.info(json.dumps({"backend": config.backend, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
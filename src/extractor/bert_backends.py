@@ -0,0 +1,240 @@
+import json
+import mmap
+import struct
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import torch
+from loguru import logger
+from torch import nn
+from transformers import AutoConfig, AutoModel, AutoModelForMaskedLM, BatchEncoding
+from transformers.models.bert.configuration_bert import BertConfig
+from transformers.models.bert.modeling_bert import BertForMaskedLM, BertModel
+
+from src.core.models import BertBackend
+from src.core.settings import ROOT_DIR, BertExtractorSettings
+from src.extractor.attention_reducer import AttentionReducer
+
+DATA_DIR = ROOT_DIR / "data"
+
+ONNX_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+SAFETENSORS_FILE_NAME = "model.safetensors"
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+}
+# legacy names of LayerNorm parameters in original BERT checkpoints
+LEGACY_PARAMETER_SUFFIXES = {".weight": ".gamma", ".bias": ".beta"}
+
+
+def load_torch_model(config: BertExtractorSettings) -> BertModel | BertForMaskedLM:
+    """
+    Loads BERT for attention extraction. With truncate_encoder only the encoder layers
+    needed by process_attentions are built, and the MLM head is skipped: attentions of
+    the kept layers don't depend on the layers after them, so results stay the same
+    """
+    if not config.truncate_encoder:
+        return AutoModelForMaskedLM.from_pretrained(  # pyright: ignore
+            config.pretrained_model_name, output_attentions=True, attn_implementation="eager", cache_dir=DATA_DIR
+        )
+
+    model_config: BertConfig = AutoConfig.from_pretrained(  # pyright: ignore
+        config.pretrained_model_name, cache_dir=DATA_DIR
+    )
+    return AutoModel.from_pretrained(  # pyright: ignore
+        config.pretrained_model_name,
+        num_hidden_layers=min(config.n_layers_needed, model_config.num_hidden_layers),
+        add_pooling_layer=False,
+        output_attentions=True,
+        attn_implementation="eager",
+        cache_dir=DATA_DIR,
+    )
+
+
+def get_checkpoint_keys(name: str, base_model_prefix: str) -> list[str]:
+    names = [name, f"{base_model_prefix}.{name}", name.removeprefix(f"{base_model_prefix}.")]
+    for suffix, legacy_suffix in LEGACY_PARAMETER_SUFFIXES.items():
+        if "LayerNorm" in name and name.endswith(suffix):
+            names += [key.removesuffix(suffix) + legacy_suffix for key in names]
+    return names
+
+
+def map_safetensors_weights(model: nn.Module, weights_path: Path, base_model_prefix: str = "") -> mmap.mmap:
+    """
+    Replaces parameters of model with tensors backed by copy-on-write mapping of safetensors file.
+    Weight pages then come from page cache: they are shared by every process mapping the same file and
+    by workers forked after loading, and are never copied unless written to
+    :return: mmap.mmap - mapping, it must outlive the model
+    """
+    with open(weights_path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_size,) = struct.unpack("<Q", mapping[:8])
+    header: dict[str, dict[str, list[int] | str]] = json.loads(mapping[8 : 8 + header_size])
+    data_start = 8 + header_size
+
+    n_mapped = 0
+    for name, parameter in model.named_parameters():
+        key = next((key for key in get_checkpoint_keys(name, base_model_prefix) if key in header), None)
+        if key is None:
+            continue
+        entry = header[key]
+        dtype = SAFETENSORS_DTYPES.get(str(entry["dtype"]))
+        start, end = entry["data_offsets"]  # pyright: ignore
+        if dtype != parameter.dtype or (end - start) != parameter.numel() * parameter.element_size():  # pyright: ignore
+            continue
+        tensor = torch.frombuffer(mapping, dtype=dtype, count=parameter.numel(), offset=data_start + start)
+        parameter.data = tensor.view(parameter.shape)
+        n_mapped += 1
+
+    logger.info(f"Mapped {n_mapped}/{len(list(model.parameters()))} parameters from {weights_path}")
+    return mapping
+
+
+def map_pretrained_weights(model: BertModel | BertForMaskedLM, config: BertExtractorSettings) -> mmap.mmap | None:
+    """
+    :return: mmap.mmap | None - mapping of model weights, None if checkpoint has no safetensors weights
+    """
+    from transformers.utils import cached_file
+
+    try:
+        weights_path = cached_file(config.pretrained_model_name, SAFETENSORS_FILE_NAME, cache_dir=DATA_DIR)
+    except OSError as e:
+        logger.warning(f"Weights of {config.pretrained_model_name} stay in anonymous memory: {e}")
+        return None
+    if weights_path is None:
+        return None
+    return map_safetensors_weights(model, Path(weights_path), base_model_prefix=model.base_model_prefix)
+
+
+def prune_unselected_heads(model: BertModel | BertForMaskedLM, config: BertExtractorSettings) -> None:
+    """
+    Prunes heads of the deepest selected layer that are not selected. Heads of earlier layers are kept: their
+    outputs feed selected heads of later layers, pruning them would change the selected attentions
+    """
+    if not config.selected_heads or not config.prune_heads:
+        return
+    last_layer = max(layer for layer, _ in config.selected_heads)
+    if last_layer >= model.config.num_hidden_layers:
+        # too shallow model is rejected by load_backend
+        return
+
+    selected = {head for layer, head in config.selected_heads if layer == last_layer}
+    unselected = [head for head in range(model.config.num_attention_heads) if head not in selected]
+    if unselected:
+        model.base_model.prune_heads({last_layer: unselected})
+        logger.info(f"Pruned {len(unselected)} heads of layer {last_layer}")
+
+
+class BaseBertBackend(ABC):
+    n_layers: int
+
+    @property
+    def pruned_heads(self) -> dict[int, set[int]]:
+        return {}
+
+    def get_head_indices(self, selected_heads: Sequence[tuple[int, int]]) -> dict[int, list[int]]:
+        """
+        Maps (layer, head) pairs to indices of heads in attention probabilities the backend outputs,
+        which skip pruned heads
+        """
+        indices: dict[int, list[int]] = defaultdict(list)
+        for layer, head in sorted(set(selected_heads)):
+            pruned = self.pruned_heads.get(layer, set())
+            indices[layer].append(head - sum(pruned_head < head for pruned_head in pruned))
+        return dict(indices)
+
+    @abstractmethod
+    def run(self, tokenized_texts: BatchEncoding, reducer: AttentionReducer) -> None:
+        """
+        Runs forward pass and passes attention probabilities of every layer to reducer
+        """
+
+
+class TorchBackend(BaseBertBackend):
+    def __init__(self, model: BertModel | BertForMaskedLM, weights_mapping: mmap.mmap | None = None):
+        self.model = model
+        self.n_layers = model.config.num_hidden_layers
+        # keeps memory-mapped weights of model alive
+        self.weights_mapping = weights_mapping
+
+    @property
+    def pruned_heads(self) -> dict[int, set[int]]:
+        return {int(layer): set(heads) for layer, heads in self.model.config.pruned_heads.items()}
+
+    def run(self, tokenized_texts: BatchEncoding, reducer: AttentionReducer) -> None:
+        with torch.inference_mode(), reducer.attach(self.model.base_model.encoder.layer):
+            self.model(**tokenized_texts, output_attentions=True)
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    Linear layers are quantized to int8 with dynamic activation quantization
+    """
+
+    def __init__(self, model: BertModel | BertForMaskedLM):
+        quantized_model: BertModel | BertForMaskedLM = torch.ao.quantization.quantize_dynamic(  # pyright: ignore
+            model, {nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(quantized_model)
+
+
+class OnnxBackend(BaseBertBackend):
+    """
+    Runs graph exported by src.extractor.bert_backend_tools export, graph outputs are attentions of each layer
+    """
+
+    def __init__(self, model_path: str | Path):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "onnxruntime is required for onnx backend, install it with `poetry install --with onnx`"
+            ) from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.output_names = [model_output.name for model_output in self.session.get_outputs()]
+        self.n_layers = len(self.output_names)
+
+    def run(self, tokenized_texts: BatchEncoding, reducer: AttentionReducer) -> None:
+        inputs = {name: tokenized_texts[name].numpy().astype(np.int64) for name in self.input_names}
+        for layer_index, attention_probs in enumerate(self.session.run(self.output_names, inputs)):
+            reducer.add(layer_index, torch.from_numpy(attention_probs))  # pyright: ignore
+
+
+def make_backend(config: BertExtractorSettings) -> BaseBertBackend:
+    match config.backend:
+        case BertBackend.torch_eager:
+            model = load_torch_model(config)
+            weights_mapping = map_pretrained_weights(model, config) if config.mmap_weights else None
+            prune_unselected_heads(model, config)
+            return TorchBackend(model, weights_mapping)
+        case BertBackend.torch_int8:
+            model = load_torch_model(config)
+            prune_unselected_heads(model, config)
+            return QuantizedTorchBackend(model)
+        case BertBackend.onnx:
+            return OnnxBackend(config.onnx_model_path)
+
+
+def load_backend(config: BertExtractorSettings) -> BaseBertBackend:
+    """
+    :raises ValueError: backend has fewer layers than process_attentions or selected_heads need, e.g. ONNX graph
+        exported for shallower config, averaging fewer layers would silently change results
+    """
+    backend = make_backend(config)
+    if backend.n_layers < config.n_layers_needed:
+        raise ValueError(
+            f"{config.backend} backend has {backend.n_layers} attention layers, "
+            f"but settings need {config.n_layers_needed}"
+        )
+    return backend
@@ -1,82 +1,310 @@
+import bisect
+import math
 from collections import defaultdict
-from typing import Callable, TypeAlias
+from contextlib import contextmanager
+from itertools import batched
+from typing import Iterator, Sequence, TypeAlias
 
 import torch
-from transformers import AutoModelForMaskedLM, AutoTokenizer
-from transformers.models.bert.modeling_bert import BertForMaskedLM
+from spacy.tokens import Doc
+from transformers import AutoTokenizer, BatchEncoding
+from transformers.models.bert.modeling_bert import BertForMaskedLM, BertModel
 from transformers.models.bert.tokenization_bert_fast import BertTokenizerFast
 
-from src.core.models import ExtractedObjectsDict, ProcessAttentions
-from src.core.settings import ROOT_DIR, BertExtractorSettings
+from src.core.models import BertBackend, ExtractedObjectsDict
+from src.core.settings import BertExtractorSettings
+from src.extractor.attention_reducer import AttentionReducer
 from src.extractor.base import BaseObjectsExtractor
-from src.extractor.pos_extractor import PosExtractor
+from src.extractor.bert_backends import DATA_DIR, TorchBackend, load_backend
+from src.extractor.pos_extractor import PosExtractor, Token
 
 Attentions_T: TypeAlias = tuple[torch.Tensor, ...]
-
-DATA_DIR = ROOT_DIR / "data"
+# [start, end) spaCy token indices of a chunk of doc
+Chunk: TypeAlias = tuple[int, int]
+# [start, end) character offsets of a word in text
+CharSpan: TypeAlias = tuple[int, int]
+# character spans of (row words, column words) of one text
+WordSelection: TypeAlias = tuple[Sequence[CharSpan], Sequence[CharSpan]]
 
 
 class BertExtractor(BaseObjectsExtractor):
-    def __init__(self, config: BertExtractorSettings):
+    def __init__(self, config: BertExtractorSettings, pos_extractor: PosExtractor | None = None):
         self.config = config
-        self.pos_extractor = PosExtractor()
+        self.pos_extractor = pos_extractor if pos_extractor is not None else PosExtractor()
 
         self.tokenizer: BertTokenizerFast = AutoTokenizer.from_pretrained(  # pyright: ignore
             config.pretrained_model_name, cache_dir=DATA_DIR
         )
-        self.model: BertForMaskedLM = AutoModelForMaskedLM.from_pretrained(  # pyright: ignore
-            config.pretrained_model_name, output_attentions=True, cache_dir=DATA_DIR
-        )
+        self.backend = load_backend(config)
+        self.head_indices = self.backend.get_head_indices(config.selected_heads) if config.selected_heads else None
 
-        self._get_attentions_mapping: dict[str, Callable[[Attentions_T], torch.Tensor]] = {
-            ProcessAttentions.get_first: self.get_first_attention_block,
-            ProcessAttentions.get_all_mean: self.get_all_attention_blocks,
-        }
-        self._preprocess_attentions_mapping: dict[str, Callable[[torch.Tensor], torch.Tensor]] = {
-            ProcessAttentions.get_first: self.get_first_attention_tensor,
-            ProcessAttentions.get_all_mean: self.get_mean_attention_tensor,
-        }
+    @property
+    def model(self) -> BertModel | BertForMaskedLM:
+        if not isinstance(self.backend, TorchBackend):
+            raise AttributeError(f"{self.config.backend} backend has no torch model")
+        return self.backend.model
 
-    @staticmethod
-    def get_all_attention_blocks(attentions: Attentions_T) -> torch.Tensor:
-        return torch.concat(attentions, dim=0)
+    def fingerprint(self) -> str:
+        settings = self.config.model_dump_json(exclude={"batching_enabled", "max_batch_size", "max_wait_ms"})
+        fingerprint = f"{type(self).__name__}:{settings}:{self.pos_extractor.fingerprint()}"
+        if self.config.backend == BertBackend.onnx:
+            model_stat = self.config.onnx_model_path.stat()
+            fingerprint += f":{model_stat.st_size}:{model_stat.st_mtime_ns}"
+        return fingerprint
 
-    @staticmethod
-    def get_first_attention_block(attentions: Attentions_T) -> torch.Tensor:
-        return attentions[0]
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Also marks stage in torch.profiler traces
+        """
+        with super().stage(name), torch.profiler.record_function(f"{type(self).__name__}.{name}"):
+            yield
 
-    @staticmethod
-    def get_first_attention_tensor(attention: torch.Tensor) -> torch.Tensor:
-        return torch.mean(attention, dim=1).squeeze()[1:-1, 1:-1]
+    @property
+    def uses_torch(self) -> bool:
+        return True
+
+    @property
+    def handles_long_texts(self) -> bool:
+        return self.config.chunking_enabled
 
-    def get_mean_attention_tensor(self, attention: torch.Tensor) -> torch.Tensor:
-        return attention[: self.config.n_blocks_to_average].mean(dim=(0, 1))[1:-1, 1:-1]
+    @property
+    def n_layers_to_reduce(self) -> int:
+        return self.config.n_layers_needed
 
     def get_net_attentions(self, text: str) -> Attentions_T:
         return self.model(**self.tokenizer(text, return_tensors="pt")).attentions
 
     def get_tokens_processed_attentions(self, attentions: Attentions_T) -> list[list[float]]: ...
 
-    def extract(self, text: str) -> ExtractedObjectsDict:
-        objects: dict[str, list[str]] = defaultdict(list)
+    def tokenize(self, texts: Sequence[str], return_offsets_mapping: bool = False) -> BatchEncoding:
+        with self.stage("tokenize"):
+            return self.tokenizer(
+                list(texts), return_tensors="pt", padding=True, return_offsets_mapping=return_offsets_mapping
+            )
 
-        doc = self.pos_extractor.get_doc(text)
-        nouns = self.pos_extractor.get_nouns(doc=doc)
-        nouns_without_adjectives = {noun.text for noun in nouns}
-        nouns_mask = torch.tensor([noun.index for noun in nouns])
+    def reduce_attentions(self, texts: Sequence[str]) -> list[torch.Tensor]:
+        """
+        Runs one padded forward pass for all texts and averages attentions over heads and the first
+        n_layers_to_reduce layers while the forward pass runs
+        :return: list[torch.Tensor] - mean attention matrix between subword tokens for each text,
+            special tokens and padding stripped
+        """
+        tokenized_texts = self.tokenize(texts)
+        lengths: list[int] = tokenized_texts["attention_mask"].sum(dim=1).tolist()  # pyright: ignore
 
-        adjectives = self.pos_extractor.get_adjectives(doc=doc)
+        reducer = AttentionReducer(n_layers=self.n_layers_to_reduce, heads=self.head_indices)
+        with self.stage("forward"):
+            self.backend.run(tokenized_texts, reducer)
+        with self.stage("reduce_attentions"):
+            return reducer.result(lengths)
+
+    @staticmethod
+    def make_word_membership(offsets: torch.Tensor, spans: Sequence[Sequence[CharSpan]]) -> torch.Tensor:
+        """
+        Marks subword tokens overlapping character span of each word
+        :param offsets: offset mapping of tokenized batch, shape (batch, seq, 2), (0, 0) for special tokens and padding
+        :param spans: character spans of words of each text
+        :return: torch.Tensor - 0/1 matrix of shape (batch, max number of words, seq), zero rows for padding words
+        """
+        n_words = max((len(text_spans) for text_spans in spans), default=0)
+        padded_spans = torch.zeros(len(spans), n_words, 2, dtype=offsets.dtype)
+        for i, text_spans in enumerate(spans):
+            if text_spans:
+                padded_spans[i, : len(text_spans)] = torch.tensor(text_spans, dtype=offsets.dtype)
+
+        token_starts, token_ends = offsets[..., 0].unsqueeze(1), offsets[..., 1].unsqueeze(1)
+        membership = (
+            (token_starts < padded_spans[..., 1:]) & (token_ends > padded_spans[..., :1]) & (token_ends > token_starts)
+        )
+        return membership.float()
 
-        tokenized_text = self.tokenizer(text, return_tensors="pt")
-        with torch.inference_mode():
-            attentions = self._get_attentions_mapping[self.config.process_attentions](
-                self.model(**tokenized_text).attentions
+    def reduce_word_attentions(
+        self, texts: Sequence[str], selections: Sequence[WordSelection], per_head: bool = False
+    ) -> list[torch.Tensor]:
+        """
+        Runs one padded forward pass and pools subword attentions to attention between selected words using
+        offset mapping: attention from word is mean over its subwords, attention to word is sum over its subwords
+        :param per_head: keep attention of each head instead of the mean, matrices get leading (n_layers, n_heads)
+        :return: list[torch.Tensor] - attention matrix of shape (n_rows, n_columns) for each text
+        """
+        tokenized_texts = self.tokenize(texts, return_offsets_mapping=True)
+        offsets: torch.Tensor = tokenized_texts.pop("offset_mapping")  # pyright: ignore
+        with self.stage("align_words"):
+            rows = self.make_word_membership(offsets, [row_spans for row_spans, _ in selections])
+            rows = rows / rows.sum(dim=2, keepdim=True).clamp(min=1)
+            columns = self.make_word_membership(offsets, [column_spans for _, column_spans in selections])
+
+        reducer = AttentionReducer(
+            n_layers=self.n_layers_to_reduce,
+            pooling=(rows, columns.transpose(1, 2)),
+            pool_each_layer=self.config.reduce_selected_attentions_only,
+            heads=self.head_indices,
+            per_head=per_head,
+        )
+        with self.stage("forward"):
+            self.backend.run(tokenized_texts, reducer)
+        with self.stage("reduce_attentions"):
+            pooled = reducer.per_head_result() if per_head else reducer.pooled_result()
+        return [
+            pooled[i, ..., : len(row_spans), : len(column_spans)]
+            for i, (row_spans, column_spans) in enumerate(selections)
+        ]
+
+    def get_attention_weights(self, text: str) -> torch.Tensor:
+        return self.reduce_attentions([text])[0]
+
+    def get_selected_weights(
+        self, texts: Sequence[str], selections: Sequence[WordSelection], per_head: bool = False
+    ) -> list[torch.Tensor]:
+        """
+        :return: list[torch.Tensor] - attention matrix of shape (n_rows, n_columns) for each text
+        """
+        # texts of similar length are batched together to keep padding small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        weights: list[torch.Tensor] = [torch.empty(0)] * len(texts)
+        for indices in batched(order, self.config.max_batch_size):
+            batch_weights = self.reduce_word_attentions(
+                [texts[i] for i in indices], [selections[i] for i in indices], per_head=per_head
             )
-        avg_attention_weights = self._preprocess_attentions_mapping[self.config.process_attentions](attentions)
+            for i, adj_noun_weights in zip(indices, batch_weights):
+                weights[i] = adj_noun_weights
+        return weights
+
+    @staticmethod
+    def get_char_spans(doc: Doc, tokens: Sequence[Token], start: int = 0) -> list[CharSpan]:
+        """
+        :param start: index of the first token of chunk, spans are relative to chunk text
+        """
+        offset = doc[start].idx if start < len(doc) else 0
+        return [(doc[token.index].idx - offset, doc[token.index].idx - offset + len(token.text)) for token in tokens]
+
+    def split_into_chunks(self, doc: Doc) -> list[Chunk]:
+        """
+        Packs consecutive sentences into chunks of at most chunk_max_tokens spaCy tokens,
+        sentences longer than that are split into windows of chunk_max_tokens
+        """
+        max_tokens = self.config.chunk_max_tokens
+        chunks: list[Chunk] = []
+        start = end = 0
+        for sentence in doc.sents:
+            for window_start in range(sentence.start, sentence.end, max_tokens):
+                window_end = min(window_start + max_tokens, sentence.end)
+                if window_end - start > max_tokens:
+                    if end > start:
+                        chunks.append((start, end))
+                    start = window_start
+                end = window_end
+        if end > start:
+            chunks.append((start, end))
+        return chunks
+
+    def get_chunked_adjective_noun_weights(
+        self,
+        docs: Sequence[Doc],
+        nouns: Sequence[list[Token]],
+        adjectives: Sequence[list[Token]],
+        per_head: bool = False,
+    ) -> list[torch.Tensor]:
+        """
+        Runs chunks of all docs as separate texts, so attention is never computed across chunk boundaries.
+        Weight of adjective and noun from different chunks is -inf, adjective is never mapped to noun of another chunk
+        :return: list[torch.Tensor] - attention matrix of shape (n_adjectives, n_nouns) for each doc
+        """
+        weights = [
+            torch.full((len(doc_adjectives), len(doc_nouns)), -torch.inf)
+            for doc_nouns, doc_adjectives in zip(nouns, adjectives)
+        ]
+        chunk_texts: list[str] = []
+        chunk_selections: list[WordSelection] = []
+        # doc index, adjectives slice, nouns slice
+        targets: list[tuple[int, slice, slice]] = []
+        for doc_index, (doc, doc_nouns, doc_adjectives) in enumerate(zip(docs, nouns, adjectives)):
+            adj_indices = [adj.index for adj in doc_adjectives]
+            noun_indices = [noun.index for noun in doc_nouns]
+            for start, end in self.split_into_chunks(doc):
+                adj_slice = slice(bisect.bisect_left(adj_indices, start), bisect.bisect_left(adj_indices, end))
+                noun_slice = slice(bisect.bisect_left(noun_indices, start), bisect.bisect_left(noun_indices, end))
+                # chunk without adjectives or nouns has no pairs to weigh
+                if adj_slice.start == adj_slice.stop or noun_slice.start == noun_slice.stop:
+                    continue
+                chunk_texts.append(doc[start:end].text)
+                chunk_selections.append(
+                    (
+                        self.get_char_spans(doc, doc_adjectives[adj_slice], start),
+                        self.get_char_spans(doc, doc_nouns[noun_slice], start),
+                    )
+                )
+                targets.append((doc_index, adj_slice, noun_slice))
+
+        for (doc_index, adj_slice, noun_slice), chunk_weights in zip(
+            targets, self.get_selected_weights(chunk_texts, chunk_selections, per_head=per_head)
+        ):
+            if weights[doc_index].dim() != chunk_weights.dim():
+                weights[doc_index] = chunk_weights.new_full(
+                    (*chunk_weights.shape[:-2], *weights[doc_index].shape), -torch.inf
+                )
+            weights[doc_index][..., adj_slice, noun_slice] = chunk_weights
+        return weights
+
+    def get_adjective_noun_weights(
+        self,
+        docs: Sequence[Doc],
+        nouns: Sequence[list[Token]],
+        adjectives: Sequence[list[Token]],
+        per_head: bool = False,
+    ) -> list[torch.Tensor]:
+        """
+        :param per_head: keep attention of each head, matrices get leading (n_layers, n_heads) dimensions,
+            except for docs without adjective-noun pairs
+        :return: list[torch.Tensor] - attention matrix of shape (n_adjectives, n_nouns) for each doc
+        """
+        if self.config.chunking_enabled:
+            return self.get_chunked_adjective_noun_weights(docs, nouns=nouns, adjectives=adjectives, per_head=per_head)
+
+        selections: list[WordSelection] = [
+            (self.get_char_spans(doc, doc_adjectives), self.get_char_spans(doc, doc_nouns))
+            for doc, doc_nouns, doc_adjectives in zip(docs, nouns, adjectives)
+        ]
+        return self.get_selected_weights([doc.text for doc in docs], selections, per_head=per_head)
+
+    @staticmethod
+    def argmax_nouns(weights: Sequence[torch.Tensor]) -> list[list[int]]:
+        """
+        Picks noun with the highest weight for every adjective of every text with one argmax over padded batch
+        :param weights: attention matrix of shape (n_adjectives, n_nouns) for each text
+        :return: list[list[int]] - index of noun for each adjective of each text, -1 for adjective without
+            noun in reach, i.e. with all weights -inf
+        """
+        n_adjectives = max((text_weights.shape[0] for text_weights in weights), default=0)
+        n_nouns = max((text_weights.shape[1] for text_weights in weights), default=0)
+        if not n_adjectives or not n_nouns:
+            return [[] for _ in weights]
+
+        padded = torch.full((len(weights), n_adjectives, n_nouns), -torch.inf)
+        for i, text_weights in enumerate(weights):
+            padded[i, : text_weights.shape[0], : text_weights.shape[1]] = text_weights
+        best_weights, best_nouns = padded.max(dim=2)
+        best: list[list[int]] = best_nouns.masked_fill(best_weights == -torch.inf, -1).tolist()  # pyright: ignore
+        return [text_best[: text_weights.shape[0]] for text_best, text_weights in zip(best, weights)]
+
+    @staticmethod
+    def map_adjectives_to_nouns(
+        nouns: list[Token], adjectives: list[Token], noun_indices: Sequence[int]
+    ) -> ExtractedObjectsDict:
+        """
+        :param noun_indices: index of noun with the highest weight for each adjective, adjectives with -1 are skipped
+        """
+        objects: dict[str, list[str]] = defaultdict(list)
+
+        if not nouns:
+            return {"objects": {}}
+        nouns_without_adjectives = {noun.text for noun in nouns}
 
         adj_noun_mapping: dict[str, str] = {}
-        for adj in adjectives:
-            noun_idx: int = avg_attention_weights[adj.index, nouns_mask].argmax().item()  # pyright: ignore
+        for adj, noun_idx in zip(adjectives, noun_indices):
+            if noun_idx < 0:
+                continue
             corresponding_noun = nouns[noun_idx].text
             adj_noun_mapping[adj.text] = corresponding_noun
             nouns_without_adjectives.discard(corresponding_noun)
@@ -89,24 +317,45 @@ class BertExtractor(BaseObjectsExtractor):
 
         return {"objects": dict(objects)}
 
-    def get_adjectives_attentions(self, text: str) -> dict[str, dict[str, float]]:
-        result: dict[str, dict[str, float]] = defaultdict(dict[str, float])
+    def extract(self, text: str) -> ExtractedObjectsDict:
+        return self.extract_batch([text])[0]
 
+    def extract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        with self.stage("spacy_parse"):
+            docs = self.pos_extractor.get_docs(texts)
+        with self.stage("pos_selection"):
+            nouns = [self.pos_extractor.get_nouns(doc=doc) for doc in docs]
+            adjectives = [self.pos_extractor.get_adjectives(doc=doc) for doc in docs]
+        weights = self.get_adjective_noun_weights(docs, nouns=nouns, adjectives=adjectives)
+
+        with self.stage("argmax_mapping"):
+            return [
+                self.map_adjectives_to_nouns(nouns=text_nouns, adjectives=text_adjectives, noun_indices=noun_indices)
+                for text_nouns, text_adjectives, noun_indices in zip(nouns, adjectives, self.argmax_nouns(weights))
+            ]
+
+    def extract_with_attentions(self, text: str) -> tuple[ExtractedObjectsDict, dict[str, dict[str, float]]]:
+        """
+        Extracts objects and attention of each adjective to each noun with a single forward pass
+        """
         doc = self.pos_extractor.get_doc(text)
         nouns = self.pos_extractor.get_nouns(doc=doc)
         adjectives = self.pos_extractor.get_adjectives(doc=doc)
+        (adj_noun_weights,) = self.get_adjective_noun_weights([doc], nouns=[nouns], adjectives=[adjectives])
 
-        tokenized_text = self.tokenizer(text, return_tensors="pt")
-        with torch.inference_mode():
-            attentions = self._get_attentions_mapping[self.config.process_attentions](
-                self.model(**tokenized_text).attentions
-            )
-        avg_attention_weights = self._preprocess_attentions_mapping[self.config.process_attentions](attentions)
-        for adj in adjectives:
-            for noun in nouns:
-                result[adj.text][noun.text] = avg_attention_weights[adj.index, noun.index].item()
+        adjectives_attentions: dict[str, dict[str, float]] = defaultdict(dict[str, float])
+        for adj, adj_weights in zip(adjectives, adj_noun_weights.tolist()):
+            for noun, weight in zip(nouns, adj_weights):
+                # nouns of other chunks are out of reach
+                if weight != -math.inf:
+                    adjectives_attentions[adj.text][noun.text] = weight
 
-        return dict(result)
+        (noun_indices,) = self.argmax_nouns([adj_noun_weights])
+        objects = self.map_adjectives_to_nouns(nouns=nouns, adjectives=adjectives, noun_indices=noun_indices)
+        return objects, dict(adjectives_attentions)
+
+    def get_adjectives_attentions(self, text: str) -> dict[str, dict[str, float]]:
+        return self.extract_with_attentions(text)[1]
 
 
 if __name__ == "__main__":
@@ -114,7 +363,7 @@ if __name__ == "__main__":
 
     extractor = BertExtractor(BertExtractorSettings.from_yaml(CONFIGS_DIR / "bert_extractor_settings.yaml"))
     text = "beautiful furry rabbit in fresh snow"
-    result = extractor.extract(text)
+    result, attentions = extractor.extract_with_attentions(text)
 
     print(result)
-    attentions = extractor.get_adjectives_attentions(text)
+    print(attentions)
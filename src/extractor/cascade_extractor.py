@@ -0,0 +1,171 @@
+from typing import Sequence
+
+import torch
+from spacy.tokens import Doc
+
+from src.core.executor import run_in_cpu_executor
+from src.core.instrumentation import CASCADE_TIER_TEXTS
+from src.core.models import (
+    CascadeTier,
+    ExtractedObjectsDict,
+    LanguageDependency,
+    PartOfSpeech,
+)
+from src.core.settings import CascadeExtractorSettings
+from src.extractor.base import BaseObjectsExtractor
+from src.extractor.bert_extractor import BertExtractor
+from src.extractor.llm_extractor import LLMExtractor
+from src.extractor.pos_extractor import PosExtractor, Token
+
+NOUN_POS = {PartOfSpeech.noun, PartOfSpeech.proper_noun}
+
+
+class CascadeExtractor(BaseObjectsExtractor):
+    """
+    Extracts objects with PosExtractor and escalates only ambiguous texts: texts with POS confidence below
+    bert_threshold go to BERT, which reuses spaCy parse of the first tier, and, when LLM is enabled,
+    texts where BERT attention doesn't clearly prefer one noun for some adjective go to LLM
+    """
+
+    def __init__(
+        self,
+        config: CascadeExtractorSettings,
+        pos_extractor: PosExtractor,
+        bert_extractor: BertExtractor,
+        llm_extractor: LLMExtractor | None = None,
+    ):
+        self.config = config
+        self.pos_extractor = pos_extractor
+        self.bert_extractor = bert_extractor
+        self.llm_extractor = llm_extractor if config.llm_enabled else None
+
+    def fingerprint(self) -> str:
+        fingerprint = (
+            f"{type(self).__name__}:{self.config.model_dump_json()}:"
+            f"{self.pos_extractor.fingerprint()}:{self.bert_extractor.fingerprint()}"
+        )
+        if self.llm_extractor is not None:
+            fingerprint += f":{self.llm_extractor.fingerprint()}"
+        return fingerprint
+
+    @property
+    def uses_torch(self) -> bool:
+        return True
+
+    def warm_up(self, text: str) -> None:
+        self.pos_extractor.warm_up(text)
+        self.bert_extractor.warm_up(text)
+
+    @staticmethod
+    def score_pos_confidence(doc: Doc, nouns: list[Token], adjectives: list[Token]) -> float:
+        """
+        :return: float - share of adjectives whose nearest noun, picked by PosExtractor, is unique and
+            is their amod head in dependency parse, 1.0 if there is nothing to map
+        """
+        if not adjectives or not nouns:
+            return 1.0
+
+        n_confident = 0
+        for adjective in adjectives:
+            distances = sorted(abs(adjective.index - noun.index) for noun in nouns)
+            token = doc[adjective.index]
+            n_confident += (
+                (len(distances) == 1 or distances[0] < distances[1])
+                and token.dep_ == LanguageDependency.adjectival_modifier
+                and token.head.pos_ in NOUN_POS
+                and abs(token.head.i - adjective.index) == distances[0]
+            )
+        return n_confident / len(adjectives)
+
+    @staticmethod
+    def score_attention_margin(adj_noun_weights: torch.Tensor) -> float:
+        """
+        :return: float - the smallest relative margin between the best and the second best noun over adjectives,
+            1.0 if every adjective has a single candidate. Nouns weighted -inf (other chunk) aren't candidates
+        """
+        if adj_noun_weights.shape[0] == 0 or adj_noun_weights.shape[1] < 2:
+            return 1.0
+        top = adj_noun_weights.topk(2, dim=1).values
+        top = top[top[:, 0] > -torch.inf]
+        if top.shape[0] == 0:
+            return 1.0
+        margins = (top[:, 0] - top[:, 1]) / top[:, 0].clamp(min=torch.finfo(top.dtype).tiny)
+        return margins.clamp(max=1.0).min().item()
+
+    def extract_locally(self, texts: Sequence[str]) -> tuple[list[ExtractedObjectsDict], list[CascadeTier]]:
+        """
+        Runs POS and BERT tiers
+        :return: tuple[list[ExtractedObjectsDict], list[CascadeTier]] - results and tier to resolve each text,
+            texts with CascadeTier.llm still have BERT results
+        """
+        with self.stage("spacy_parse"):
+            docs = self.pos_extractor.get_docs(texts)
+        with self.stage("pos_mapping"):
+            results = [self.pos_extractor.extract_from_doc(doc) for doc in docs]
+            nouns = [self.pos_extractor.get_nouns(doc=doc) for doc in docs]
+            adjectives = [self.pos_extractor.get_adjectives(doc=doc) for doc in docs]
+        with self.stage("pos_confidence"):
+            tiers = [
+                (
+                    CascadeTier.bert
+                    if self.score_pos_confidence(*doc_tokens) < self.config.bert_threshold
+                    else CascadeTier.pos
+                )
+                for doc_tokens in zip(docs, nouns, adjectives)
+            ]
+
+        escalated = [i for i, tier in enumerate(tiers) if tier == CascadeTier.bert]
+        if not escalated:
+            return results, tiers
+
+        weights = self.bert_extractor.get_adjective_noun_weights(
+            [docs[i] for i in escalated],
+            nouns=[nouns[i] for i in escalated],
+            adjectives=[adjectives[i] for i in escalated],
+        )
+        with self.stage("bert_mapping"):
+            for i, doc_weights, noun_indices in zip(escalated, weights, self.bert_extractor.argmax_nouns(weights)):
+                results[i] = self.bert_extractor.map_adjectives_to_nouns(nouns[i], adjectives[i], noun_indices)
+                if (
+                    self.llm_extractor is not None
+                    and self.score_attention_margin(doc_weights) < self.config.llm_threshold
+                ):
+                    tiers[i] = CascadeTier.llm
+        return results, tiers
+
+    @staticmethod
+    def count_tiers(tiers: Sequence[CascadeTier]) -> None:
+        for tier in CascadeTier:
+            if n_texts := sum(text_tier == tier for text_tier in tiers):
+                CASCADE_TIER_TEXTS.inc(n_texts, tier=tier)
+
+    def extract(self, text: str) -> ExtractedObjectsDict:
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        results, tiers = self.extract_locally(texts)
+        escalated = [i for i, tier in enumerate(tiers) if tier == CascadeTier.llm]
+        if escalated and self.llm_extractor is not None:
+            for i, result in zip(escalated, self.llm_extractor.extract_batch([texts[i] for i in escalated])):
+                results[i] = result
+        self.count_tiers(tiers)
+        return results
+
+    async def aextract(self, text: str) -> ExtractedObjectsDict:
+        return (await self.aextract_batch([text]))[0]
+
+    async def aextract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        """
+        Runs local tiers in CPU executor and awaits LLM requests on the event loop
+        """
+        results, tiers = await run_in_cpu_executor(self.extract_locally, texts)
+        escalated = [i for i, tier in enumerate(tiers) if tier == CascadeTier.llm]
+        if escalated and self.llm_extractor is not None:
+            for i, result in zip(escalated, await self.llm_extractor.aextract_batch([texts[i] for i in escalated])):
+                results[i] = result
+        self.count_tiers(tiers)
+        return results
+
+    async def aclose(self) -> None:
+        if self.llm_extractor is not None:
+            await self.llm_extractor.aclose()
@@ -3,7 +3,11 @@ import json
 import requests
 from loguru import logger
 
-from src.core.models import ExtractedObjectsDict, ExtractObjectsResponseDict
+from src.core.models import (
+    ExtractedObjectsDict,
+    ExtractObjectsBatchResponseDict,
+    ExtractObjectsResponseDict,
+)
 from src.core.settings import ExtractorClientSettings
 
 on_exception_return_value: ExtractedObjectsDict = {"objects": {}}
@@ -22,3 +26,13 @@ class ExtractorClient:
         except (requests.RequestException, json.JSONDecodeError) as e:
             logger.warning(e)
             return on_exception_return_value
+
+    def extract_objects_batch(self, texts: list[str]) -> list[ExtractedObjectsDict]:
+        try:
+            response_dict: ExtractObjectsBatchResponseDict = requests.post(
+                self.config.extract_objects_batch_endpoint, json=texts
+            ).json()
+            return [response["result"] for response in response_dict["results"]]
+        except (requests.RequestException, json.JSONDecodeError, KeyError) as e:
+            logger.warning(e)
+            return [on_exception_return_value for _ in texts]
@@ -1,51 +1,99 @@
 import asyncio
 import json
-import random
-from itertools import batched
+from functools import cached_property
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import Any, AsyncIterator, Iterable, Sequence
 
-import aiohttp
-import requests
 from loguru import logger
 
+from src.cache import ResultCache
 from src.core.models import ExtractedObjectsDict, LLMResponseJSON
-from src.core.settings import AppSettings, LLMExtractorSettings
-from src.extractor.base import BaseObjectsExtractor
+from src.core.settings import LLMExtractorSettings
+from src.core.text import preprocess_text
+from src.extractor.base import BaseObjectsExtractor, ExtractionError
+from src.extractor.llm_packing import TokenCounter, pack_texts
+from src.extractor.llm_streaming import IncrementalObjectsParser
+from src.extractor.llm_transport import OpenAITransport
 
 configs_dir = Path(__file__).parent.parent.parent / "configs"
 
-app_settings = AppSettings()
+LABELS_SCOPE = "llm_labels"
+LABELS_MEMORY_SIZE = 1024
 
 
 class LLMExtractor(BaseObjectsExtractor):
     def __init__(self, config: LLMExtractorSettings):
         self.config = config
-        self.__api_token = config.openai_key.get_secret_value()
+        self.transport = OpenAITransport(config, api_token=config.openai_key.get_secret_value())
 
         self.successful_batches_count = 0
+        self.retried_texts_count = 0
         self.parsed: dict[str, ExtractedObjectsDict] = {}
 
+    def fingerprint(self) -> str:
+        settings = self.config.model_dump_json(
+            include={"prompt_task", "prompt_example", "prompt_input", "model", "openai_url", "openai_handler"}
+        )
+        return f"{type(self).__name__}:{settings}"
+
+    def warm_up(self, text: str) -> None:
+        """
+        Nothing to warm up locally, and a request to the API would be billed
+        """
+
     def extract(self, text: str) -> ExtractedObjectsDict:
-        response_json = self.get_response(input_text=text)
-        objects = self.parse_response(response_json=response_json)
+        with self.stage("llm_request"):
+            response_json = self.get_response(input_text=text)
+        with self.stage("parse_response"):
+            objects = self.parse_response(response_json=response_json)
         return objects
 
-    def get_response(self, input_text: str) -> LLMResponseJSON:
-        headers = {"Authorization": f"Bearer {self.__api_token}", "Content-Type": "application/json"}
-        body = {
+    async def aextract(self, text: str) -> ExtractedObjectsDict:
+        with self.stage("llm_request"):
+            response_json = await self.get_single_async_response(input_text=text)
+        with self.stage("parse_response"):
+            return self.parse_response(response_json=response_json)
+
+    async def aextract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        return list(await asyncio.gather(*(self.aextract(text) for text in texts)))
+
+    async def astream_objects(self, text: str) -> AsyncIterator[tuple[str, list[str]]]:
+        """
+        Streams completion and yields each object once its descriptions are generated. Objects the incremental
+        parser couldn't pick up are yielded from complete response at the end
+        :raises ExtractionError: stream failed or complete response can't be parsed
+        """
+        parser = IncrementalObjectsParser()
+        emitted: set[str] = set()
+        async for delta in self.transport.stream(self.make_request_body(text)):
+            for name, descriptions in parser.feed(delta):
+                emitted.add(name)
+                yield name, descriptions
+
+        for name, descriptions in self.parse_content(parser.content)["objects"].items():
+            if name not in emitted:
+                yield name, descriptions
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def make_request_body(self, input_text: str) -> dict[str, Any]:
+        return {
             "model": self.config.model,
             "messages": [{"role": "user", "content": self.config.make_prompt(input_text=input_text)}],
         }
-        try:
-            response = requests.post(self.config.openai_endpoint, headers=headers, json=body).json()
-            return response
-        except Exception as e:
-            logger.warning(f"Exception raised when requesting OpenAI API: {e}")
-            return {"choices": []}
+
+    def get_response(self, input_text: str) -> LLMResponseJSON:
+        return self.transport.post_sync(self.make_request_body(input_text))
+
+    async def get_single_async_response(self, input_text: str) -> LLMResponseJSON:
+        return await self.transport.post(self.make_request_body(input_text))
 
     @staticmethod
     def parse_response(response_json: LLMResponseJSON) -> ExtractedObjectsDict:
+        """
+        :raises ExtractionError: request failed or response has no content
+        """
         if (
             (choices := response_json.get("choices"))
             and (choice := choices[0])
@@ -54,95 +102,209 @@ class LLMExtractor(BaseObjectsExtractor):
         ):
             return json.loads(content)
 
-        logger.warning(f"Could not parse response: {response_json}")
-        return {"objects": {}}
+        raise ExtractionError(f"LLM request failed or returned no content: {response_json}")
 
-    async def parse_and_save_response(
-        self, response_jsons: Iterable[LLMResponseJSON], save_path: str | Path = ""
-    ) -> None:
-        parsed = self.parse_multi_text_response(response_jsons=response_jsons)
-        if save_path:
-            for text, label in parsed.items():
-                async with asyncio.Lock():
-                    with open(save_path, "a") as f:
-                        f.write(f"\n{text}~{json.dumps(label)}")
+    @staticmethod
+    def parse_content(content: str) -> ExtractedObjectsDict:
+        """
+        Parses complete streamed content
+        :raises ExtractionError: content isn't {"objects": {...}} JSON
+        """
+        start, end = content.find("{"), content.rfind("}")
+        try:
+            objects: ExtractedObjectsDict = json.loads(content[start : end + 1])
+        except json.JSONDecodeError:
+            raise ExtractionError(f"Could not parse streamed content: {content!r}")
+        if not isinstance(objects.get("objects"), dict):  # pyright: ignore
+            raise ExtractionError(f"Streamed content has no objects: {content!r}")
+        return objects
 
-    def parse_multi_text_response(self, response_jsons: Iterable[LLMResponseJSON]) -> dict[str, ExtractedObjectsDict]:
-        self.parsed: dict[str, ExtractedObjectsDict] = {}
-        for response_json in response_jsons:
-            if (
-                (choices := response_json.get("choices"))
-                and (choice := choices[0])
-                and (message := choice["message"])
-                and (content := message["content"])
-            ):
-                try:
-                    parsed_batch = json.loads(content.replace("'", "'"))
-                    self.parsed.update(parsed_batch)
-                except Exception as e:
-                    logger.warning(f"couldn't parse: {content=}\n{e}")
-            else:
-                logger.warning(f"response could not be parsed: {response_json}")
-
-        return self.parsed
+    def labels_fingerprint(self) -> str:
+        settings = self.config.model_dump_json(
+            include={"prompt_task", "multi_text_prompt_example", "multi_text_input", "model"}
+        )
+        return f"{type(self).__name__}:multi_text:{settings}"
 
-    async def get_async_response(
-        self,
-        input_texts: Sequence[str],
-        session: aiohttp.ClientSession | None = None,
-        save: bool = False,
-        save_path: str | Path = "",
-    ) -> LLMResponseJSON:
-        if session is None:
-            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True))
+    @cached_property
+    def labels_store(self) -> ResultCache | None:
+        """
+        Persistent labels of multi text requests, keyed by model, hash of prompt templates and normalised text.
+        Labels of other models or prompts are kept, switching back to them costs nothing
+        """
+        if self.config.labels_store_path is None:
+            return None
+        return ResultCache(
+            scope=LABELS_SCOPE,
+            fingerprint=self.labels_fingerprint(),
+            max_size=LABELS_MEMORY_SIZE,
+            db_path=self.config.labels_store_path,
+            purge_stale=False,
+        )
+
+    @cached_property
+    def token_counter(self) -> TokenCounter:
+        return TokenCounter(self.config.model)
+
+    def pack_texts(self, texts: Sequence[str]) -> list[list[str]]:
+        batches = pack_texts(
+            [self.token_counter.count(text) for text in texts],
+            prompt_tokens=self.token_counter.count(self.config.make_multi_texts_prompt(input_texts=[])),
+            max_input_tokens=self.config.multi_request_max_input_tokens,
+            max_output_tokens=self.config.multi_request_max_output_tokens,
+            label_tokens=self.config.multi_request_label_tokens,
+            max_texts=self.config.multi_request_batch_size,
+        )
+        return [[texts[position] for position in batch] for batch in batches]
 
-        retries = 0
-        headers = {"Authorization": f"Bearer {self.__api_token}", "Content-Type": "application/json"}
-        body = {
+    @staticmethod
+    def parse_multi_text_response(response_json: LLMResponseJSON, n_texts: int) -> dict[int, ExtractedObjectsDict]:
+        """
+        Parses labels keyed by 1-based position of text in prompt, so texts altered by the model are not lost
+        :return: dict[int, ExtractedObjectsDict] - valid labels by 0-based position, empty for malformed response
+        """
+        if not (
+            (choices := response_json.get("choices"))
+            and (choice := choices[0])
+            and (message := choice["message"])
+            and (content := message["content"])
+        ):
+            logger.warning(f"response could not be parsed: {response_json}")
+            return {}
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.warning(f"couldn't parse: {content=}\n{e}")
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+
+        labels: dict[int, ExtractedObjectsDict] = {}
+        for key, label in parsed.items():  # pyright: ignore
+            if str(key).isdigit() and 0 < int(key) <= n_texts and isinstance(label, dict) and "objects" in label:
+                labels[int(key) - 1] = label  # pyright: ignore
+        return labels
+
+    async def request_labels(self, input_texts: Sequence[str]) -> dict[int, ExtractedObjectsDict]:
+        """
+        Requests labels of texts, retrying only what failed: malformed response splits batch in half,
+        partially labelled batch retries unlabelled texts. Failed request is not retried, transport already did
+        :return: dict[int, ExtractedObjectsDict] - labels by position in input_texts
+        """
+        response_json = await self.transport.post(self.make_multi_texts_body(input_texts))
+        if not response_json["choices"]:
+            return {}
+        self.successful_batches_count += 1
+
+        labels = self.parse_multi_text_response(response_json, n_texts=len(input_texts))
+        missing = [position for position in range(len(input_texts)) if position not in labels]
+        if not missing or len(input_texts) == 1:
+            return labels
+
+        if len(missing) == len(input_texts):
+            parts = [missing[: len(missing) // 2], missing[len(missing) // 2 :]]
+        else:
+            parts = [missing]
+        logger.warning(f"Response has labels for {len(labels)} of {len(input_texts)} texts, retrying {len(missing)}")
+        self.retried_texts_count += len(missing)
+
+        parts_labels = await asyncio.gather(
+            *(self.request_labels([input_texts[position] for position in part]) for part in parts)
+        )
+        for part, part_labels in zip(parts, parts_labels):
+            labels.update({part[position]: label for position, label in part_labels.items()})
+        return labels
+
+    def make_multi_texts_body(self, input_texts: Sequence[str]) -> dict[str, Any]:
+        return {
             "model": self.config.model,
             "messages": [{"role": "user", "content": self.config.make_multi_texts_prompt(input_texts=input_texts)}],
         }
 
-        while retries < self.config.max_retries:
-            async with asyncio.Semaphore(1):
-                async with session.post(self.config.openai_endpoint, headers=headers, json=body) as response:
-                    if response.status != 200:
-                        logger.warning(f"OpenAI request failed: {await response.json()}")
-                        retries += 1
-                        await asyncio.sleep(random.randint(30, 120))
-                        continue
-                    response_json = await response.json()
-                    if save and save_path:
-                        await self.parse_and_save_response((response_json,), save_path=save_path)
-                    self.successful_batches_count += 1
+    def save_labels(self, labels: dict[str, ExtractedObjectsDict], save_path: str | Path = "") -> None:
+        """
+        :param labels: labels by original text, which is written to save_path as is
+        """
+        self.parsed.update({preprocess_text(text): label for text, label in labels.items()})
+        if self.labels_store is not None and labels:
+            self.labels_store.set_many(list(labels.keys()), list(labels.values()))
+        if save_path and labels:
+            # single write per batch, so lines of concurrent batches can't interleave
+            lines = "".join(f"\n{text}~{json.dumps(label)}" for text, label in labels.items())
+            with open(save_path, "a") as f:
+                f.write(lines)
 
-                    return response_json
+    def get_unlabelled_texts(self, texts: Iterable[str]) -> list[str]:
+        """
+        :return: list[str] - unique texts, up to normalisation, without label in labels store
+        """
+        unique: dict[str, str] = {}
+        for text in texts:
+            unique.setdefault(preprocess_text(text), text)
+        if self.labels_store is None:
+            return list(unique.values())
 
-        logger.warning("Max retries exceeded")
-        return {"choices": []}
+        unlabelled = [text for text in unique.values() if self.labels_store.get(text) is None]
+        logger.info(f"{len(unique) - len(unlabelled)} of {len(unique)} unique texts are already labelled")
+        return unlabelled
+
+    async def get_async_response(
+        self,
+        input_texts: Sequence[str],
+        save: bool = False,
+        save_path: str | Path = "",
+    ) -> dict[str, ExtractedObjectsDict]:
+        """
+        :return: dict[str, ExtractedObjectsDict] - labels by normalised text, unlabelled texts are left out
+        """
+        positional_labels = await self.request_labels(input_texts)
+        original_labels = {input_texts[position]: label for position, label in positional_labels.items()}
+        self.save_labels(original_labels, save_path=save_path if save else "")
+        return {preprocess_text(text): label for text, label in original_labels.items()}
 
     async def get_multiple_extraction_responses(
         self, texts: Iterable[str], save: bool = False, save_path: str | Path = ""
-    ) -> list[LLMResponseJSON]:
+    ) -> dict[str, ExtractedObjectsDict]:
+        """
+        Sends only unique texts without stored label, packed into batches by token budget. Labels of each batch
+        are stored as soon as it completes, so interrupted run resumes with missing texts only
+        :return: dict[str, ExtractedObjectsDict] - labels of sent texts by normalised text
+        """
         self.successful_batches_count = 0
-        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True))
+        self.retried_texts_count = 0
+        self.parsed = {}
 
-        batches = list(batched(texts, self.config.multi_request_batch_size))
+        batches = self.pack_texts(self.get_unlabelled_texts(texts))
+        logger.info(f"Packed texts into {len(batches)} batches")
         tasks = [
-            asyncio.ensure_future(self.get_async_response(batch, session=session, save=save, save_path=save_path))
-            for batch in batches
+            asyncio.ensure_future(self.get_async_response(batch, save=save, save_path=save_path)) for batch in batches
         ]
-        results = await asyncio.gather(*tasks)
-        logger.debug(f"{len(results)=}")
-        return list(results)
+        labels: dict[str, ExtractedObjectsDict] = {}
+        for batch_labels in await asyncio.gather(*tasks):
+            labels.update(batch_labels)
+        return labels
+
+    async def _get_multiple_extraction_responses_and_close(
+        self, texts: Iterable[str], save: bool, save_path: str | Path
+    ) -> dict[str, ExtractedObjectsDict]:
+        try:
+            return await self.get_multiple_extraction_responses(texts, save=save, save_path=save_path)
+        finally:
+            await self.transport.aclose()
+
+    def get_stored_label(self, text: str) -> ExtractedObjectsDict | None:
+        return self.labels_store.get(text) if self.labels_store is not None else None
 
     def extract_multiple(
         self, texts: Iterable[str], save: bool = False, save_path: str | Path = ""
-    ) -> list[ExtractedObjectsDict]:
-        async_result = asyncio.run(self.get_multiple_extraction_responses(texts, save=save, save_path=save_path))
-        logger.debug(f"{len(async_result)=}")
-        parsed_responses = self.parse_multi_text_response(async_result)
-        return list(parsed_responses.values())
+    ) -> list[ExtractedObjectsDict | None]:
+        """
+        Labels of texts skipped as already labelled are read from labels store
+        :return: list[ExtractedObjectsDict | None] - labels in order of texts, None for texts left unlabelled
+        """
+        texts = list(texts)
+        labels = asyncio.run(self._get_multiple_extraction_responses_and_close(texts, save, save_path))
+        logger.debug(f"{len(labels)} texts labelled by this run")
+        return [labels.get(preprocess_text(text)) or self.get_stored_label(text) for text in texts]
 
 
 if __name__ == "__main__":
@@ -164,5 +326,5 @@ if __name__ == "__main__":
     extractor = LLMExtractor(extractor_settings)
 
     extracted = extractor.extract_multiple(texts=texts, save=True, save_path=save_path)  # pyright: ignore
-    logger.info(f"{extractor.successful_batches_count=}")
-    logger.info(f"{len(extracted)=}")
+    logger.info(f"{extractor.successful_batches_count=}, {extractor.retried_texts_count=}")
+    logger.info(f"{sum(label is not None for label in extracted)} of {len(extracted)} texts labelled")
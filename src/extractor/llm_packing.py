@@ -0,0 +1,78 @@
+import re
+from typing import Any, Sequence
+
+from loguru import logger
+
+# numbering, brackets and separator of each text in multi text prompt
+TEXT_OVERHEAD_TOKENS = 4
+word_piece_pattern = re.compile(r"\w{1,6}|[^\w\s]")
+
+
+def load_encoding(model: str) -> Any | None:
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken is not installed, estimating tokens, install it with `poetry install --with tiktoken`")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}, falling back to estimate: {e!r}")
+        return None
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken encoding of the model when tiktoken is installed, otherwise estimates them
+    locally: words are split into pieces of up to 6 characters and every punctuation mark is a token
+    """
+
+    def __init__(self, model: str):
+        self._encoding = load_encoding(model)
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(word_piece_pattern.findall(text))
+
+
+def pack_texts(
+    token_counts: Sequence[int],
+    prompt_tokens: int,
+    max_input_tokens: int,
+    max_output_tokens: int,
+    label_tokens: int,
+    max_texts: int,
+) -> list[list[int]]:
+    """
+    Greedily packs consecutive texts into batches fitting prompt and completion budgets, completion of each text
+    is estimated as its label overhead plus the text itself. Text exceeding budgets alone gets its own batch
+    :param token_counts: number of tokens of each text
+    :param prompt_tokens: tokens of prompt without texts
+    :return: list[list[int]] - positions of texts of each batch
+    """
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    input_tokens, output_tokens = prompt_tokens, 0
+    for position, n_tokens in enumerate(token_counts):
+        text_input_tokens = n_tokens + TEXT_OVERHEAD_TOKENS
+        text_output_tokens = n_tokens + label_tokens
+        if batch and (
+            len(batch) >= max_texts
+            or input_tokens + text_input_tokens > max_input_tokens
+            or output_tokens + text_output_tokens > max_output_tokens
+        ):
+            batches.append(batch)
+            batch, input_tokens, output_tokens = [], prompt_tokens, 0
+
+        batch.append(position)
+        input_tokens += text_input_tokens
+        output_tokens += text_output_tokens
+
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,61 @@
+import json
+import re
+
+objects_start_pattern = re.compile(r'"objects"\s*:\s*\{')
+separators_pattern = re.compile(r"[\s,]*")
+whitespace_pattern = re.compile(r"\s*")
+
+
+class IncrementalObjectsParser:
+    """
+    Parses {"objects": {...}} JSON while it is generated: object is emitted as soon as its list of descriptions
+    is closed. Whole content is kept, so complete response can be parsed as usual when stream ends
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.finished = False
+        self._position: int | None = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str) -> list[tuple[str, list[str]]]:
+        """
+        :return: list[tuple[str, list[str]]] - objects with descriptions completed by chunk
+        """
+        self.content += chunk
+        if self._position is None:
+            if (match := objects_start_pattern.search(self.content)) is None:
+                return []
+            self._position = match.end()
+
+        objects: list[tuple[str, list[str]]] = []
+        while not self.finished and (item := self._parse_member(self._position)) is not None:
+            objects.append(item)
+        return objects
+
+    def _parse_member(self, position: int) -> tuple[str, list[str]] | None:
+        """
+        Parses next "object": [descriptions] member of objects dict and moves past it
+        :return: tuple[str, list[str]] | None - None if member is incomplete yet or objects dict ended
+        """
+        position = separators_pattern.match(self.content, position).end()  # pyright: ignore
+        if position < len(self.content) and self.content[position] == "}":
+            self.finished = True
+            return None
+
+        try:
+            name, position = self._decoder.raw_decode(self.content, position)
+            position = whitespace_pattern.match(self.content, position).end()  # pyright: ignore
+            if self.content[position : position + 1] != ":":
+                return None
+            position = whitespace_pattern.match(self.content, position + 1).end()  # pyright: ignore
+            descriptions, position = self._decoder.raw_decode(self.content, position)
+        except json.JSONDecodeError:
+            return None
+
+        if not isinstance(name, str) or not isinstance(descriptions, list):
+            # not the expected structure, the rest is left to parsing of complete response
+            self.finished = True
+            return None
+        self._position = position
+        return name, [str(description) for description in descriptions]  # pyright: ignore
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Mapping
+
+import aiohttp
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from src.core.models import LLMResponseJSON, LLMStreamChunkJSON
+from src.core.settings import LLMExtractorSettings
+from src.extractor.base import ExtractionError
+
+RETRYABLE_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+CHARS_PER_TOKEN = 4
+
+
+def make_failed_response() -> LLMResponseJSON:
+    return {"choices": []}
+
+
+class TokenBucket:
+    """
+    Token bucket shared by threads and coroutines: holds up to capacity tokens, refilled continuously at
+    capacity per period_s. Consumption above the bucket content is allowed, it is paid back by waiting
+    """
+
+    def __init__(self, capacity: float, period_s: float = 60.0):
+        self.capacity = capacity
+        self.refill_rate = capacity / period_s
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """
+        Takes amount of tokens
+        :return: float - seconds to wait before taken tokens are available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_rate)
+            self._updated_at = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.refill_rate)
+
+    def adjust(self, amount: float) -> None:
+        """
+        Corrects previously taken amount, e.g. when actual number of used tokens is known
+        """
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        if (wait_s := self._reserve(amount)) > 0:
+            await asyncio.sleep(wait_s)
+
+    def acquire_sync(self, amount: float = 1.0) -> None:
+        if (wait_s := self._reserve(amount)) > 0:
+            time.sleep(wait_s)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    if (retry_after_ms := headers.get("retry-after-ms")) is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    if (retry_after := headers.get("retry-after")) is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_sse_data(line: bytes) -> str | None:
+    """
+    :return: str | None - payload of server-sent event data field, None for other lines
+    """
+    decoded = line.decode("utf-8", errors="replace").strip()
+    if not decoded.startswith("data:"):
+        return None
+    return decoded.removeprefix("data:").strip()
+
+
+class OpenAITransport:
+    """
+    Shared HTTP transport for OpenAI-compatible chat completions API: keep-alive connection pool,
+    global concurrency limit, requests/min and tokens/min rate limits, exponential backoff with jitter
+    honouring Retry-After, per-request timeouts. Both async and sync callers share the rate limits.
+    Streamed request takes concurrency slot until response headers arrive, open streams are limited separately
+    by max_open_streams, so slow stream consumers don't block other requests
+    """
+
+    def __init__(self, config: LLMExtractorSettings, api_token: str):
+        self.config = config
+        self._headers = {"Authorization": f"Bearer {api_token}", "Content-Type": "application/json"}
+
+        self.requests_bucket = TokenBucket(config.requests_per_minute)
+        self.tokens_bucket = TokenBucket(config.tokens_per_minute)
+
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._stream_semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self._sync_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.max_concurrency)
+        self._sync_session.mount("https://", adapter)
+        self._sync_session.mount("http://", adapter)
+        self._sync_semaphore = threading.BoundedSemaphore(config.max_concurrency)
+
+    def estimate_tokens(self, body: Mapping[str, Any]) -> int:
+        prompt_chars = sum(len(message["content"]) for message in body.get("messages", []))
+        return prompt_chars // CHARS_PER_TOKEN + self.config.expected_completion_tokens
+
+    def get_backoff_s(self, attempt: int, retry_after_s: float | None = None) -> float:
+        if retry_after_s is not None:
+            return retry_after_s
+        return random.uniform(0, min(self.config.backoff_max_s, self.config.backoff_base_s * 2**attempt))
+
+    def _settle_tokens(self, estimated_tokens: int, response_json: LLMResponseJSON | LLMStreamChunkJSON) -> None:
+        if (usage := response_json.get("usage")) is not None:
+            self.tokens_bucket.adjust(usage["total_tokens"] - estimated_tokens)
+
+    def _get_async_session(self) -> tuple[aiohttp.ClientSession, asyncio.Semaphore, asyncio.Semaphore]:
+        """
+        :return: tuple[aiohttp.ClientSession, asyncio.Semaphore, asyncio.Semaphore] - session, semaphore of
+            requests awaiting response and semaphore of open streams
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._loop is not loop
+            or self._semaphore is None
+            or self._stream_semaphore is None
+        ):
+            # open streams hold their connections, so pool has room for them on top of awaited requests
+            pool_size = self.config.max_concurrency + self.config.max_open_streams
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60),
+                headers=self._headers,
+                timeout=aiohttp.ClientTimeout(total=self.config.request_timeout_s),
+            )
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+            self._stream_semaphore = asyncio.Semaphore(self.config.max_open_streams)
+            self._loop = loop
+        return self._session, self._semaphore, self._stream_semaphore
+
+    async def post(self, body: Mapping[str, Any]) -> LLMResponseJSON:
+        session, semaphore, _ = self._get_async_session()
+        estimated_tokens = self.estimate_tokens(body)
+
+        for attempt in range(self.config.max_retries):
+            await self.requests_bucket.acquire()
+            await self.tokens_bucket.acquire(estimated_tokens)
+
+            retry_after_s: float | None = None
+            try:
+                async with semaphore, session.post(self.config.openai_endpoint, json=body) as response:
+                    if response.status == 200:
+                        response_json: LLMResponseJSON = await response.json()
+                        self._settle_tokens(estimated_tokens, response_json)
+                        return response_json
+
+                    logger.warning(f"OpenAI request failed with {response.status}: {await response.text()}")
+                    if response.status not in RETRYABLE_STATUSES:
+                        return make_failed_response()
+                    retry_after_s = parse_retry_after(response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Exception raised when requesting OpenAI API: {e!r}")
+
+            if attempt + 1 < self.config.max_retries:
+                await asyncio.sleep(self.get_backoff_s(attempt, retry_after_s))
+
+        logger.warning("Max retries exceeded")
+        return make_failed_response()
+
+    async def stream(self, body: Mapping[str, Any]) -> AsyncIterator[str]:
+        """
+        Posts request with streaming enabled and yields content deltas of server-sent events. Request is retried
+        like in post until the first delta arrives, a failure after that is raised, as it can't be retried
+        transparently. Concurrency slot is released once response headers arrive, stream is read under
+        max_open_streams limit
+        :raises ExtractionError: retries are exhausted, status isn't retryable or stream ended before [DONE]
+        """
+        session, semaphore, stream_semaphore = self._get_async_session()
+        body = {**body, "stream": True, "stream_options": {"include_usage": True}}
+        estimated_tokens = self.estimate_tokens(body)
+
+        for attempt in range(self.config.max_retries):
+            await self.requests_bucket.acquire()
+            await self.tokens_bucket.acquire(estimated_tokens)
+
+            retry_after_s: float | None = None
+            started = False
+            try:
+                async with stream_semaphore:
+                    async with semaphore:
+                        response = await session.post(self.config.openai_endpoint, json=body)
+                    async with response:
+                        if response.status == 200:
+                            async for delta in self._iter_deltas(response, estimated_tokens):
+                                started = True
+                                yield delta
+                            return
+
+                        logger.warning(f"OpenAI request failed with {response.status}: {await response.text()}")
+                        if response.status not in RETRYABLE_STATUSES:
+                            raise ExtractionError(f"OpenAI stream request failed with {response.status}")
+                        retry_after_s = parse_retry_after(response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if started:
+                    raise
+                logger.warning(f"Exception raised when requesting OpenAI API: {e!r}")
+
+            if attempt + 1 < self.config.max_retries:
+                await asyncio.sleep(self.get_backoff_s(attempt, retry_after_s))
+
+        raise ExtractionError(f"OpenAI stream request failed {self.config.max_retries} times, max retries exceeded")
+
+    async def _iter_deltas(self, response: aiohttp.ClientResponse, estimated_tokens: int) -> AsyncIterator[str]:
+        async for line in response.content:
+            if (data := parse_sse_data(line)) is None or not data:
+                continue
+            if data == "[DONE]":
+                return
+            chunk: LLMStreamChunkJSON = json.loads(data)
+            self._settle_tokens(estimated_tokens, chunk)
+            for choice in chunk.get("choices") or []:
+                if content := (choice.get("delta") or {}).get("content"):
+                    yield content
+        raise ExtractionError("OpenAI stream ended before [DONE]")
+
+    def post_sync(self, body: Mapping[str, Any]) -> LLMResponseJSON:
+        estimated_tokens = self.estimate_tokens(body)
+
+        for attempt in range(self.config.max_retries):
+            self.requests_bucket.acquire_sync()
+            self.tokens_bucket.acquire_sync(estimated_tokens)
+
+            retry_after_s: float | None = None
+            try:
+                with self._sync_semaphore:
+                    response = self._sync_session.post(
+                        self.config.openai_endpoint,
+                        headers=self._headers,
+                        json=body,
+                        timeout=self.config.request_timeout_s,
+                    )
+                if response.status_code == 200:
+                    response_json: LLMResponseJSON = response.json()
+                    self._settle_tokens(estimated_tokens, response_json)
+                    return response_json
+
+                logger.warning(f"OpenAI request failed with {response.status_code}: {response.text}")
+                if response.status_code not in RETRYABLE_STATUSES:
+                    return make_failed_response()
+                retry_after_s = parse_retry_after({k.lower(): v for k, v in response.headers.items()})
+            except requests.RequestException as e:
+                logger.warning(f"Exception raised when requesting OpenAI API: {e!r}")
+
+            if attempt + 1 < self.config.max_retries:
+                time.sleep(self.get_backoff_s(attempt, retry_after_s))
+
+        logger.warning("Max retries exceeded")
+        return make_failed_response()
+
+    async def aclose(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._semaphore = None
+        self._stream_semaphore = None
+        self._loop = None
+
+    def close(self) -> None:
+        self._sync_session.close()
@@ -1,14 +1,18 @@
-import re
 from collections import defaultdict
 from dataclasses import dataclass
+from functools import cache
+from typing import Iterable, Sequence
 
 import spacy
+from spacy.language import Language
 from spacy.tokens import Doc
 
 from src.core.models import ExtractedObjectsDict, LanguageDependency, PartOfSpeech
+from src.core.text import preprocess_text
 from src.extractor.base import BaseObjectsExtractor
 
-multiple_spaces_pattern = re.compile(r"\s{2,}")
+SPACY_MODEL_NAME = "en_core_web_sm"
+SPACY_PIPE_BATCH_SIZE = 256
 
 
 @dataclass(frozen=True, slots=True)
@@ -17,44 +21,70 @@ class Token:
     text: str
 
 
-def preprocess_text(text: str) -> str:
-    return re.sub(multiple_spaces_pattern, " ", text).lower().strip()
+@cache
+def load_spacy_pipeline(model_name: str = SPACY_MODEL_NAME) -> Language:
+    """
+    Loads spaCy pipeline once per process, so every extractor shares the same instance
+    :param model_name: name of installed spaCy pipeline
+    :return: Language - loaded pipeline
+    """
+    return spacy.load(model_name)
 
 
 class PosExtractor(BaseObjectsExtractor):
-    def __init__(self):
-        self.nlp = spacy.load("en_core_web_sm")
+    def __init__(self, nlp: Language | None = None):
+        self.nlp = nlp if nlp is not None else load_spacy_pipeline()
+
+    def fingerprint(self) -> str:
+        meta = self.nlp.meta
+        return f"{type(self).__name__}:{meta.get('lang')}_{meta.get('name')}:{meta.get('version')}"
 
     def get_doc(self, text: str) -> Doc:
         return self.nlp(preprocess_text(text))
 
+    def get_docs(self, texts: Iterable[str], batch_size: int = SPACY_PIPE_BATCH_SIZE) -> list[Doc]:
+        return list(self.nlp.pipe((preprocess_text(text) for text in texts), batch_size=batch_size))
+
     def get_nouns(self, text: str | None = None, doc: Doc | None = None) -> list[Token]:
-        if not text and not doc:
-            raise ValueError("text or doc must be passed")
-        if not doc and text:
+        if doc is None:
+            if text is None:
+                raise ValueError("text or doc must be passed")
+            # empty Doc is falsy, so empty text gives empty doc instead of error
             doc = self.get_doc(text)
 
         return [
             Token(index=index, text=token.text)
-            for index, token in enumerate(doc)  # pyright: ignore
+            for index, token in enumerate(doc)
             if token.pos_ in {PartOfSpeech.noun, PartOfSpeech.proper_noun}
         ]
 
     def get_adjectives(self, text: str | None = None, doc: Doc | None = None) -> list[Token]:
-        if not text and not doc:
-            raise ValueError("text or doc must be passed")
-        if not doc and text:
+        if doc is None:
+            if text is None:
+                raise ValueError("text or doc must be passed")
+            # empty Doc is falsy, so empty text gives empty doc instead of error
             doc = self.get_doc(text)
 
         return [
             Token(index=index, text=token.text)
-            for index, token in enumerate(doc)  # pyright: ignore
+            for index, token in enumerate(doc)
             if token.pos_ == PartOfSpeech.adjective
         ]
 
     def extract(self, text: str) -> ExtractedObjectsDict:
+        with self.stage("spacy_parse"):
+            doc = self.get_doc(text)
+        with self.stage("pos_mapping"):
+            return self.extract_from_doc(doc)
+
+    def extract_batch(self, texts: Sequence[str]) -> list[ExtractedObjectsDict]:
+        with self.stage("spacy_parse"):
+            docs = self.get_docs(texts)
+        with self.stage("pos_mapping"):
+            return [self.extract_from_doc(doc) for doc in docs]
+
+    def extract_from_doc(self, doc: Doc) -> ExtractedObjectsDict:
         objects: dict[str, list[str]] = defaultdict(list)
-        doc = self.get_doc(text)
         nouns = self.get_nouns(doc=doc)
         if not nouns:
             return {"objects": {}}
@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Callable, Iterable
+
+from loguru import logger
+
+from src.core.memory import get_rss_bytes
+from src.core.models import ExtractorLoadStats
+from src.core.settings import ExtractorType
+from src.extractor.base import BaseObjectsExtractor
+
+ExtractorFactory = Callable[[], BaseObjectsExtractor]
+
+
+class ExtractorRegistry:
+    """
+    Process-wide storage of extractors: each extractor is built once, either eagerly
+    on application startup via warm_up or lazily on first get
+    """
+
+    def __init__(self, factories: dict[ExtractorType, ExtractorFactory]):
+        self._factories = factories
+        self._extractors: dict[ExtractorType, BaseObjectsExtractor] = {}
+        self._stats: dict[ExtractorType, ExtractorLoadStats] = {}
+        self._lock = threading.RLock()
+
+    def get(self, extractor_type: ExtractorType) -> BaseObjectsExtractor:
+        if (extractor := self._extractors.get(extractor_type)) is not None:
+            return extractor
+
+        with self._lock:
+            if (extractor := self._extractors.get(extractor_type)) is None:
+                extractor = self._build(extractor_type)
+        return extractor
+
+    def warm_up(self, extractor_types: Iterable[ExtractorType]) -> None:
+        for extractor_type in extractor_types:
+            self.get(extractor_type)
+
+    def is_loaded(self, extractor_type: ExtractorType) -> bool:
+        return extractor_type in self._extractors
+
+    @property
+    def stats(self) -> list[ExtractorLoadStats]:
+        return list(self._stats.values())
+
+    async def aclose(self) -> None:
+        for extractor in list(self._extractors.values()):
+            await extractor.aclose()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._extractors.clear()
+            self._stats.clear()
+
+    def _build(self, extractor_type: ExtractorType) -> BaseObjectsExtractor:
+        if extractor_type not in self._factories:
+            raise KeyError(f"No factory registered for {extractor_type}")
+
+        rss_before = get_rss_bytes()
+        start = time.perf_counter()
+        extractor = self._factories[extractor_type]()
+        stats = ExtractorLoadStats(
+            extractor_type=extractor_type,
+            load_time_s=time.perf_counter() - start,
+            rss_delta_bytes=get_rss_bytes() - rss_before,
+        )
+
+        self._extractors[extractor_type] = extractor
+        self._stats[extractor_type] = stats
+        logger.info(f"Loaded {extractor_type}: {stats.load_time_s:.2f}s, {stats.rss_delta_bytes / 2**20:.1f} MiB")
+        return extractor
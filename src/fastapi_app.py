@@ -1,27 +1,79 @@
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
 
-from src.dependencies.extractors import get_bert_extractor
+from src.core.executor import configure_cpu_executor, shutdown_cpu_executor
+from src.core.models import StartupReport
+from src.dependencies.batching import stop_batchers
+from src.dependencies.cache import stop_result_caches
+from src.dependencies.extractors import extractor_registry
+from src.dependencies.profiling import start_request_profiler, stop_request_profiler
+from src.dependencies.settings import get_app_settings
+from src.dependencies.startup import get_startup_report, start_warm_up, stop_warm_up
+from src.endpoints.admin import router as admin_router
+from src.endpoints.extract_incremental import router as extract_incremental_router
 from src.endpoints.extract_objects import router
+from src.endpoints.extract_stream import router as extract_stream_router
+from src.endpoints.extractors import router as extractors_router
+from src.endpoints.metrics import router as metrics_router
+from src.extractor.base import ExtractionError
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    get_bert_extractor()
+    app_settings = get_app_settings()
+    configure_cpu_executor(app_settings.cpu_executor_workers)
+    start_request_profiler(app_settings)
+    start_warm_up(app_settings)
     yield
+    await stop_warm_up()
+    stop_request_profiler()
+    stop_result_caches()
+    await stop_batchers()
+    await extractor_registry.aclose()
+    extractor_registry.clear()
+    shutdown_cpu_executor()
 
 
 app = FastAPI(title="model_explorer_api", lifespan=lifespan)
 
 
+@app.exception_handler(ExtractionError)
+async def extraction_error_handler(request: Request, exc: ExtractionError) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content={"detail": str(exc)})
+
+
 @app.get("/health", tags=["health"])
-async def health_check():
+async def health_check(response: Response):
+    """
+    Responds 503 once warm-up has failed, so liveness probe restarts the container instead of leaving it unready
+    """
+    report = get_startup_report()
+    if report is not None and report.error is not None:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "error", "error": report.error}
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["health"])
+async def readiness_check(response: Response) -> StartupReport | None:
+    """
+    Responds 503 until the selected extractor is loaded and warmed up
+    """
+    report = get_startup_report()
+    if report is None or not report.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
+
+
 app.include_router(router)
+app.include_router(extract_stream_router)
+app.include_router(extract_incremental_router)
+app.include_router(extractors_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 
 if __name__ == "__main__":
     uvicorn.run(app, reload=True)  # pyright: ignore [reportUnknownMemberType]
@@ -1,3 +1,4 @@
+from src.metrics.engine import EvaluationResult, evaluate_extractor, evaluate_objects
 from src.metrics.rouge_like import mean_rouge_like_metric, rouge_like_metric
 
-__all__ = ["rouge_like_metric", "mean_rouge_like_metric"]
+__all__ = ["rouge_like_metric", "mean_rouge_like_metric", "evaluate_objects", "evaluate_extractor", "EvaluationResult"]
@@ -0,0 +1,327 @@
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from itertools import batched
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Sequence
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from loguru import logger
+
+from src.cache import ResultCache
+from src.core.models import EvaluationReport, ExtractedObjectsDict
+from src.core.settings import ROOT_DIR, ExtractorType
+from src.extractor.base import BaseObjectsExtractor
+
+DATA_DIR = ROOT_DIR / "data"
+PREDICTIONS_CACHE_PATH = DATA_DIR / "cache" / "eval_predictions.sqlite3"
+
+IntArray = npt.NDArray[np.int64]
+FloatArray = npt.NDArray[np.float64]
+Objects = Mapping[str, Sequence[str]]
+
+
+def unwrap_objects(objects: Objects | ExtractedObjectsDict) -> Objects:
+    """
+    Accepts both extractor output ({"objects": {noun: [adjectives]}}) and bare {noun: [adjectives]}
+    """
+    inner = objects.get("objects")
+    return inner if isinstance(inner, dict) else objects  # pyright: ignore
+
+
+@dataclass(frozen=True, slots=True)
+class PairTable:
+    """
+    (example, noun-adjective pair) rows of a corpus column
+    """
+
+    example_idx: IntArray
+    pair_id: IntArray
+    n_examples: int
+
+    def keys(self, n_pairs: int) -> IntArray:
+        """
+        Unique sorted int64 keys of rows, example index is key // n_pairs
+        """
+        # sort and drop repeats: np.unique of numpy 2 hashes keys first, which is several times slower here
+        keys = np.sort(self.example_idx * n_pairs + self.pair_id)
+        return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+
+class PairVocabulary:
+    """
+    Interns lowercased nouns and adjectives into integer ids and their pairs into dense pair ids
+    """
+
+    def __init__(self):
+        self.nouns: dict[str, int] = {}
+        self.adjectives: dict[str, int] = {}
+        self.pairs: dict[tuple[str, str], int] = {}
+        self.pair_nouns: list[int] = []
+        self.pair_adjectives: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def add_pair(self, pair: tuple[str, str]) -> int:
+        noun, adjective = pair
+        self.pair_nouns.append(self.nouns.setdefault(noun, len(self.nouns)))
+        self.pair_adjectives.append(self.adjectives.setdefault(adjective, len(self.adjectives)))
+        return self.pairs.setdefault(pair, len(self.pairs))
+
+    def encode(self, objects_col: Iterable[Objects | ExtractedObjectsDict]) -> PairTable:
+        example_idx: list[int] = []
+        pair_id: list[int] = []
+        n_examples = 0
+
+        for n_examples, objects in enumerate(objects_col, start=1):
+            for noun, adjectives in unwrap_objects(objects).items():
+                noun = noun.lower()
+                for adjective in adjectives:
+                    pair = (noun, adjective.lower())
+                    pair_id.append(self.pairs[pair] if pair in self.pairs else self.add_pair(pair))
+                    example_idx.append(n_examples - 1)
+
+        return PairTable(
+            example_idx=np.array(example_idx, dtype=np.int64),
+            pair_id=np.array(pair_id, dtype=np.int64),
+            n_examples=n_examples,
+        )
+
+
+def safe_divide(numerator: npt.ArrayLike, denominator: npt.ArrayLike) -> FloatArray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+@dataclass(frozen=True, slots=True)
+class EvaluationResult:
+    per_example: pd.DataFrame
+    report: EvaluationReport
+
+
+def evaluate_objects(
+    pred_col: Iterable[Objects | ExtractedObjectsDict], target_col: Iterable[Objects | ExtractedObjectsDict]
+) -> EvaluationResult:
+    """
+    Scores predicted noun-adjective pairs against target ones for whole corpus at once.
+    Per example recall is rouge_like_metric, recall_with_penalty is rouge_like_metric(penalty=True);
+    examples without target pairs are not scored and are excluded from macro averages
+    :param pred_col: predicted objects per example
+    :param target_col: target objects per example
+    :return: EvaluationResult - per example counts and metrics with aggregated report
+    """
+    vocabulary = PairVocabulary()
+    pred = vocabulary.encode(pred_col)
+    target = vocabulary.encode(target_col)
+    return score_pairs(pred, target, n_pairs=len(vocabulary))
+
+
+def score_pairs(pred: PairTable, target: PairTable, n_pairs: int) -> EvaluationResult:
+    """
+    Scores pair tables encoded with the same pair ids, see evaluate_objects
+    :param n_pairs: upper bound of pair ids
+    """
+    if pred.n_examples != target.n_examples:
+        raise ValueError(f"Got {pred.n_examples} predictions for {target.n_examples} targets")
+
+    n_pairs = max(n_pairs, 1)
+    pred_keys = pred.keys(n_pairs)
+    target_keys = target.keys(n_pairs)
+    matched_keys = np.intersect1d(pred_keys, target_keys, assume_unique=True)
+
+    matched = np.bincount(matched_keys // n_pairs, minlength=target.n_examples)
+    n_pred = np.bincount(pred_keys // n_pairs, minlength=pred.n_examples)
+    n_target = np.bincount(target_keys // n_pairs, minlength=target.n_examples)
+
+    precision = safe_divide(matched, n_pred)
+    recall = safe_divide(matched, n_target)
+    f1 = safe_divide(2 * precision * recall, precision + recall)
+    recall_with_penalty = np.maximum(safe_divide(2 * matched - n_pred, n_target), 0)
+
+    per_example = pd.DataFrame(
+        {
+            "matched": matched,
+            "n_pred": n_pred,
+            "n_target": n_target,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "recall_with_penalty": recall_with_penalty,
+        }
+    )
+    scored = n_target > 0
+    per_example.loc[~scored, ["precision", "recall", "f1", "recall_with_penalty"]] = np.nan
+
+    micro_precision = float(safe_divide(matched.sum(), n_pred.sum()))
+    micro_recall = float(safe_divide(matched.sum(), n_target.sum()))
+    report = EvaluationReport(
+        n_examples=target.n_examples,
+        n_scored_examples=int(scored.sum()),
+        precision=float(precision[scored].mean()) if scored.any() else 0.0,
+        recall=float(recall[scored].mean()) if scored.any() else 0.0,
+        f1=float(f1[scored].mean()) if scored.any() else 0.0,
+        recall_with_penalty=float(recall_with_penalty[scored].mean()) if scored.any() else 0.0,
+        micro_precision=micro_precision,
+        micro_recall=micro_recall,
+        micro_f1=float(safe_divide(2 * micro_precision * micro_recall, micro_precision + micro_recall)),
+    )
+    return EvaluationResult(per_example=per_example, report=report)
+
+
+def predict(
+    extractor: BaseObjectsExtractor,
+    texts: Sequence[str],
+    batch_size: int = 64,
+    cache: ResultCache | None = None,
+) -> list[ExtractedObjectsDict]:
+    """
+    Runs extractor over unique texts in batches, texts found in cache are not extracted again
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    predictions: dict[str, ExtractedObjectsDict | None] = dict(
+        zip(unique_texts, cache.get_many(unique_texts) if cache is not None else [None] * len(unique_texts))
+    )
+    missing = [text for text, prediction in predictions.items() if prediction is None]
+    logger.info(f"Extracting {len(missing)} of {len(unique_texts)} unique texts, rest is cached")
+
+    for batch in batched(missing, batch_size):
+        results = extractor.extract_batch(list(batch))
+        predictions.update(zip(batch, results))
+        if cache is not None:
+            cache.set_many(batch, results)
+
+    return [predictions[text] for text in texts]  # pyright: ignore
+
+
+def evaluate_extractor(
+    extractor: BaseObjectsExtractor,
+    texts: Sequence[str],
+    targets: Sequence[Objects | ExtractedObjectsDict],
+    batch_size: int = 64,
+    cache: ResultCache | None = None,
+) -> EvaluationResult:
+    return evaluate_objects(predict(extractor, texts, batch_size=batch_size, cache=cache), targets)
+
+
+def make_predictions_cache(
+    extractor: BaseObjectsExtractor, db_path: Path = PREDICTIONS_CACHE_PATH, max_size: int = 100_000
+) -> ResultCache:
+    """
+    Cache of predictions keyed by extractor fingerprint, predictions of other configs are kept,
+    so switching between compared configs does not recompute them
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return ResultCache(
+        scope=f"evaluation:{type(extractor).__name__}",
+        fingerprint=extractor.fingerprint(),
+        max_size=max_size,
+        db_path=db_path,
+        purge_stale=False,
+    )
+
+
+def load_validation_set(
+    path: Path, target_column: str, labels_path: Path | None = None, limit: int | None = None
+) -> tuple[list[str], list[ExtractedObjectsDict]]:
+    """
+    Reads texts with JSON targets, labels_path is "~" separated file with text and extra target columns
+    """
+    val = pd.read_csv(path)  # pyright: ignore
+    if labels_path is not None:
+        val = val.merge(pd.read_csv(labels_path, sep="~"), on="text", how="left")  # pyright: ignore
+
+    val = val.loc[val[target_column].notna(), ["text", target_column]]  # pyright: ignore
+    if limit is not None:
+        val = val.head(limit)  # pyright: ignore
+
+    return val["text"].tolist(), [json.loads(target) for target in val[target_column]]  # pyright: ignore
+
+
+def build_extractor(
+    extractor_type: ExtractorType,
+    config_path: Path | None = None,
+    bert_config_path: Path | None = None,
+    llm_config_path: Path | None = None,
+) -> BaseObjectsExtractor:
+    """
+    Builds extractor with factories of the service, settings not given are the service ones
+    :param bert_config_path: settings of BERT tier of cascade extractor
+    :param llm_config_path: settings of LLM tier of cascade extractor
+    """
+    from src.dependencies.extractors import (
+        BERT_CONFIG_PATH,
+        CASCADE_CONFIG_PATH,
+        LLM_CONFIG_PATH,
+        build_bert_extractor,
+        build_cascade_extractor,
+        build_llm_extractor,
+        build_pos_extractor,
+    )
+
+    match extractor_type:
+        case ExtractorType.pos_extractor:
+            return build_pos_extractor()
+        case ExtractorType.bert_extractor:
+            return build_bert_extractor(config_path or BERT_CONFIG_PATH)
+        case ExtractorType.llm_extractor:
+            return build_llm_extractor(config_path or LLM_CONFIG_PATH)
+        case ExtractorType.cascade_extractor:
+            return build_cascade_extractor(
+                config_path or CASCADE_CONFIG_PATH, bert_config_path=bert_config_path, llm_config_path=llm_config_path
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate extractor on validation set")
+    parser.add_argument("--extractor", type=ExtractorType, choices=list(ExtractorType), required=True)
+    parser.add_argument("--config", type=Path, default=None, help="extractor settings yaml")
+    parser.add_argument("--bert-config", type=Path, default=None, help="BERT tier settings yaml of cascade extractor")
+    parser.add_argument("--llm-config", type=Path, default=None, help="LLM tier settings yaml of cascade extractor")
+    parser.add_argument("--val", type=Path, default=DATA_DIR / "val.csv")
+    parser.add_argument("--labels", type=Path, default=None, help='"~" separated file with extra target columns')
+    parser.add_argument("--store", type=Path, default=None, help="dataset store used instead of --val and --labels")
+    parser.add_argument("--target-column", default="target_spacy")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--per-example-output", type=Path, default=None, help="CSV with per example metrics")
+    args = parser.parse_args()
+
+    extractor = build_extractor(
+        args.extractor, args.config, bert_config_path=args.bert_config, llm_config_path=args.llm_config
+    )
+    cache = make_predictions_cache(extractor) if args.cache else None
+
+    started_at = time.perf_counter()
+    if args.store is not None:
+        from src.data.store import DatasetStore, evaluate_extractor_on_store
+
+        store = DatasetStore(args.store)
+        rows, result = evaluate_extractor_on_store(
+            extractor, store, args.target_column, batch_size=args.batch_size, cache=cache, limit=args.limit
+        )
+        texts = store.texts(rows)
+    else:
+        texts, targets = load_validation_set(args.val, args.target_column, labels_path=args.labels, limit=args.limit)
+        result = evaluate_extractor(extractor, texts, targets, batch_size=args.batch_size, cache=cache)
+    report: dict[str, Any] = {
+        "extractor": args.extractor,
+        "target_column": args.target_column,
+        "elapsed_s": time.perf_counter() - started_at,
+        **result.report.model_dump(),
+    }
+    logger.info(json.dumps(report, indent=2))
+
+    if args.per_example_output is not None:
+        result.per_example.assign(text=texts).to_csv(args.per_example_output, index=False)
+    if cache is not None:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
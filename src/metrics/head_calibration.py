@@ -0,0 +1,377 @@
+import argparse
+import json
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import batched
+from pathlib import Path
+from typing import Any, Sequence
+
+import torch
+from loguru import logger
+
+from src.benchmarks.common import write_report
+from src.core.models import EvaluationReport, ExtractedObjectsDict, ProcessAttentions
+from src.core.settings import CONFIGS_DIR, BertExtractorSettings
+from src.extractor.bert_extractor import BertExtractor
+from src.extractor.pos_extractor import Token
+from src.metrics.engine import (
+    DATA_DIR,
+    Objects,
+    evaluate_objects,
+    load_validation_set,
+    unwrap_objects,
+)
+
+# (layer, head)
+Head = tuple[int, int]
+
+METRICS = ("recall", "recall_with_penalty")
+SCORING_BLOCK_SIZE = 1024
+# top level selected_heads key with its value, including block list lines
+SELECTED_HEADS_PATTERN = re.compile(r"^selected_heads:.*(?:\n[ \t-].*)*", re.MULTILINE)
+
+
+@dataclass(slots=True)
+class CalibrationBucket:
+    """
+    Head attentions of texts with the same number of adjectives and nouns, stacked without padding
+    """
+
+    # (n_texts,), positions of texts in calibration set
+    indices: torch.Tensor
+    # (n_texts, n_layers * n_heads, n_adjectives, n_nouns)
+    weights: torch.Tensor
+    # (n_texts, n_adjectives, n_nouns), adjective-noun pair is in target
+    hits: torch.Tensor
+
+
+@dataclass(slots=True)
+class CalibrationSet:
+    """
+    Attention of every head between adjectives and nouns of every text. Texts are bucketed by shape of their
+    adjective-noun matrix, so memory is proportional to the number of pairs rather than to the largest text
+    """
+
+    buckets: list[CalibrationBucket]
+    # (n_texts,)
+    n_target: torch.Tensor
+    nouns: list[list[Token]]
+    adjectives: list[list[Token]]
+    n_layers: int
+    n_heads: int
+
+    def head_index(self, head: Head) -> int:
+        layer, head_in_layer = head
+        return layer * self.n_heads + head_in_layer
+
+    def count_matches(self, heads_sums: Sequence[torch.Tensor]) -> torch.Tensor:
+        """
+        Counts target pairs each text gets when every head is added to heads_sums: adjective goes to noun with
+        the highest summed weight, as in BertExtractor, mean and sum have the same argmax
+        :param heads_sums: summed weights of already selected heads for each bucket,
+            shape (n_texts, n_adjectives, n_nouns)
+        :return: torch.Tensor - matched target pairs, shape (n_texts, n_layers * n_heads)
+        """
+        matches = torch.zeros(len(self.nouns), self.n_layers * self.n_heads)
+        for bucket, heads_sum in zip(self.buckets, heads_sums):
+            for start in range(0, len(bucket.indices), SCORING_BLOCK_SIZE):
+                block = slice(start, start + SCORING_BLOCK_SIZE)
+                totals = heads_sum[block].unsqueeze(1) + bucket.weights[block]
+                best_totals, best_nouns = totals.max(dim=3)
+                hits = bucket.hits[block].unsqueeze(1).expand(-1, totals.shape[1], -1, -1)
+                # adjective without noun in reach (all -inf) matches nothing
+                matched = hits.gather(3, best_nouns.unsqueeze(3)).squeeze(3) & (best_totals > -torch.inf)
+                matches[bucket.indices[block]] = matched.sum(dim=2, dtype=matches.dtype)
+        return matches
+
+    def predict(self, heads: Sequence[Head]) -> list[ExtractedObjectsDict]:
+        text_weights = [
+            torch.zeros(len(text_adjectives), len(text_nouns))
+            for text_nouns, text_adjectives in zip(self.nouns, self.adjectives)
+        ]
+        head_indices = [self.head_index(head) for head in heads]
+        for bucket in self.buckets:
+            for i, weights in zip(bucket.indices.tolist(), bucket.weights[:, head_indices].mean(dim=1)):
+                text_weights[i] = weights
+        return [
+            BertExtractor.map_adjectives_to_nouns(nouns=text_nouns, adjectives=text_adjectives, noun_indices=indices)
+            for text_nouns, text_adjectives, indices in zip(
+                self.nouns, self.adjectives, BertExtractor.argmax_nouns(text_weights)
+            )
+        ]
+
+
+def get_target_pairs(target: Objects | ExtractedObjectsDict) -> set[tuple[str, str]]:
+    return {
+        (noun.lower(), adjective.lower())
+        for noun, adjectives in unwrap_objects(target).items()
+        for adjective in adjectives
+    }
+
+
+def flatten_heads(weights: torch.Tensor, n_heads_total: int) -> torch.Tensor:
+    """
+    :param weights: attention of each head, (n_layers, n_heads, n_adjectives, n_nouns), or (n_adjectives, n_nouns)
+        of -inf when no adjective has noun in its chunk
+    :return: torch.Tensor - weights of shape (n_layers * n_heads, n_adjectives, n_nouns)
+    """
+    if weights.dim() == 4:
+        return weights.flatten(0, 1)
+    return weights.expand(n_heads_total, -1, -1)
+
+
+def make_bucket(
+    indices: Sequence[int],
+    head_weights: Sequence[torch.Tensor],
+    nouns: Sequence[list[Token]],
+    adjectives: Sequence[list[Token]],
+    target_pairs: Sequence[set[tuple[str, str]]],
+    n_heads_total: int,
+) -> CalibrationBucket:
+    n_adjectives, n_nouns = len(adjectives[indices[0]]), len(nouns[indices[0]])
+    weights = torch.stack([flatten_heads(head_weights[i], n_heads_total) for i in indices])
+    hits = torch.zeros(len(indices), n_adjectives, n_nouns, dtype=torch.bool)
+    for row, i in enumerate(indices):
+        for a, adjective in enumerate(adjectives[i]):
+            for n, noun in enumerate(nouns[i]):
+                hits[row, a, n] = (noun.text.lower(), adjective.text.lower()) in target_pairs[i]
+    return CalibrationBucket(indices=torch.tensor(indices), weights=weights, hits=hits)
+
+
+def collect_calibration_set(
+    extractor: BertExtractor,
+    texts: Sequence[str],
+    targets: Sequence[Objects | ExtractedObjectsDict],
+    batch_size: int,
+) -> CalibrationSet:
+    """
+    :raises ValueError: no text has adjective and noun in reach of each other, there is nothing to calibrate on
+    """
+    nouns: list[list[Token]] = []
+    adjectives: list[list[Token]] = []
+    head_weights: list[torch.Tensor] = []
+    for batch in batched(texts, batch_size):
+        docs = extractor.pos_extractor.get_docs(list(batch))
+        batch_nouns = [extractor.pos_extractor.get_nouns(doc=doc) for doc in docs]
+        batch_adjectives = [extractor.pos_extractor.get_adjectives(doc=doc) for doc in docs]
+        head_weights += extractor.get_adjective_noun_weights(docs, batch_nouns, batch_adjectives, per_head=True)
+        nouns += batch_nouns
+        adjectives += batch_adjectives
+        logger.info(f"Collected head attentions of {len(head_weights)}/{len(texts)} texts")
+
+    # texts without adjectives or nouns get no matches whatever the heads are
+    bucket_indices: dict[tuple[int, int], list[int]] = defaultdict(list)
+    for i, (text_nouns, text_adjectives) in enumerate(zip(nouns, adjectives)):
+        if text_nouns and text_adjectives:
+            bucket_indices[(len(text_adjectives), len(text_nouns))].append(i)
+    head_shapes = [
+        head_weights[i].shape[:2] for indices in bucket_indices.values() for i in indices if head_weights[i].dim() == 4
+    ]
+    if not head_shapes:
+        raise ValueError(f"None of {len(texts)} texts has adjective-noun pairs, heads can't be calibrated")
+    n_layers, n_heads = head_shapes[0]
+
+    target_pairs = [get_target_pairs(target) for target in targets]
+    buckets = [
+        make_bucket(indices, head_weights, nouns, adjectives, target_pairs, n_heads_total=n_layers * n_heads)
+        for indices in bucket_indices.values()
+    ]
+    logger.info(f"Bucketed texts by numbers of adjectives and nouns into {len(buckets)} buckets")
+
+    return CalibrationSet(
+        buckets=buckets,
+        n_target=torch.tensor([len(pairs) for pairs in target_pairs], dtype=torch.float),
+        nouns=nouns,
+        adjectives=adjectives,
+        n_layers=n_layers,
+        n_heads=n_heads,
+    )
+
+
+def count_heads_run(heads: Sequence[Head], n_heads: int) -> int:
+    """
+    Number of attention heads computed when unselected heads of the deepest selected layer are pruned,
+    earlier layers run all heads
+    """
+    last_layer = max(layer for layer, _ in heads)
+    return last_layer * n_heads + len({head for layer, head in heads if layer == last_layer})
+
+
+def get_heads_run_shares(calibration_set: CalibrationSet, selected: Sequence[Head]) -> torch.Tensor:
+    """
+    :return: torch.Tensor - share of scored heads computed when each head is added to selected ones,
+        shape (n_layers * n_heads,)
+    """
+    n_heads_total = calibration_set.n_layers * calibration_set.n_heads
+    heads_run = [
+        count_heads_run([*selected, divmod(index, calibration_set.n_heads)], calibration_set.n_heads)
+        for index in range(n_heads_total)
+    ]
+    return torch.tensor(heads_run, dtype=torch.float) / n_heads_total
+
+
+def select_heads_greedily(calibration_set: CalibrationSet, max_heads: int, compute_penalty: float) -> list[Head]:
+    """
+    Adds one head at a time, the one giving the highest mean recall together with heads selected before, minus
+    compute_penalty times share of scored heads the subset computes. Every layer up to the deepest selected one
+    runs, so without penalty heads spread over deep layers and the subset saves little compute.
+    Number of predicted pairs doesn't depend on heads, so recall with penalty is maximised by the same heads
+    :param compute_penalty: recall traded for computing all scored heads
+    :return: list[Head] - heads in order of selection
+    """
+    scored = calibration_set.n_target > 0
+    heads_sums = [torch.zeros_like(bucket.weights[:, 0]) for bucket in calibration_set.buckets]
+    selected: list[int] = []
+    for _ in range(min(max_heads, calibration_set.n_layers * calibration_set.n_heads)):
+        recall = calibration_set.count_matches(heads_sums)[scored] / calibration_set.n_target[scored].unsqueeze(1)
+        mean_recall = recall.mean(dim=0)
+        shares = get_heads_run_shares(calibration_set, [divmod(index, calibration_set.n_heads) for index in selected])
+        scores = mean_recall - compute_penalty * shares
+        scores[selected] = -torch.inf
+        best = int(scores.argmax())
+        selected.append(best)
+        for heads_sum, bucket in zip(heads_sums, calibration_set.buckets):
+            heads_sum += bucket.weights[:, best]
+        logger.info(
+            f"Selected head {divmod(best, calibration_set.n_heads)}, mean recall {mean_recall[best]:.4f}, "
+            f"heads run share {shares[best]:.4f}"
+        )
+    return [divmod(index, calibration_set.n_heads) for index in selected]
+
+
+def get_baseline_heads(config: BertExtractorSettings, n_layers: int, n_heads: int) -> list[Head]:
+    if config.selected_heads:
+        return list(config.selected_heads)
+    return [(layer, head) for layer in range(min(config.n_layers_needed, n_layers)) for head in range(n_heads)]
+
+
+def make_curve_point(
+    calibration_set: CalibrationSet,
+    heads: Sequence[Head],
+    targets: Sequence[Objects | ExtractedObjectsDict],
+    baseline_heads_run: int,
+) -> dict[str, Any]:
+    report: EvaluationReport = evaluate_objects(calibration_set.predict(heads), targets).report
+    heads_run = count_heads_run(heads, calibration_set.n_heads)
+    return {
+        "n_heads": len(heads),
+        "head": list(heads[-1]),
+        "recall": report.recall,
+        "recall_with_penalty": report.recall_with_penalty,
+        "n_layers": max(layer for layer, _ in heads) + 1,
+        "heads_run": heads_run,
+        "heads_run_share": heads_run / baseline_heads_run,
+    }
+
+
+def calibrate(
+    config: BertExtractorSettings,
+    texts: Sequence[str],
+    targets: Sequence[Objects | ExtractedObjectsDict],
+    max_layers: int,
+    max_heads: int,
+    metric: str,
+    target_score: float | None,
+    batch_size: int,
+    compute_penalty: float,
+) -> dict[str, Any]:
+    """
+    Scores heads of the first max_layers layers on validation set and picks the smallest greedy subset
+    reaching target_score, by default the score of heads averaged by config
+    """
+    extractor = BertExtractor(
+        config.model_copy(
+            update={
+                "process_attentions": ProcessAttentions.get_all_mean,
+                "n_blocks_to_average": max_layers,
+                "selected_heads": None,
+            }
+        )
+    )
+    calibration_set = collect_calibration_set(extractor, texts, targets, batch_size=batch_size)
+    baseline_heads = get_baseline_heads(config, calibration_set.n_layers, calibration_set.n_heads)
+    baseline_heads_run = count_heads_run(baseline_heads, calibration_set.n_heads)
+    baseline = make_curve_point(calibration_set, baseline_heads, targets, baseline_heads_run)
+    target = target_score if target_score is not None else baseline[metric]
+
+    order = select_heads_greedily(calibration_set, max_heads, compute_penalty=compute_penalty)
+    curve = [
+        make_curve_point(calibration_set, order[:k], targets, baseline_heads_run) for k in range(1, len(order) + 1)
+    ]
+    reaching = [point for point in curve if point[metric] >= target]
+    chosen = reaching[0] if reaching else max(curve, key=lambda point: point[metric])
+    if not reaching:
+        logger.warning(f"No subset of up to {max_heads} heads reaches {metric} {target:.4f}, taking the best one")
+
+    return {
+        "n_texts": len(texts),
+        "metric": metric,
+        "target_score": target,
+        "compute_penalty": compute_penalty,
+        "baseline": {**baseline, "head": None},
+        "selected_heads": [list(head) for head in order[: chosen["n_heads"]]],
+        "selected": chosen,
+        "curve": curve,
+    }
+
+
+def write_selected_heads(config_path: Path, heads: Sequence[Sequence[int]]) -> None:
+    """
+    Replaces selected_heads key of config in place, or appends it, rest of the file is kept as is
+    """
+    line = f"selected_heads: {json.dumps([list(head) for head in heads])}"
+    text = config_path.read_text()
+    if SELECTED_HEADS_PATTERN.search(text) is not None:
+        text = SELECTED_HEADS_PATTERN.sub(line, text, count=1)
+    elif text and not text.endswith("\n"):
+        text += f"\n{line}\n"
+    else:
+        text += f"{line}\n"
+    config_path.write_text(text)
+    logger.info(f"Wrote {len(heads)} selected heads to {config_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Select attention heads of BertExtractor on validation set")
+    parser.add_argument("--config", type=Path, default=CONFIGS_DIR / "bert_extractor_settings.yaml")
+    parser.add_argument("--val", type=Path, default=DATA_DIR / "val.csv")
+    parser.add_argument("--labels", type=Path, default=None, help='"~" separated file with extra target columns')
+    parser.add_argument("--target-column", default="target_spacy")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-layers", type=int, default=12, help="heads of the first max-layers layers are scored")
+    parser.add_argument("--max-heads", type=int, default=32)
+    parser.add_argument("--metric", choices=METRICS, default="recall", help="recall is mean rouge_like_metric")
+    parser.add_argument("--target-score", type=float, default=None, help="default is score of config heads")
+    parser.add_argument(
+        "--compute-penalty", type=float, default=0.1, help="recall traded for computing all scored heads"
+    )
+    parser.add_argument("--write-config", action=argparse.BooleanOptionalAction, default=False)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    texts, targets = load_validation_set(args.val, args.target_column, labels_path=args.labels, limit=args.limit)
+    started_at = time.perf_counter()
+    results = calibrate(
+        BertExtractorSettings.from_yaml(args.config),
+        texts,
+        targets,
+        max_layers=args.max_layers,
+        max_heads=args.max_heads,
+        metric=args.metric,
+        target_score=args.target_score,
+        batch_size=args.batch_size,
+        compute_penalty=args.compute_penalty,
+    )
+    results["elapsed_s"] = time.perf_counter() - started_at
+    logger.info(json.dumps({key: results[key] for key in ("baseline", "selected", "selected_heads")}, indent=2))
+    write_report("head_calibration", results, args.output)
+
+    if args.write_config:
+        write_selected_heads(args.config, results["selected_heads"])
+
+
+if __name__ == "__main__":
+    main()
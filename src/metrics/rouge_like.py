@@ -1,6 +1,6 @@
 from typing import Iterable
 
-import numpy as np
+from src.metrics.engine import evaluate_objects
 
 
 def rouge_like_metric(pred: dict[str, list[str]], target: dict[str, list[str]], penalty: bool = False) -> float:
@@ -25,7 +25,5 @@ def rouge_like_metric(pred: dict[str, list[str]], target: dict[str, list[str]],
 def mean_rouge_like_metric(
     pred_col: Iterable[dict[str, list[str]]], target_col: Iterable[dict[str, list[str]]], penalty: bool = False
 ) -> float:
-    metrics = np.array(
-        [rouge_like_metric(pred=pred, target=target, penalty=penalty) for pred, target in zip(pred_col, target_col)]
-    )
-    return metrics.mean()
+    report = evaluate_objects(pred_col=pred_col, target_col=target_col).report
+    return report.recall_with_penalty if penalty else report.recall
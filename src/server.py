@@ -0,0 +1,190 @@
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from types import FrameType
+
+import uvicorn
+from loguru import logger
+
+from src.core.memory import get_memory_usage
+from src.core.settings import AppSettings
+from src.dependencies.extractors import extractor_registry
+from src.dependencies.settings import get_app_settings
+from src.fastapi_app import app
+
+SOCKET_BACKLOG = 2048
+SUPERVISOR_POLL_INTERVAL_S = 0.5
+SHUTDOWN_TIMEOUT_S = 30.0
+# worker exiting sooner than that after start has failed fast, its restarts are delayed exponentially
+FAST_FAILURE_S = 30.0
+RESTART_BACKOFF_BASE_S = 1.0
+RESTART_BACKOFF_MAX_S = 60.0
+# supervisor exits once a worker fails fast that many times in a row
+MAX_FAST_FAILURES = 5
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(SOCKET_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def get_torch_threads(app_settings: AppSettings) -> int:
+    if app_settings.server_torch_threads is not None:
+        return app_settings.server_torch_threads
+    return max(1, (os.cpu_count() or 1) // app_settings.server_workers)
+
+
+def run_worker(sock: socket.socket, app_settings: AppSettings) -> None:
+    # torch is imported only if the preloaded extractor uses it
+    if "torch" in sys.modules:
+        import torch
+
+        torch.set_num_threads(get_torch_threads(app_settings))
+    uvicorn.Server(uvicorn.Config(app, lifespan="on")).run(sockets=[sock])
+
+
+class PreforkServer:
+    """
+    Loads the selected extractor once, then forks workers serving the same socket. Workers share pages
+    of the parent copy-on-write: memory-mapped model weights and objects frozen out of garbage collection,
+    so the collector doesn't write to their headers and make workers copy them. Dead workers are restarted
+    with exponential backoff, the supervisor exits with code 1 when a worker keeps failing right after start
+    """
+
+    def __init__(self, app_settings: AppSettings):
+        self.app_settings = app_settings
+        self.workers: dict[int, int] = {}
+        self.should_exit = False
+        self.exit_code = 0
+        self.sock: socket.socket | None = None
+        # by worker index
+        self.started_at: dict[int, float] = {}
+        self.fast_failures: dict[int, int] = {}
+        self.restart_at: dict[int, float] = {}
+
+    def spawn(self, worker_index: int) -> None:
+        assert self.sock is not None
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                run_worker(self.sock, self.app_settings)
+            except BaseException:
+                logger.exception(f"Worker {worker_index} failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self.workers[pid] = worker_index
+        self.started_at[worker_index] = time.monotonic()
+        logger.info(f"Started worker {worker_index} with pid {pid}")
+
+    def handle_exit(self, signum: int, frame: FrameType | None) -> None:
+        self.should_exit = True
+
+    def reap_workers(self) -> None:
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if (worker_index := self.workers.pop(pid, None)) is None:
+                continue
+            if self.should_exit:
+                logger.info(f"Worker {worker_index} with pid {pid} stopped")
+                continue
+            logger.warning(f"Worker {worker_index} with pid {pid} exited with status {status}")
+            self.schedule_restart(worker_index)
+
+    def schedule_restart(self, worker_index: int) -> None:
+        if time.monotonic() - self.started_at[worker_index] >= FAST_FAILURE_S:
+            self.fast_failures[worker_index] = 0
+        else:
+            self.fast_failures[worker_index] = self.fast_failures.get(worker_index, 0) + 1
+
+        n_failures = self.fast_failures[worker_index]
+        if n_failures >= MAX_FAST_FAILURES:
+            logger.error(f"Worker {worker_index} failed {n_failures} times in a row right after start, exiting")
+            self.should_exit = True
+            self.exit_code = 1
+            return
+
+        delay = min(RESTART_BACKOFF_BASE_S * 2 ** (n_failures - 1), RESTART_BACKOFF_MAX_S) if n_failures else 0.0
+        logger.info(f"Restarting worker {worker_index} in {delay:.1f}s")
+        self.restart_at[worker_index] = time.monotonic() + delay
+
+    def restart_workers(self) -> None:
+        now = time.monotonic()
+        for worker_index, restart_at in list(self.restart_at.items()):
+            if restart_at <= now:
+                del self.restart_at[worker_index]
+                self.spawn(worker_index)
+
+    def report_memory(self) -> None:
+        total_pss = 0
+        for pid, worker_index in sorted(self.workers.items(), key=lambda item: item[1]):
+            if (usage := get_memory_usage(pid)) is None:
+                continue
+            total_pss += usage.pss_bytes
+            logger.info(
+                f"Worker {worker_index} (pid {pid}): rss {usage.rss_bytes / 2**20:.1f} MiB, "
+                f"shared {usage.shared_bytes / 2**20:.1f} MiB, private {usage.private_bytes / 2**20:.1f} MiB, "
+                f"pss {usage.pss_bytes / 2**20:.1f} MiB"
+            )
+        if (parent_usage := get_memory_usage()) is not None:
+            total_pss += parent_usage.pss_bytes
+            logger.info(f"Total pss of {len(self.workers)} workers and parent: {total_pss / 2**20:.1f} MiB")
+
+    def stop_workers(self) -> None:
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT_S
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(SUPERVISOR_POLL_INTERVAL_S)
+        for pid in self.workers:
+            logger.warning(f"Killing worker with pid {pid}")
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self) -> None:
+        extractor_registry.warm_up([self.app_settings.api_selected_extractor])
+        gc.collect()
+        gc.freeze()
+
+        self.sock = bind_socket(self.app_settings.server_host, self.app_settings.server_port)
+        logger.info(
+            f"Serving on {self.app_settings.server_host}:{self.app_settings.server_port} with "
+            f"{self.app_settings.server_workers} workers, {get_torch_threads(self.app_settings)} torch threads each"
+        )
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        for worker_index in range(self.app_settings.server_workers):
+            self.spawn(worker_index)
+
+        next_report = time.monotonic() + self.app_settings.server_memory_report_interval_s
+        try:
+            while not self.should_exit:
+                self.reap_workers()
+                self.restart_workers()
+                if time.monotonic() >= next_report:
+                    self.report_memory()
+                    next_report += self.app_settings.server_memory_report_interval_s
+                time.sleep(SUPERVISOR_POLL_INTERVAL_S)
+        finally:
+            self.stop_workers()
+            self.sock.close()
+
+
+if __name__ == "__main__":
+    server = PreforkServer(get_app_settings())
+    server.run()
+    sys.exit(server.exit_code)
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+multi_texts_marker = "<texts> ="
+# about one token of generated content per streamed chunk
+STREAM_CHUNK_CHARS = 4
+numbered_text_pattern = re.compile(r"^\s*(\d+)\. <(.*)>\s*$", re.MULTILINE)
+single_text_pattern = re.compile(r"<text> = <(.*)>")
+
+
+@dataclass
+class StubSettings:
+    latency_ms: float = 50.0
+    token_latency_ms: float = 0.0
+    rate_limit_every: int = 0
+    retry_after_s: float = 1.0
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    truncated_stream_rate: float = 0.0
+
+
+@dataclass
+class StubState:
+    requests_total: int = 0
+    rate_limited_total: int = 0
+    errors_total: int = 0
+    malformed_total: int = 0
+    truncated_streams_total: int = 0
+    connections: set[int] = field(default_factory=set[int])
+
+
+def make_objects(text: str) -> dict[str, list[str]]:
+    words = text.lower().split()
+    # previous word describes each object, so streamed objects are spread over the whole completion
+    return {"objects": {word: words[i - 1 : i] for i, word in enumerate(words)}}
+
+
+def make_content(prompt: str) -> str:
+    if multi_texts_marker in prompt:
+        # the last marker precedes input texts, earlier ones belong to the example
+        texts = numbered_text_pattern.findall(prompt.rsplit(multi_texts_marker, 1)[-1])
+        return json.dumps({position: make_objects(text) for position, text in texts})
+    match = single_text_pattern.findall(prompt)
+    return json.dumps(make_objects(match[-1] if match else ""))
+
+
+def make_usage(prompt: str, content: str) -> dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def stream_content(
+    request: web.Request, body: dict[str, Any], content: str, settings: StubSettings, truncated: bool = False
+) -> web.StreamResponse:
+    """
+    Sends content as server-sent events of chat completion chunks, one per generated token
+    :param truncated: stop after half of content without usage and [DONE], as a dropped upstream stream does
+    """
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    try:
+        for start in range(0, len(content) // 2 if truncated else len(content), STREAM_CHUNK_CHARS):
+            await asyncio.sleep(settings.token_latency_ms / 1000)
+            chunk = {"choices": [{"index": 0, "delta": {"content": content[start : start + STREAM_CHUNK_CHARS]}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        if truncated:
+            await response.write_eof()
+            return response
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = make_usage(body["messages"][-1]["content"], content)
+            await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+    except ConnectionResetError:
+        # client may stop reading once it has what it needs
+        pass
+    return response
+
+
+def make_app(settings: StubSettings) -> web.Application:
+    """
+    OpenAI-compatible chat completions stub with configurable latency, rate limiting and failures.
+    Content is generated at token_latency_ms per token, streamed as server-sent events when requested
+    """
+    state = StubState()
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        state.requests_total += 1
+        if request.transport is not None:
+            state.connections.add(id(request.transport))
+
+        if settings.rate_limit_every and state.requests_total % settings.rate_limit_every == 0:
+            state.rate_limited_total += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached"}},
+                status=429,
+                headers={"Retry-After": str(settings.retry_after_s)},
+            )
+        if random.random() < settings.error_rate:
+            state.errors_total += 1
+            return web.json_response({"error": {"message": "Internal error"}}, status=500)
+
+        body: dict[str, Any] = await request.json()
+        prompt = body["messages"][-1]["content"]
+        await asyncio.sleep(settings.latency_ms / 1000)
+
+        content = make_content(prompt)
+        if multi_texts_marker in prompt and random.random() < settings.malformed_rate:
+            state.malformed_total += 1
+            content = content[: len(content) // 2]
+
+        if body.get("stream"):
+            truncated = random.random() < settings.truncated_stream_rate
+            state.truncated_streams_total += truncated
+            return await stream_content(request, body, content, settings, truncated=truncated)
+        await asyncio.sleep(settings.token_latency_ms / 1000 * math.ceil(len(content) / STREAM_CHUNK_CHARS))
+        return web.json_response(
+            {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": make_usage(prompt, content),
+            }
+        )
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "requests_total": state.requests_total,
+                "rate_limited_total": state.rate_limited_total,
+                "errors_total": state.errors_total,
+                "malformed_total": state.malformed_total,
+                "truncated_streams_total": state.truncated_streams_total,
+                "connections_total": len(state.connections),
+            }
+        )
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="generation time of each token")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every N-th request with 429")
+    parser.add_argument("--retry-after-s", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--malformed-rate", type=float, default=0.0, help="share of multi text responses with truncated JSON"
+    )
+    parser.add_argument(
+        "--truncated-stream-rate", type=float, default=0.0, help="share of streams cut off before [DONE]"
+    )
+    args = parser.parse_args()
+
+    settings = StubSettings(
+        latency_ms=args.latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        rate_limit_every=args.rate_limit_every,
+        retry_after_s=args.retry_after_s,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate,
+        truncated_stream_rate=args.truncated_stream_rate,
+    )
+    web.run_app(make_app(settings), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
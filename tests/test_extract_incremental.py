@@ -0,0 +1,102 @@
+from contextlib import ExitStack, asynccontextmanager
+from typing import Iterator
+
+import pytest
+import requests
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.benchmarks.llm import running_stub
+from src.cache import ResultCache
+from src.core.models import ExtractedObjectLine
+from src.core.settings import CONFIGS_DIR, AppSettings, LLMExtractorSettings
+from src.dependencies import get_selected_extractor
+from src.dependencies.cache import get_selected_result_cache
+from src.dependencies.settings import get_app_settings
+from src.endpoints.extract_incremental import router
+from src.extractor.llm_extractor import LLMExtractor
+from src.stubs.openai_stub import StubSettings, make_objects
+
+TEXT = "a furry white rabbit sits in deep snow"
+MAX_RETRIES = 2
+
+
+def make_app(extractor: LLMExtractor, result_cache: ResultCache) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await extractor.aclose()
+
+    app_settings = AppSettings()
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    app.dependency_overrides[get_app_settings] = lambda: app_settings
+    app.dependency_overrides[get_selected_extractor] = lambda: extractor
+    app.dependency_overrides[get_selected_result_cache] = lambda: result_cache
+    return app
+
+
+@pytest.fixture
+def result_cache() -> ResultCache:
+    return ResultCache(scope="llm_extractor", fingerprint="test", max_size=16)
+
+
+@pytest.fixture
+def exit_stack() -> Iterator[ExitStack]:
+    with ExitStack() as stack:
+        yield stack
+
+
+def serve(exit_stack: ExitStack, settings: StubSettings, result_cache: ResultCache) -> tuple[str, TestClient]:
+    """
+    Runs OpenAI stub and the app extracting with it
+    :return: tuple[str, TestClient] - url of stub and client of the app
+    """
+    url = exit_stack.enter_context(running_stub(settings))
+    config = LLMExtractorSettings.from_yaml(CONFIGS_DIR / "llm_extractor_settings.yaml", openai_key="test")
+    config = config.model_copy(update={"openai_url": url, "max_retries": MAX_RETRIES, "backoff_base_s": 0.01})
+    client = exit_stack.enter_context(TestClient(make_app(LLMExtractor(config), result_cache)))
+    return url, client
+
+
+def post_lines(client: TestClient, text: str) -> list[ExtractedObjectLine]:
+    response = client.post("/extract/incremental", json=text)
+    assert response.status_code == 200
+    return [ExtractedObjectLine.model_validate_json(line) for line in response.text.splitlines()]
+
+
+def get_requests_total(url: str) -> int:
+    return requests.get(f"{url}/stats", timeout=10).json()["requests_total"]
+
+
+def test_streams_objects_and_caches_result(exit_stack: ExitStack, result_cache: ResultCache):
+    url, client = serve(exit_stack, StubSettings(latency_ms=1, token_latency_ms=1), result_cache)
+    expected = make_objects(TEXT)
+
+    lines = post_lines(client, TEXT)
+    assert [(line.object, line.descriptions) for line in lines] == list(expected["objects"].items())
+    assert all(line.error is None for line in lines)
+    assert result_cache.get(TEXT) == expected
+
+    # served from cache without another completion
+    assert post_lines(client, TEXT) == lines
+    assert get_requests_total(url) == 1
+
+
+def test_truncated_stream_reports_error_and_is_not_cached(exit_stack: ExitStack, result_cache: ResultCache):
+    _, client = serve(exit_stack, StubSettings(latency_ms=1, truncated_stream_rate=1.0), result_cache)
+
+    *objects, last = post_lines(client, TEXT)
+    assert all(line.error is None for line in objects)
+    assert last.error is not None and "ExtractionError" in last.error
+    assert result_cache.get(TEXT) is None
+
+
+def test_exhausted_retries_report_error_and_are_not_cached(exit_stack: ExitStack, result_cache: ResultCache):
+    url, client = serve(exit_stack, StubSettings(latency_ms=1, error_rate=1.0), result_cache)
+
+    (line,) = post_lines(client, TEXT)
+    assert line.object is None
+    assert line.error is not None and "max retries exceeded" in line.error
+    assert result_cache.get(TEXT) is None
+    assert get_requests_total(url) == MAX_RETRIES
@@ -0,0 +1,78 @@
+import json
+import random
+
+import pytest
+
+from src.extractor.llm_streaming import IncrementalObjectsParser
+
+OBJECTS = {
+    "rabbit": ["furry", "white"],
+    "snow": [],
+    'sign "stop"': ["red, {round}"],
+    "café": ["cosy", "[old]"],
+    "bus": ["green"],
+}
+CONTENTS = [
+    json.dumps({"objects": OBJECTS}),
+    json.dumps({"objects": OBJECTS}, indent=2, ensure_ascii=False),
+    "Sure, here are the objects:\n```json\n" + json.dumps({"objects": OBJECTS}) + "\n```",
+]
+
+
+def parse_chunks(chunks: list[str]) -> tuple[list[tuple[str, list[str]]], IncrementalObjectsParser]:
+    parser = IncrementalObjectsParser()
+    objects: list[tuple[str, list[str]]] = []
+    for chunk in chunks:
+        objects += parser.feed(chunk)
+    return objects, parser
+
+
+def split_randomly(content: str, rng: random.Random) -> list[str]:
+    cuts = sorted(rng.sample(range(1, len(content)), rng.randint(1, min(20, len(content) - 1))))
+    return [content[start:end] for start, end in zip([0, *cuts], [*cuts, len(content)])]
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+def test_any_two_chunks_give_all_objects_in_order(content: str):
+    for cut in range(len(content) + 1):
+        objects, parser = parse_chunks([content[:cut], content[cut:]])
+        assert objects == list(OBJECTS.items()), f"split at {cut}: {content[:cut]!r}"
+        assert parser.finished
+        assert parser.content == content
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+def test_random_splits_give_all_objects_in_order(content: str):
+    rng = random.Random(0)
+    for _ in range(200):
+        chunks = split_randomly(content, rng)
+        objects, parser = parse_chunks(chunks)
+        assert objects == list(OBJECTS.items()), f"chunks: {chunks!r}"
+        assert parser.finished
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+def test_single_characters_give_objects_as_soon_as_closed(content: str):
+    parser = IncrementalObjectsParser()
+    objects: list[tuple[str, list[str]]] = []
+    for char in content:
+        emitted = parser.feed(char)
+        # object is emitted by the bracket closing its descriptions
+        assert not emitted or char == "]"
+        objects += emitted
+    assert objects == list(OBJECTS.items())
+    assert parser.finished
+
+
+def test_truncated_content_gives_only_completed_objects():
+    content = json.dumps({"objects": OBJECTS})
+    cut = content.index('"bus"') + len('"bus": ["gr')
+    objects, parser = parse_chunks([content[:cut]])
+    assert objects == list(OBJECTS.items())[:-1]
+    assert not parser.finished
+
+
+def test_unexpected_structure_stops_parsing():
+    objects, parser = parse_chunks(['{"objects": {"dog": ["big"], "cat": "small", "bus": ["green"]}}'])
+    assert objects == [("dog", ["big"])]
+    assert parser.finished